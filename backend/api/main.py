@@ -9,6 +9,10 @@ FastAPI 後端 API 服務
 
     或使用 uvicorn:
     uvicorn backend.api.main:app --reload --host 0.0.0.0 --port 8000
+
+    多 worker（API_WORKERS=4 python backend/api/main.py，或 uvicorn --workers 4）：
+    各 worker 以唯讀 memmap 開啟同一個索引包，法條表與向量共用作業系統的 page cache，
+    增加 worker 不會複製索引
 """
 
 from fastapi import FastAPI, HTTPException, Path as PathParam
@@ -17,18 +21,22 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from pathlib import Path
 from typing import List
+import os
 import uvicorn
 
 from backend.models.schemas import (
-    ReportSummary, ReportDetail, LawSummary, LawDetail, StatsResponse
+    ReportSummary, ReportDetail, LawSummary, LawDetail, StatsResponse,
+    IndexInfo, ArticleMatch, MatchRequest, MatchResponse
 )
 from backend.services.data_service import DataService
+from backend.services.index_service import IndexService
 
 
 # ========== 配置 ==========
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 DATA_DIR = BASE_DIR / "output" / "embedded_results"
 FRONTEND_DIR = BASE_DIR / "frontend"
+INDEX_BUNDLE = BASE_DIR / os.getenv("LAW_INDEX_BUNDLE", "data/law_index.bundle")
 
 # ========== FastAPI 應用初始化 ==========
 app = FastAPI(
@@ -51,6 +59,13 @@ app.add_middleware(
 # ========== 數據服務初始化 ==========
 data_service = DataService(DATA_DIR)
 
+# 索引包以 memmap 開啟（幾乎不耗時），不存在時僅停用索引相關端點
+index_service = IndexService(
+    INDEX_BUNDLE, os.getenv("OPENAI_API_KEY"),
+    backend=os.getenv("EMBEDDING_BACKEND", "openai"),
+    store_dir=str(BASE_DIR / os.getenv("EMBEDDING_STORE_DIR", "data/embedding_store"))
+)
+
 
 # ========== API 端點 ==========
 
@@ -145,6 +160,49 @@ async def get_law_detail(
     return law
 
 
+@app.get("/api/index", response_model=IndexInfo)
+async def get_index_info():
+    """
+    獲取索引包資訊
+
+    Returns:
+        索引包版本、模型、法條數與開啟耗時
+    """
+    return index_service.get_info()
+
+
+@app.get("/api/article/{article_id}")
+async def get_article(
+    article_id: str = PathParam(..., description="法條 ID，如 CPLA-12")
+):
+    """
+    由索引包取得完整法條（不限於出現在報告中的法條）
+
+    Raises:
+        HTTPException: 503 若索引包未載入；404 若法條不存在
+    """
+    if not index_service.available:
+        raise HTTPException(status_code=503, detail="索引包未載入")
+    article = index_service.get_article(article_id)
+    if article is None:
+        raise HTTPException(status_code=404, detail=f"法條 {article_id} 不存在")
+    return article
+
+
+@app.post("/api/match", response_model=MatchResponse)
+def match_text(request: MatchRequest):
+    """
+    即時匹配一段題目 / 選項文字
+
+    Raises:
+        HTTPException: 503 若即時匹配未啟用
+    """
+    if index_service.matcher is None:
+        raise HTTPException(status_code=503, detail="即時匹配未啟用（需要索引包與可用的 embedding 後端）")
+    matched = index_service.match(request.text, request.top_k, request.subject)
+    return MatchResponse(text=request.text, matched_articles=[ArticleMatch(**article) for article in matched])
+
+
 # ========== 靜態檔案服務（前端） ==========
 
 @app.get("/")
@@ -197,13 +255,15 @@ def main():
     print(f"✅ 找到 {report_count} 個報告檔案")
     print()
 
-    # 啟動伺服器
+    # 啟動伺服器（多 worker 時不使用自動重載）
+    workers = int(os.getenv("API_WORKERS", "1"))
     uvicorn.run(
         "backend.api.main:app",
         host="0.0.0.0",
         port=8000,
         log_level="info",
-        reload=True  # 開發模式自動重載
+        workers=workers,
+        reload=workers == 1  # 開發模式自動重載
     )
 
 
@@ -17,6 +17,7 @@ class ArticleMatch(BaseModel):
     content: str = Field(..., description="法條內容")
     category: str = Field(..., description="法條分類")
     similarity: float = Field(..., description="相似度分數")
+    score_type: str = Field("cosine", description="分數類型：cosine / hybrid / bm25 / citation（不同類型不在同一尺度）")
 
 
 class Option(BaseModel):
@@ -92,6 +93,33 @@ class LawDetail(BaseModel):
     # ]
 
 
+class IndexInfo(BaseModel):
+    """索引包資訊"""
+    available: bool = Field(..., description="索引包是否已載入")
+    bundle_path: str = Field(..., description="索引包路徑")
+    matching_enabled: bool = Field(False, description="是否可即時匹配")
+    load_time_ms: float = Field(0.0, description="開啟索引包耗時（毫秒）")
+    format_version: Optional[int] = Field(None, description="索引包格式版本")
+    embedding_model: Optional[str] = Field(None, description="embedding 模型")
+    dimensions: Optional[int] = Field(None, description="縮短的向量維度")
+    count: int = Field(0, description="法條數")
+    dim: int = Field(0, description="向量維度")
+    created_at: Optional[str] = Field(None, description="建立時間")
+
+
+class MatchRequest(BaseModel):
+    """即時匹配請求"""
+    text: str = Field(..., description="題目或選項文字")
+    top_k: int = Field(3, ge=1, le=20, description="返回的法條數")
+    subject: Optional[str] = Field(None, description="考科（限定搜尋的法規範圍）")
+
+
+class MatchResponse(BaseModel):
+    """即時匹配響應"""
+    text: str = Field(..., description="查詢文字")
+    matched_articles: List[ArticleMatch] = Field(default_factory=list, description="匹配的法條")
+
+
 class StatsResponse(BaseModel):
     """統計資訊響應"""
     total_reports: int = Field(..., description="總報告數")
@@ -7,6 +7,7 @@ import json
 from pathlib import Path
 from typing import List, Dict, Optional, Any
 from collections import defaultdict
+from src.core_embedding.match_results import expand_article_refs
 from backend.models.schemas import (
     ReportSummary, ReportDetail, LawSummary, LawDetail,
     StatsResponse, Question, Option, ArticleMatch, ReportMetadata
@@ -26,6 +27,12 @@ class DataService:
         self.data_dir = data_dir
         self._cache: Dict[str, Any] = {}
 
+    @staticmethod
+    def _load_results(json_file: Path) -> Dict[str, Any]:
+        """讀取匹配結果檔（引用格式會還原為每個命中帶完整法條欄位）"""
+        with open(json_file, 'r', encoding='utf-8') as f:
+            return expand_article_refs(json.load(f))
+
     def get_all_reports(self) -> List[ReportSummary]:
         """獲取所有報告摘要列表"""
         reports = []
@@ -74,8 +81,7 @@ class DataService:
         if not json_file.exists():
             return None
 
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = self._load_results(json_file)
 
         # 轉換為 Pydantic 模型
         metadata = ReportMetadata(**data["metadata"])
@@ -126,8 +132,7 @@ class DataService:
         for json_file in self.data_dir.glob("*_mapped_embedded.json"):
             report_id = json_file.stem.replace("_mapped_embedded", "")
 
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = self._load_results(json_file)
 
             # 統計每個法條的出現次數
             for question in data.get("question_matches", []):
@@ -180,8 +185,7 @@ class DataService:
         for json_file in self.data_dir.glob("*_mapped_embedded.json"):
             report_id = json_file.stem.replace("_mapped_embedded", "")
 
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = self._load_results(json_file)
 
             for question in data.get("question_matches", []):
                 question_key = f"{report_id}_{question.get('question_number')}"
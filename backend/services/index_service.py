@@ -0,0 +1,105 @@
+"""
+索引服務層
+以 memmap 開啟 build-index 產生的索引包，提供法條查詢與即時匹配
+"""
+
+import logging
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.core_embedding.bundle import LawIndexBundle
+from src.core_embedding.embedding_matcher import EmbeddingMatcher
+from src.core_embedding.providers import provider_from_env
+
+# 本機後端的模型以語料訓練，索引包只記錄指紋，需由 store_dir/local_models 載入
+LOCAL_BACKENDS = ("char-tfidf", "sentence-transformers")
+
+logger = logging.getLogger(__name__)
+
+
+class IndexService:
+    """索引服務類"""
+
+    def __init__(self, bundle_path: Path, openai_api_key: Optional[str] = None,
+                 backend: str = "openai", store_dir: Optional[str] = None):
+        """
+        初始化索引服務（索引包不存在時服務停用，不影響報告 API）
+
+        Args:
+            bundle_path: 索引包路徑
+            openai_api_key: OpenAI API Key；openai 後端提供時才可即時匹配
+            backend: 建立索引包時的 embedding 後端（openai / gemini / char-tfidf / sentence-transformers / fake）
+            store_dir: embedding 儲存目錄（本機後端由此載入訓練過的模型）
+        """
+        self.bundle_path = bundle_path
+        self.bundle: Optional[LawIndexBundle] = None
+        self.matcher: Optional[EmbeddingMatcher] = None
+        self.load_time_ms = 0.0
+
+        if not bundle_path.exists():
+            logger.warning(f"索引包不存在，停用索引服務: {bundle_path}")
+            return
+
+        start_time = time.time()
+        self.bundle = LawIndexBundle.open(str(bundle_path))
+        self.matcher = self._create_matcher(backend, openai_api_key, store_dir)
+        self.load_time_ms = (time.time() - start_time) * 1000
+
+    def _create_matcher(self, backend: str, openai_api_key: Optional[str],
+                        store_dir: Optional[str]) -> Optional[EmbeddingMatcher]:
+        """以索引包的模型 / 維度建立即時匹配用的匹配器（遠端後端缺少 API Key 時停用）"""
+        local = backend in LOCAL_BACKENDS
+        try:
+            provider = provider_from_env(
+                backend,
+                model=None if local else self.bundle.embedding_model,
+                dimensions=None if local else self.bundle.dimensions,
+                api_key=openai_api_key if backend == "openai" else None
+            )
+        except ValueError as e:
+            logger.warning(f"停用即時匹配: {e}")
+            return None
+
+        matcher = EmbeddingMatcher(provider=provider, store_dir=store_dir if local else None)
+        return matcher if matcher.load_bundle(str(self.bundle_path)) else None
+
+    @property
+    def available(self) -> bool:
+        return self.bundle is not None
+
+    def get_info(self) -> Dict[str, Any]:
+        """索引包摘要"""
+        if self.bundle is None:
+            return {"available": False, "bundle_path": str(self.bundle_path)}
+        return {
+            "available": True,
+            "bundle_path": str(self.bundle_path),
+            "matching_enabled": self.matcher is not None,
+            "load_time_ms": self.load_time_ms,
+            **self.bundle.info()
+        }
+
+    def get_article(self, article_id: str) -> Optional[Dict[str, Any]]:
+        """依法條 ID 取得完整法條"""
+        if self.bundle is None:
+            return None
+        return self.bundle.article(article_id)
+
+    def match(self, text: str, top_k: int = 3, subject: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        即時匹配一段文字
+
+        Args:
+            text: 題目或選項文字
+            top_k: 返回的法條數
+            subject: 考科（有路由時限定搜尋範圍）
+
+        Returns:
+            匹配的法條（含 similarity）
+        """
+        if self.matcher is None:
+            raise RuntimeError("即時匹配未啟用（需要索引包與可用的 embedding 後端）")
+        route = self.matcher.resolve_route(subject) if subject else None
+        scope = route["targets"] if route else None
+        return list(self.matcher.match_questions_batch([("", text)], top_k=top_k, scope=scope)[0].matched_articles)
@@ -3,7 +3,31 @@
 純粹的 embedding 相似度匹配，無複雜邏輯
 """
 
-from .embedding_matcher import EmbeddingMatcher, MatchResult
+from .embedding_matcher import EmbeddingMatcher, MatchResult, OptionQuery
+from .local_embedding import LocalEmbeddingMatcher
+from .providers import EmbeddingProvider, FakeProvider, OpenAIProvider, create_provider
+from .embedding_store import EmbeddingStore
+from .async_builder import AsyncEmbeddingBuilder
+from .checkpoint import BatchCheckpoint, CorpusBuildError
+from .live_index import LiveLawIndex
+from .sparse_index import BM25Index, SparseLawIndex
+from .citations import AhoCorasick, Citation, CitationIndex
+from .rerank import LLMReranker
+from .dedup import NearDuplicateIndex
+from .article_table import ArticleTable
+from .bundle import LawIndexBundle, write_bundle
+from .ann_index import FlatIndex, IVFFlatIndex, HNSWIndex, TwoStageIndex, build_index, evaluate_recall
+from .quantization import QuantizedIndex
+from .query_cache import QueryEmbeddingCache
+from .routing import SUBJECT_ROUTES, PartitionMap, subject_from_filename
 
-__all__ = ['EmbeddingMatcher', 'MatchResult']
+__all__ = [
+    'EmbeddingMatcher', 'LocalEmbeddingMatcher', 'MatchResult', 'OptionQuery', 'EmbeddingStore',
+    'EmbeddingProvider', 'OpenAIProvider', 'FakeProvider', 'create_provider',
+    'FlatIndex', 'IVFFlatIndex', 'HNSWIndex', 'QuantizedIndex', 'TwoStageIndex',
+    'build_index', 'evaluate_recall',
+    'SUBJECT_ROUTES', 'PartitionMap', 'subject_from_filename',
+    'QueryEmbeddingCache', 'AsyncEmbeddingBuilder', 'BatchCheckpoint', 'CorpusBuildError',
+    'LiveLawIndex', 'BM25Index', 'SparseLawIndex', 'AhoCorasick', 'Citation', 'CitationIndex', 'LLMReranker', 'NearDuplicateIndex', 'ArticleTable', 'LawIndexBundle', 'write_bundle'
+]
 
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+法條向量索引
+- flat: 全量內積（預設，適合數千條法條）
+- ivf:  numpy 實作的 IVF-flat（spherical k-means 分群，查詢時只掃描 nprobe 個群）
+- hnsw: 選用 hnswlib（未安裝時無法使用）
+- float16 / int8: 量化矩陣計分（見 quantization.py）
+- matryoshka: 以前 coarse_dim 維的短向量粗篩全語料，再以完整向量重排候選
+近似索引僅負責產生候選，最終候選一律以原始向量重新計分
+"""
+
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from .quantization import QuantizedIndex
+from .scoring import top_k_search
+
+logger = logging.getLogger(__name__)
+
+
+class FlatIndex:
+    """全量內積索引"""
+
+    kind = "flat"
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        return top_k_search(queries, self.vectors, k)
+
+
+def _rescore(queries: np.ndarray, vectors: np.ndarray, candidates: list, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """以原始向量對每個查詢的候選列重新計分，輸出 (Q, k)，不足 k 的位置填 -1 / -inf"""
+    indices = np.full((len(candidates), k), -1, dtype=np.int64)
+    scores = np.full((len(candidates), k), -np.inf, dtype=np.result_type(queries.dtype, vectors.dtype))
+
+    for i, rows in enumerate(candidates):
+        if len(rows) == 0:
+            continue
+        rows = np.sort(rows)
+        local_idx, local_scores = top_k_search(queries[i:i + 1], vectors[rows], k)
+        found = local_idx.shape[1]
+        indices[i, :found] = rows[local_idx[0]]
+        scores[i, :found] = local_scores[0]
+
+    return indices, scores
+
+
+def _spherical_kmeans(samples: np.ndarray, nlist: int, iterations: int, seed: int) -> np.ndarray:
+    """以內積為距離的 k-means，回傳單位長度的群中心"""
+    rng = np.random.default_rng(seed)
+    centroids = samples[rng.choice(len(samples), nlist, replace=False)].astype(np.float32)
+
+    for _ in range(iterations):
+        assign, _ = top_k_search(samples, centroids, 1)
+        assign = assign[:, 0]
+
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, samples)
+        counts = np.bincount(assign, minlength=nlist)
+
+        # 空群重新以隨機樣本初始化
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = samples[rng.choice(len(samples), int(empty.sum()), replace=False)]
+
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = (sums / np.maximum(norms, 1e-12)).astype(np.float32)
+
+    return centroids
+
+
+class IVFFlatIndex:
+    """
+    IVF-flat 索引
+
+    Args:
+        vectors: (N, D) 法條向量
+        nlist: 分群數（預設 sqrt(N)）
+        nprobe: 查詢時掃描的群數，越大召回越高、延遲越高
+        iterations: k-means 迭代次數
+        train_size: 每群的訓練樣本數
+        seed: 隨機種子
+    """
+
+    kind = "ivf"
+
+    def __init__(self, vectors: np.ndarray, nlist: Optional[int] = None, nprobe: int = 8,
+                 iterations: int = 20, train_size: int = 64, seed: int = 0):
+        self.vectors = vectors
+        self.nlist = nlist or max(1, int(np.sqrt(len(vectors))))
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.train_size = train_size
+        self.seed = seed
+
+        self.centroids: Optional[np.ndarray] = None
+        self.list_rows: Optional[np.ndarray] = None      # 依群排序後的列索引
+        self.list_offsets: Optional[np.ndarray] = None   # 每群在 list_rows 的起訖位置
+
+    def train(self) -> "IVFFlatIndex":
+        """分群並建立倒排列表"""
+        num_rows = len(self.vectors)
+        self.nlist = min(self.nlist, num_rows)
+
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(num_rows, self.nlist * self.train_size)
+        sample_rows = np.sort(rng.choice(num_rows, sample_size, replace=False))
+        samples = np.asarray(self.vectors[sample_rows], dtype=np.float32)
+
+        logger.info(f"🔧 訓練 IVF 索引: {num_rows} 條, nlist={self.nlist}")
+        self.centroids = _spherical_kmeans(samples, self.nlist, self.iterations, self.seed)
+
+        assign, _ = top_k_search(self.vectors, self.centroids, 1)
+        assign = assign[:, 0]
+        self.list_rows = np.argsort(assign, kind='stable').astype(np.int64)
+        self.list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=self.nlist))]).astype(np.int64)
+        return self
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        queries = np.atleast_2d(queries)
+        probes, _ = top_k_search(queries, self.centroids, self.nprobe)
+
+        candidates = [
+            np.concatenate([self.list_rows[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probe])
+            for probe in probes
+        ]
+        return _rescore(queries, self.vectors, candidates, min(k, len(self.vectors)))
+
+    def save(self, path: Path, fingerprint: str) -> None:
+        params = {"nlist": self.nlist, "iterations": self.iterations,
+                  "train_size": self.train_size, "seed": self.seed, "fingerprint": fingerprint}
+        with open(path, 'wb') as f:
+            np.savez(f, centroids=self.centroids, list_rows=self.list_rows,
+                     list_offsets=self.list_offsets, params=json.dumps(params))
+
+    @classmethod
+    def load(cls, path: Path, vectors: np.ndarray, fingerprint: str, **params: Any) -> Optional["IVFFlatIndex"]:
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            saved = json.loads(str(data["params"]))
+            if saved.pop("fingerprint") != fingerprint:
+                return None
+            if any(saved.get(key) != value for key, value in params.items() if key in saved):
+                return None
+            index = cls(vectors, nprobe=params.get("nprobe", 8), **saved)
+            index.centroids = data["centroids"]
+            index.list_rows = data["list_rows"]
+            index.list_offsets = data["list_offsets"]
+        return index
+
+
+class HNSWIndex:
+    """
+    HNSW 索引（需安裝 hnswlib）
+
+    Args:
+        vectors: (N, D) 法條向量
+        m: 每個節點的連結數
+        ef_construction: 建構時的候選數
+        ef_search: 查詢時的候選數，越大召回越高
+        rerank_factor: 取 k × rerank_factor 個候選後以原始向量重新計分
+    """
+
+    kind = "hnsw"
+
+    def __init__(self, vectors: np.ndarray, m: int = 16, ef_construction: int = 200,
+                 ef_search: int = 64, rerank_factor: int = 4):
+        try:
+            import hnswlib
+        except ImportError as e:
+            raise ImportError("HNSW 索引需要 hnswlib: pip install hnswlib") from e
+
+        self._hnswlib = hnswlib
+        self.vectors = vectors
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.rerank_factor = rerank_factor
+        self.graph = None
+
+    def train(self) -> "HNSWIndex":
+        num_rows, dim = self.vectors.shape
+        logger.info(f"🔧 建立 HNSW 索引: {num_rows} 條, M={self.m}")
+        self.graph = self._hnswlib.Index(space='ip', dim=dim)
+        self.graph.init_index(max_elements=num_rows, ef_construction=self.ef_construction, M=self.m)
+        self.graph.add_items(np.asarray(self.vectors, dtype=np.float32), np.arange(num_rows))
+        self.graph.set_ef(self.ef_search)
+        return self
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        queries = np.atleast_2d(queries)
+        num_candidates = min(len(self.vectors), k * self.rerank_factor)
+        self.graph.set_ef(max(self.ef_search, num_candidates))
+        labels, _ = self.graph.knn_query(np.asarray(queries, dtype=np.float32), k=num_candidates)
+        return _rescore(queries, self.vectors, list(labels.astype(np.int64)), min(k, len(self.vectors)))
+
+    def save(self, path: Path, fingerprint: str) -> None:
+        self.graph.save_index(str(path))
+        params = {"m": self.m, "ef_construction": self.ef_construction, "fingerprint": fingerprint}
+        path.with_suffix(".json").write_text(json.dumps(params), encoding='utf-8')
+
+    @classmethod
+    def load(cls, path: Path, vectors: np.ndarray, fingerprint: str, **params: Any) -> Optional["HNSWIndex"]:
+        meta_path = path.with_suffix(".json")
+        if not path.exists() or not meta_path.exists():
+            return None
+        saved = json.loads(meta_path.read_text(encoding='utf-8'))
+        if saved.pop("fingerprint") != fingerprint:
+            return None
+        if any(saved.get(key) != value for key, value in params.items() if key in saved):
+            return None
+
+        index = cls(vectors, **{**params, **saved})
+        index.graph = index._hnswlib.Index(space='ip', dim=vectors.shape[1])
+        index.graph.load_index(str(path), max_elements=len(vectors))
+        index.graph.set_ef(index.ef_search)
+        return index
+
+
+def _truncate_normalize(vectors: np.ndarray, dim: int, block_size: int = 16384) -> np.ndarray:
+    """取前 dim 維並重新正規化為單位長度（Matryoshka 短向量）"""
+    out = np.empty((vectors.shape[0], dim), dtype=np.float32)
+    for start in range(0, vectors.shape[0], block_size):
+        block = np.asarray(vectors[start:start + block_size, :dim], dtype=np.float32)
+        out[start:start + block_size] = block / np.maximum(np.linalg.norm(block, axis=1, keepdims=True), 1e-12)
+    return out
+
+
+class TwoStageIndex:
+    """
+    Matryoshka 兩階段索引（text-embedding-3 系列）
+
+    Args:
+        vectors: (N, D) 完整向量
+        coarse_dim: 粗篩使用的前綴維度
+        shortlist_factor: 粗篩保留 k × shortlist_factor 個候選
+    """
+
+    kind = "matryoshka"
+
+    def __init__(self, vectors: np.ndarray, coarse_dim: int = 256, shortlist_factor: int = 10):
+        self.vectors = vectors
+        self.coarse_dim = min(coarse_dim, vectors.shape[1])
+        self.shortlist_factor = shortlist_factor
+        self.coarse: Optional[np.ndarray] = None
+
+    def train(self) -> "TwoStageIndex":
+        logger.info(f"🔧 建立 Matryoshka 粗篩矩陣: {self.vectors.shape[1]} → {self.coarse_dim} 維")
+        self.coarse = _truncate_normalize(self.vectors, self.coarse_dim)
+        return self
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        queries = np.atleast_2d(queries)
+        k = min(k, len(self.vectors))
+        shortlist, _ = top_k_search(_truncate_normalize(queries, self.coarse_dim), self.coarse, k * self.shortlist_factor)
+        return _rescore(queries, self.vectors, list(shortlist), k)
+
+    def save(self, path: Path, fingerprint: str) -> None:
+        params = {"coarse_dim": self.coarse_dim, "fingerprint": fingerprint}
+        with open(path, 'wb') as f:
+            np.savez(f, coarse=self.coarse, params=json.dumps(params))
+
+    @classmethod
+    def load(cls, path: Path, vectors: np.ndarray, fingerprint: str, **params: Any) -> Optional["TwoStageIndex"]:
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            saved = json.loads(str(data["params"]))
+            index = cls(vectors, **params)
+            if saved["fingerprint"] != fingerprint or saved["coarse_dim"] != index.coarse_dim:
+                return None
+            index.coarse = data["coarse"]
+        return index
+
+
+# 索引類型 -> (類別, 保存檔名, 固定參數)
+INDEX_TYPES = {
+    "flat": (FlatIndex, "", {}),
+    "ivf": (IVFFlatIndex, "index_ivf.npz", {}),
+    "hnsw": (HNSWIndex, "index_hnsw.bin", {}),
+    "float16": (QuantizedIndex, "index_float16.npz", {"mode": "float16"}),
+    "int8": (QuantizedIndex, "index_int8.npz", {"mode": "int8"}),
+    "matryoshka": (TwoStageIndex, "index_matryoshka.npz", {}),
+}
+
+
+def evaluate_recall(index, vectors: np.ndarray, k: int = 10, sample_size: int = 100,
+                    seed: int = 0, queries: Optional[np.ndarray] = None) -> float:
+    """
+    以全精度全量搜尋為基準，計算索引的 recall@k
+
+    Args:
+        index: 待檢查的索引
+        vectors: (N, D) 全精度法條向量
+        k: 比較的候選數
+        sample_size: 未提供 queries 時，從法條向量中抽樣作為查詢
+        seed: 抽樣種子
+        queries: 自訂查詢矩陣
+
+    Returns:
+        平均 recall@k（1.0 表示與全精度結果完全一致）
+    """
+    if queries is None:
+        rng = np.random.default_rng(seed)
+        rows = np.sort(rng.choice(len(vectors), min(sample_size, len(vectors)), replace=False))
+        queries = np.asarray(vectors[rows], dtype=np.float32)
+
+    exact, _ = top_k_search(queries, vectors, k)
+    approx, _ = index.search(queries, k)
+    hits = [len(set(e) & set(a[a >= 0])) / max(len(e), 1) for e, a in zip(exact, approx)]
+    return float(np.mean(hits)) if hits else 1.0
+
+
+def build_index(index_type: str, vectors: np.ndarray, params: Optional[Dict[str, Any]] = None,
+                store_dir: Optional[Path] = None, fingerprint: str = ""):
+    """
+    建立或載入向量索引
+
+    Args:
+        index_type: flat / ivf / hnsw / float16 / int8 / matryoshka
+        vectors: (N, D) 法條向量
+        params: 索引參數（召回 / 延遲調整）
+        store_dir: embedding 儲存（世代）目錄；提供時索引與向量一起保存
+        fingerprint: 語料指紋，語料變動時索引自動重建
+
+    Returns:
+        具備 search(queries, k) 的索引物件
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"不支援的索引類型: {index_type}（可用: {', '.join(INDEX_TYPES)}）")
+
+    index_cls, filename, fixed_params = INDEX_TYPES[index_type]
+    params = {**(params or {}), **fixed_params}
+    if index_type == "flat":
+        return FlatIndex(vectors)
+
+    path = Path(store_dir) / filename if store_dir else None
+    if path is not None:
+        try:
+            index = index_cls.load(path, vectors, fingerprint, **params)
+        except Exception as e:
+            logger.warning(f"⚠️ 讀取 {index_type} 索引失敗，重新建立: {e}")
+            index = None
+        if index is not None:
+            logger.info(f"⚡ 載入既有 {index_type} 索引: {path}")
+            return index
+
+    index = index_cls(vectors, **params).train()
+    if path is not None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        index.save(path, fingerprint)
+        logger.info(f"💾 {index_type} 索引已保存: {path}")
+    return index
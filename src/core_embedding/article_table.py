@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+欄式法條表
+與 embedding 矩陣逐列對齊：條號為 numpy 陣列，法規代碼 / 名稱 / 類別等低基數欄位以字典編碼，
+法條 ID 與條文內容各自串接成單一 UTF-8 緩衝區並以 offsets 切取（可直接以 memmap 開啟）；
+只有在輸出結果時才還原成 dict
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# 字典編碼的字串欄位
+CATEGORICAL_FIELDS = ("law_code", "law_name", "chapter_title", "category", "authority")
+
+# 分區排序鍵（類別 → 法規代碼 → 法規名稱），使每個分區在矩陣中連續
+SORT_FIELDS = ("category", "law_code", "law_name")
+
+# CSV 欄位 -> 表格欄位
+CSV_COLUMNS = {
+    "law_code": "法規代碼",
+    "law_name": "法規名稱",
+    "chapter_title": "章節標題",
+    "article_no_main": "條文主號",
+    "article_no_sub": "條文次號",
+    "content": "條文完整內容",
+    "category": "法規類別",
+    "authority": "主管機關",
+}
+
+
+ArticleKey = Tuple[str, int, int]  # (法規名稱, 條文主號, 條文次號)：不依賴法規代碼的條文識別
+
+
+def article_key(article: Dict[str, Any]) -> ArticleKey:
+    """法條 dict 的條文識別"""
+    return (str(article.get("law_name", "") or ""),
+            int(article.get("article_no_main", 0) or 0), int(article.get("article_no_sub", 0) or 0))
+
+
+def unique_article_ids(law_codes: Sequence[str], law_names: Sequence[str],
+                       article_no_main: Sequence[int], article_no_sub: Sequence[int]) -> List[str]:
+    """
+    產生唯一的法條 ID：法規代碼-條號(-次號)
+
+    - 法規代碼只對應一部法規時沿用代碼（REAA-1）；空白或多部法規共用的代碼（未知法規一律為 UNKN）
+      改用法規名稱（土地法-10），不同法規的同號條文不會互相覆蓋
+    - 仍然重複者（同一法規同號條文，如次號未解析的「之一」）依出現順序加上 #2、#3…
+    """
+    names_of: Dict[str, set] = {}
+    for code, name in zip(law_codes, law_names):
+        names_of.setdefault(code, set()).add(name)
+
+    ids: List[str] = []
+    seen: Dict[str, int] = {}
+    for code, name, main, sub in zip(law_codes, law_names, article_no_main, article_no_sub):
+        prefix = code if code and len(names_of[code]) == 1 else (name or code)
+        article_id = f"{prefix}-{int(main)}" + (f"-{int(sub)}" if int(sub) > 0 else "")
+        seen[article_id] = seen.get(article_id, 0) + 1
+        ids.append(article_id if seen[article_id] == 1 else f"{article_id}#{seen[article_id]}")
+    return ids
+
+
+def _encode(values: Sequence[str]) -> Tuple[List[str], np.ndarray]:
+    """字典編碼：(唯一值列表, int32 代碼)"""
+    uniques, codes = np.unique(np.asarray(values, dtype=object).astype(str), return_inverse=True)
+    return uniques.tolist(), codes.astype(np.int32)
+
+
+class StringColumn:
+    """以 UTF-8 緩衝區 + offsets 儲存的字串欄，讀取時才解碼"""
+
+    def __init__(self, buffer: np.ndarray, offsets: np.ndarray):
+        self.buffer = buffer
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, values: Sequence[str]) -> "StringColumn":
+        encoded = [str(value).encode("utf-8") for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row: int) -> str:
+        return self.buffer[self.offsets[row]:self.offsets[row + 1]].tobytes().decode("utf-8")
+
+    def tolist(self) -> List[str]:
+        data = self.buffer.tobytes()
+        offsets = self.offsets.tolist()
+        return [data[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(self))]
+
+    def take(self, indices: np.ndarray) -> "StringColumn":
+        return StringColumn.from_strings([self[int(i)] for i in indices])
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.buffer.nbytes + self.offsets.nbytes)
+
+
+class ArticleTable:
+    """
+    欄式法條表（通常以 from_dataframe / from_records / from_columns 建立）
+
+    Args:
+        ids: 法條 ID 字串欄
+        article_no_main / article_no_sub: 條文主號 / 次號
+        content: 條文內容字串欄
+        dictionaries: 字典編碼欄位的唯一值
+        codes: 字典編碼欄位的 int32 代碼
+    """
+
+    def __init__(self, ids: StringColumn, article_no_main: np.ndarray, article_no_sub: np.ndarray,
+                 content: StringColumn, dictionaries: Dict[str, List[str]], codes: Dict[str, np.ndarray]):
+        self.ids = ids
+        self.article_no_main = article_no_main
+        self.article_no_sub = article_no_sub
+        self.content_column = content
+        self.dictionaries = dictionaries
+        self.codes = codes
+
+    @classmethod
+    def from_columns(cls, ids: Sequence[str], article_no_main: Sequence[int], article_no_sub: Sequence[int],
+                     content: Sequence[str], **categorical: Optional[Sequence[str]]) -> "ArticleTable":
+        """由各欄的值建立（字串欄位自動字典編碼）"""
+        dictionaries: Dict[str, List[str]] = {}
+        codes: Dict[str, np.ndarray] = {}
+        for field in CATEGORICAL_FIELDS:
+            values = categorical.get(field)
+            if values is None:
+                values = [""] * len(ids)
+            dictionaries[field], codes[field] = _encode(values)
+
+        return cls(
+            ids=StringColumn.from_strings(ids),
+            article_no_main=np.asarray(article_no_main, dtype=np.int32),
+            article_no_sub=np.asarray(article_no_sub, dtype=np.int32),
+            content=StringColumn.from_strings(content),
+            dictionaries=dictionaries,
+            codes=codes,
+        )
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> "ArticleTable":
+        """由法條 CSV 的 DataFrame 建立（向量化，不逐列 iterrows）"""
+        def text_column(field: str) -> pd.Series:
+            column = CSV_COLUMNS[field]
+            if column not in df.columns:
+                return pd.Series([""] * len(df), index=df.index)
+            return df[column].fillna("").astype(str)
+
+        main = df[CSV_COLUMNS["article_no_main"]].astype(int)
+        sub = df[CSV_COLUMNS["article_no_sub"]].fillna(0).astype(int)
+        ids = unique_article_ids(text_column("law_code").tolist(), text_column("law_name").tolist(),
+                                 main.tolist(), sub.tolist())
+
+        return cls.from_columns(
+            ids=ids,
+            article_no_main=main.to_numpy(),
+            article_no_sub=sub.to_numpy(),
+            content=text_column("content").tolist(),
+            **{field: text_column(field).tolist() for field in CATEGORICAL_FIELDS}
+        )
+
+    @classmethod
+    def from_records(cls, articles: Sequence[Dict[str, Any]]) -> "ArticleTable":
+        """由法條 dict 列表建立（線上更新用）"""
+        return cls.from_columns(
+            ids=[article["id"] for article in articles],
+            article_no_main=[int(article.get("article_no_main", 0) or 0) for article in articles],
+            article_no_sub=[int(article.get("article_no_sub", 0) or 0) for article in articles],
+            content=[article.get("content", "") for article in articles],
+            **{field: [str(article.get(field, "") or "") for article in articles] for field in CATEGORICAL_FIELDS}
+        )
+
+    @classmethod
+    def concat(cls, tables: Sequence["ArticleTable"]) -> "ArticleTable":
+        return cls.from_columns(
+            ids=[article_id for table in tables for article_id in table.ids.tolist()],
+            article_no_main=np.concatenate([table.article_no_main for table in tables]) if tables else [],
+            article_no_sub=np.concatenate([table.article_no_sub for table in tables]) if tables else [],
+            content=[text for table in tables for text in table.contents()],
+            **{field: np.concatenate([table.column(field) for table in tables]) if tables else []
+               for field in CATEGORICAL_FIELDS}
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        """常駐記憶體估計"""
+        arrays = [self.article_no_main, self.article_no_sub, *self.codes.values()]
+        return int(sum(array.nbytes for array in arrays) + self.ids.nbytes + self.content_column.nbytes)
+
+    def column(self, field: str) -> np.ndarray:
+        """取得整欄（字典編碼欄位會解碼為字串陣列）"""
+        if field == "id":
+            return np.asarray(self.ids.tolist(), dtype=object)
+        if field in ("article_no_main", "article_no_sub"):
+            return getattr(self, field)
+        if field == "content":
+            return np.asarray(self.contents(), dtype=object)
+        return np.asarray(self.dictionaries[field], dtype=object)[self.codes[field]]
+
+    def value(self, row: int, field: str) -> str:
+        """單一儲存格（字典編碼欄位）"""
+        return self.dictionaries[field][self.codes[field][row]]
+
+    def content(self, row: int) -> str:
+        return self.content_column[row]
+
+    def contents(self) -> List[str]:
+        return self.content_column.tolist()
+
+    def row(self, row: int) -> Dict[str, Any]:
+        """還原為與舊版 law_articles 相同欄位的 dict"""
+        return {
+            "id": self.ids[row],
+            "law_code": self.value(row, "law_code"),
+            "law_name": self.value(row, "law_name"),
+            "chapter_title": self.value(row, "chapter_title"),
+            "article_no_main": int(self.article_no_main[row]),
+            "article_no_sub": int(self.article_no_sub[row]),
+            "content": self.content(row),
+            "category": self.value(row, "category"),
+            "authority": self.value(row, "authority"),
+        }
+
+    def keys(self) -> List[ArticleKey]:
+        """每列的條文識別 (法規名稱, 條號, 次號)"""
+        return list(zip(self.column("law_name").tolist(),
+                        np.asarray(self.article_no_main).tolist(), np.asarray(self.article_no_sub).tolist()))
+
+    def rows(self, indices: Optional[Sequence[int]] = None) -> List[Dict[str, Any]]:
+        indices = range(len(self)) if indices is None else indices
+        return [self.row(int(i)) for i in indices]
+
+    def take(self, indices: Sequence[int]) -> "ArticleTable":
+        """依列號重新排列 / 篩選"""
+        indices = np.asarray(indices, dtype=np.int64)
+        return ArticleTable(
+            ids=self.ids.take(indices),
+            article_no_main=np.asarray(self.article_no_main)[indices],
+            article_no_sub=np.asarray(self.article_no_sub)[indices],
+            content=self.content_column.take(indices),
+            dictionaries=self.dictionaries,
+            codes={field: np.asarray(codes)[indices] for field, codes in self.codes.items()},
+        )
+
+    def sort_order(self) -> np.ndarray:
+        """分區排序的列順序（穩定排序）"""
+        # np.lexsort 以最後一個鍵為主鍵；字典依字串排序，代碼順序即字串順序
+        keys = [self.codes[field] for field in reversed(SORT_FIELDS)]
+        return np.lexsort(keys)
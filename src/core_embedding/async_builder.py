@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+非同步法條 Embedding 建構器
+以 AsyncOpenAI 併發送出批次請求，依每分鐘請求數 / token 數配額節流，
+遇到 429 等暫時性錯誤時指數退避重試，仍失敗的批次二分處理；
+完成的批次寫入檢查點，輸出順序與輸入相同
+"""
+
+import asyncio
+import logging
+import time
+from typing import Callable, List, Optional
+
+import numpy as np
+from openai import (
+    APIConnectionError,
+    APITimeoutError,
+    AsyncOpenAI,
+    InternalServerError,
+    RateLimitError,
+)
+
+from .batching import chunk_texts, get_token_counter, plan_batches, pool_chunks
+from .checkpoint import BatchCheckpoint, ensure_complete, is_input_error, retry_delay
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+
+class RateLimiter:
+    """每分鐘請求數 / token 數的 token bucket"""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._request_allowance = float(requests_per_minute)
+        self._token_allowance = float(tokens_per_minute)
+        self._last_refill = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed_minutes = (now - self._last_refill) / 60.0
+        self._last_refill = now
+        self._request_allowance = min(self.requests_per_minute,
+                                      self._request_allowance + elapsed_minutes * self.requests_per_minute)
+        self._token_allowance = min(self.tokens_per_minute,
+                                    self._token_allowance + elapsed_minutes * self.tokens_per_minute)
+
+    async def acquire(self, tokens: int) -> None:
+        """等待直到配額足以送出一個 tokens 大小的請求"""
+        tokens = min(tokens, self.tokens_per_minute)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._request_allowance >= 1 and self._token_allowance >= tokens:
+                    self._request_allowance -= 1
+                    self._token_allowance -= tokens
+                    return
+
+                wait_requests = (1 - self._request_allowance) * 60.0 / self.requests_per_minute
+                wait_tokens = (tokens - self._token_allowance) * 60.0 / self.tokens_per_minute
+                await asyncio.sleep(max(wait_requests, wait_tokens, 0.01))
+
+
+class AsyncEmbeddingBuilder:
+    """
+    併發的語料 embedding 建構器
+
+    Args:
+        api_key: OpenAI API Key
+        embedding_model: embedding 模型
+        dimensions: 縮短的向量維度（None 為模型完整維度）
+        concurrency: 同時進行中的請求數上限
+        requests_per_minute: 每分鐘請求數配額
+        tokens_per_minute: 每分鐘 token 配額
+        max_retries: 暫時性錯誤的最大重試次數
+        batch_size: 每次請求最多筆數
+        max_batch_tokens: 每次請求最多 token 數
+        max_input_tokens: 單筆輸入最多 token 數（超過時切段後加權平均）
+        count_tokens: token 計數函式（None 則依模型取得）
+    """
+
+    def __init__(self, api_key: str, embedding_model: str = "text-embedding-3-large",
+                 dimensions: Optional[int] = None, concurrency: int = 8,
+                 requests_per_minute: int = 3000, tokens_per_minute: int = 1000000,
+                 max_retries: int = 6, batch_size: int = 2048, max_batch_tokens: int = 300000,
+                 max_input_tokens: int = 8191, count_tokens: Optional[Callable[[str], int]] = None):
+        self.api_key = api_key
+        self.embedding_model = embedding_model
+        self.dimensions = dimensions
+        self.concurrency = concurrency
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_input_tokens = max_input_tokens
+        self.count_tokens = count_tokens or get_token_counter(embedding_model)
+
+    def build(self, texts: List[str], checkpoint: Optional[BatchCheckpoint] = None) -> np.ndarray:
+        """同步介面：建立所有文本的 embeddings（與 texts 同序）"""
+        return asyncio.run(self.build_async(texts, checkpoint))
+
+    async def build_async(self, texts: List[str], checkpoint: Optional[BatchCheckpoint] = None) -> np.ndarray:
+        chunks, owners = chunk_texts(texts, self.max_input_tokens, self.count_tokens)
+        batches = plan_batches(chunks, self.batch_size, self.max_batch_tokens, self.count_tokens)
+        results: List[List[Optional[np.ndarray]]] = [[] for _ in batches]
+
+        client = AsyncOpenAI(api_key=self.api_key)
+        limiter = RateLimiter(self.requests_per_minute, self.tokens_per_minute)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        start_time = time.time()
+        done = 0
+
+        async def run(batch_no: int) -> None:
+            nonlocal done
+            batch_texts = [chunks[i] for i in batches[batch_no]]
+            results[batch_no] = await self._embed_resilient(client, limiter, semaphore, batch_texts, checkpoint)
+            done += 1
+            logger.info(f"完成批次 {done}/{len(batches)}")
+
+        logger.info(f"🚀 非同步建立 embeddings: {len(texts)} 條, {len(batches)} 批, 併發 {self.concurrency}")
+        await asyncio.gather(*(run(batch_no) for batch_no in range(len(batches))))
+        logger.info(f"✅ 非同步建立完成: {time.time() - start_time:.1f} 秒")
+
+        embeddings = [vector for batch_result in results for vector in batch_result]
+        weights = [self.count_tokens(chunk) for chunk in chunks]
+        return pool_chunks(ensure_complete(embeddings), owners, weights, len(texts))
+
+    async def _embed_resilient(self, client: AsyncOpenAI, limiter: RateLimiter, semaphore: asyncio.Semaphore,
+                               batch: List[str], checkpoint: Optional[BatchCheckpoint]) -> List[Optional[np.ndarray]]:
+        """檢查點 → 退避重試 → 二分（僅輸入錯誤，其他錯誤直接拋出）；無法取得的位置為 None"""
+        if checkpoint is not None:
+            cached = checkpoint.get(batch)
+            if cached is not None:
+                return list(cached)
+
+        try:
+            vectors = np.asarray(await self._embed_batch(client, limiter, semaphore, batch), dtype=np.float32)
+        except Exception as e:
+            if not is_input_error(e):
+                raise
+            if len(batch) == 1:
+                logger.error(f"❌ 單筆輸入無法取得 embedding: {e}")
+                return [None]
+
+            middle = len(batch) // 2
+            logger.warning(f"⚠️ 批次失敗（{type(e).__name__}），二分為 {middle} + {len(batch) - middle} 筆重試")
+            halves = await asyncio.gather(
+                self._embed_resilient(client, limiter, semaphore, batch[:middle], checkpoint),
+                self._embed_resilient(client, limiter, semaphore, batch[middle:], checkpoint)
+            )
+            results = halves[0] + halves[1]
+            if all(vector is not None for vector in results) and checkpoint is not None:
+                checkpoint.put(batch, np.stack(results))
+            return results
+
+        if checkpoint is not None:
+            checkpoint.put(batch, vectors)
+        return list(vectors)
+
+    async def _embed_batch(self, client: AsyncOpenAI, limiter: RateLimiter,
+                           semaphore: asyncio.Semaphore, batch: List[str]) -> List[List[float]]:
+        """送出單一批次，暫時性錯誤時退避重試"""
+        tokens = sum(self.count_tokens(text) for text in batch)
+        kwargs = {"dimensions": self.dimensions} if self.dimensions else {}
+
+        for attempt in range(self.max_retries + 1):
+            await limiter.acquire(tokens)
+            async with semaphore:
+                try:
+                    response = await client.embeddings.create(input=batch, model=self.embedding_model, **kwargs)
+                    return [data.embedding for data in response.data]
+                except RETRYABLE_ERRORS as e:
+                    if attempt == self.max_retries:
+                        raise
+                    delay = retry_delay(e, attempt)
+                    logger.warning(f"⚠️ 批次請求失敗（{type(e).__name__}），{delay:.1f} 秒後重試 ({attempt + 1}/{self.max_retries})")
+            await asyncio.sleep(delay)
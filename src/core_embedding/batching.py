@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Embedding 請求批次規劃
+依據每次請求的筆數與 token 上限，將文本打包成最少的 API 請求；
+超過單筆輸入上限的長條文以固定規則切段，各段向量依 token 數加權平均
+"""
+
+import logging
+import re
+from functools import lru_cache
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .checkpoint import ensure_complete
+
+logger = logging.getLogger(__name__)
+
+# 切段時優先在句末 / 分項處斷開
+_SENTENCE_BREAK = re.compile(r"(?<=[。；;\n])")
+
+
+def estimate_tokens(text: str) -> int:
+    """保守估計 token 數：UTF-8 位元組數的一半（中文約 1.5 token/字）"""
+    return len(text.encode("utf-8")) // 2 + 1
+
+
+@lru_cache(maxsize=None)
+def get_token_counter(embedding_model: str) -> Callable[[str], int]:
+    """
+    取得模型的 token 計數函式（結果以 LRU 快取，重建時同一條文不重複計數）
+
+    有安裝 tiktoken 時使用模型對應的 tokenizer，否則退回 estimate_tokens
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return lru_cache(maxsize=65536)(estimate_tokens)
+
+    try:
+        encoding = tiktoken.encoding_for_model(embedding_model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("cl100k_base")
+
+    @lru_cache(maxsize=65536)
+    def count_tokens(text: str) -> int:
+        return len(encoding.encode(text, disallowed_special=()))
+
+    return count_tokens
+
+
+def split_text(text: str, max_tokens: int,
+               count_tokens: Callable[[str], int] = estimate_tokens) -> List[str]:
+    """
+    將超過單筆輸入上限的文本切成數段（同一文本永遠得到相同切法）
+
+    先依句末標點切句再貪婪合併；單句仍過長時依字元硬切
+    """
+    if count_tokens(text) <= max_tokens:
+        return [text]
+
+    pieces: List[str] = []
+    for sentence in filter(None, _SENTENCE_BREAK.split(text)):
+        while count_tokens(sentence) > max_tokens:
+            # 二分搜尋不超過上限的最長前綴
+            low, high = 1, len(sentence)
+            while low < high:
+                mid = (low + high + 1) // 2
+                if count_tokens(sentence[:mid]) <= max_tokens:
+                    low = mid
+                else:
+                    high = mid - 1
+            pieces.append(sentence[:low])
+            sentence = sentence[low:]
+        if sentence:
+            pieces.append(sentence)
+
+    chunks: List[str] = []
+    for piece in pieces:
+        if chunks and count_tokens(chunks[-1] + piece) <= max_tokens:
+            chunks[-1] += piece
+        else:
+            chunks.append(piece)
+    return chunks
+
+
+def chunk_texts(texts: Sequence[str], max_input_tokens: int,
+                count_tokens: Callable[[str], int] = estimate_tokens) -> Tuple[List[str], List[int]]:
+    """
+    切分所有過長文本
+
+    Returns:
+        (chunks, owners)：owners[j] 為 chunks[j] 所屬的原文本索引
+    """
+    chunks: List[str] = []
+    owners: List[int] = []
+    for i, text in enumerate(texts):
+        parts = split_text(text, max_input_tokens, count_tokens)
+        chunks.extend(parts)
+        owners.extend([i] * len(parts))
+
+    if len(chunks) > len(texts):
+        logger.info(f"✂️ 過長文本切段: {len(texts)} 筆 → {len(chunks)} 段")
+    return chunks, owners
+
+
+def pool_chunks(chunk_vectors: np.ndarray, owners: List[int], weights: List[int],
+                num_texts: int) -> np.ndarray:
+    """將各段向量依 token 數加權平均回原文本，並重新正規化為單位向量"""
+    chunk_vectors = np.asarray(chunk_vectors, dtype=np.float32)
+    if len(chunk_vectors) == num_texts:
+        return chunk_vectors
+
+    pooled = np.zeros((num_texts, chunk_vectors.shape[1]), dtype=np.float32)
+    np.add.at(pooled, np.asarray(owners), chunk_vectors * np.asarray(weights, dtype=np.float32)[:, None])
+    norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+    return pooled / np.where(norms > 0, norms, 1.0)
+
+
+def embed_in_batches(texts: Sequence[str], embed_batch: Callable[[List[str]], List[Optional[List[float]]]],
+                     max_items: int, max_tokens: int, max_input_tokens: int,
+                     count_tokens: Callable[[str], int] = estimate_tokens) -> np.ndarray:
+    """
+    切段、打包、逐批呼叫 embed_batch，再合併回與 texts 同序的向量矩陣
+
+    Args:
+        texts: 要 embedding 的文本
+        embed_batch: 送出單一請求並回傳該批向量的函式（無法取得的位置為 None）
+        max_items: 每次請求最多筆數
+        max_tokens: 每次請求最多 token 數
+        max_input_tokens: 單筆輸入最多 token 數
+        count_tokens: token 計數函式
+    """
+    chunks, owners = chunk_texts(texts, max_input_tokens, count_tokens)
+    batches = plan_batches(chunks, max_items, max_tokens, count_tokens)
+
+    embeddings: List[Optional[List[float]]] = []
+    for batch_no, batch in enumerate(batches, 1):
+        embeddings.extend(embed_batch([chunks[i] for i in batch]))
+        logger.info(f"完成批次 {batch_no}/{len(batches)}")
+
+    weights = [count_tokens(chunk) for chunk in chunks]
+    return pool_chunks(ensure_complete(embeddings), owners, weights, len(texts))
+
+
+def plan_batches(texts: List[str], max_items: int, max_tokens: int,
+                 count_tokens: Callable[[str], int] = estimate_tokens) -> List[List[int]]:
+    """
+    將文本依序打包成批次（保持原順序）
+
+    Args:
+        texts: 要 embedding 的文本
+        max_items: 每次請求最多筆數
+        max_tokens: 每次請求最多 token 數
+        count_tokens: token 計數函式
+
+    Returns:
+        每個批次包含的文本索引
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+
+    for i, text in enumerate(texts):
+        tokens = count_tokens(text)
+        if current and (len(current) >= max_items or current_tokens + tokens > max_tokens):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+
+    if current:
+        batches.append(current)
+    return batches
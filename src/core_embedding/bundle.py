@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+單檔法條索引包（.bundle）
+內含法條表、embedding 矩陣、分區範圍與 ID -> 列號對照，開啟時只讀取表頭並以 memmap 對應其餘區段，
+不需解析 CSV 或重建 embeddings
+
+檔案格式（little-endian）:
+    [0:8]    MAGIC
+    [8:12]   uint32 格式版本
+    [12:16]  uint32 表頭長度
+    [16:]    JSON 表頭（模型、筆數、字典、分區、各區段位置）
+    對齊後   各區段資料（每段 64 位元組對齊，位置相對於資料起點）
+"""
+
+import hashlib
+import json
+import logging
+import struct
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .article_table import CATEGORICAL_FIELDS, ArticleTable, StringColumn
+from .embedding_store import _atomic_write_bytes
+from .routing import PartitionMap
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"LAWINDEX"
+BUNDLE_VERSION = 1
+ALIGNMENT = 64
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _id_hashes(ids: List[str]) -> np.ndarray:
+    """法條 ID 的 64 位元雜湊（ID -> 列號查表用）"""
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(article_id.encode("utf-8"), digest_size=8).digest(), "little")
+         for article_id in ids],
+        dtype=np.uint64
+    )
+
+
+def write_bundle(path: str, articles: ArticleTable, vectors: np.ndarray, partitions: PartitionMap,
+                 embedding_model: str, dimensions: Optional[int] = None, fingerprint: str = "") -> Path:
+    """
+    寫入索引包（先寫暫存檔再原子取代）
+
+    Args:
+        path: 輸出路徑
+        articles: 法條表（須與 vectors 逐列對齊，並依分區排序）
+        vectors: (N, D) 法條向量
+        partitions: 分區範圍
+        embedding_model: embedding 模型
+        dimensions: 縮短的向量維度（None 為模型完整維度）
+        fingerprint: 語料指紋
+
+    Returns:
+        輸出路徑
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if len(articles) != len(vectors):
+        raise ValueError(f"法條數 ({len(articles)}) 與向量數 ({len(vectors)}) 不一致")
+
+    hashes = _id_hashes(articles.ids.tolist())
+    hash_order = np.argsort(hashes, kind='stable')
+
+    sections: List[Tuple[str, np.ndarray]] = [
+        ("vectors", vectors),
+        ("id_offsets", articles.ids.offsets),
+        ("id_buffer", articles.ids.buffer),
+        ("content_offsets", articles.content_column.offsets),
+        ("content_buffer", articles.content_column.buffer),
+        ("article_no_main", articles.article_no_main),
+        ("article_no_sub", articles.article_no_sub),
+        ("id_hash", hashes[hash_order]),
+        ("id_hash_rows", hash_order.astype(np.int64)),
+    ]
+    sections += [(f"codes_{field}", articles.codes[field]) for field in CATEGORICAL_FIELDS]
+
+    layout: Dict[str, Dict[str, Any]] = {}
+    offset = 0
+    for name, array in sections:
+        array = np.ascontiguousarray(array)
+        layout[name] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+        offset = _align(offset + array.nbytes)
+
+    header = {
+        "format_version": BUNDLE_VERSION,
+        "embedding_model": embedding_model,
+        "dimensions": dimensions,
+        "count": int(vectors.shape[0]),
+        "dim": int(vectors.shape[1]),
+        "fingerprint": fingerprint,
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "dictionaries": articles.dictionaries,
+        "partitions": partitions.ranges,
+        "sections": layout,
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    data_start = _align(16 + len(header_bytes))
+
+    def writer(f) -> None:
+        f.write(MAGIC + struct.pack("<II", BUNDLE_VERSION, len(header_bytes)) + header_bytes)
+        f.write(b"\0" * (data_start - f.tell()))
+        for name, array in sections:
+            f.write(b"\0" * (data_start + layout[name]["offset"] - f.tell()))
+            f.write(np.ascontiguousarray(array).tobytes())
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _atomic_write_bytes(path, writer)
+    logger.info(f"📦 索引包已寫入: {path} ({len(articles)} 條, {path.stat().st_size / 1e6:.1f} MB)")
+    return path
+
+
+class LawIndexBundle:
+    """以 memmap 開啟的索引包（唯讀）"""
+
+    def __init__(self, path: Path, header: Dict[str, Any], arrays: Dict[str, np.ndarray]):
+        self.path = path
+        self.header = header
+        self.embedding_model: str = header["embedding_model"]
+        self.dimensions: Optional[int] = header.get("dimensions")
+        self.fingerprint: str = header.get("fingerprint", "")
+        self.vectors = arrays["vectors"]
+        self.articles = ArticleTable(
+            ids=StringColumn(arrays["id_buffer"], arrays["id_offsets"]),
+            article_no_main=arrays["article_no_main"],
+            article_no_sub=arrays["article_no_sub"],
+            content=StringColumn(arrays["content_buffer"], arrays["content_offsets"]),
+            dictionaries=header["dictionaries"],
+            codes={field: arrays[f"codes_{field}"] for field in CATEGORICAL_FIELDS},
+        )
+        self.partitions = PartitionMap.from_ranges(header["partitions"], header["count"])
+        self._id_hash = arrays["id_hash"]
+        self._id_hash_rows = arrays["id_hash_rows"]
+
+    @classmethod
+    def open(cls, path: str) -> "LawIndexBundle":
+        """讀取表頭並以單一唯讀 memmap 對應所有區段"""
+        path = Path(path)
+        with open(path, "rb") as f:
+            prefix = f.read(16)
+            if len(prefix) < 16 or prefix[:8] != MAGIC:
+                raise ValueError(f"不是法條索引包: {path}")
+            version, header_len = struct.unpack("<II", prefix[8:16])
+            if version > BUNDLE_VERSION:
+                raise ValueError(f"索引包格式版本 {version} 較新，請更新程式（支援至 {BUNDLE_VERSION}）")
+            header = json.loads(f.read(header_len).decode("utf-8"))
+
+        data = np.memmap(path, dtype=np.uint8, mode="r")
+        data_start = _align(16 + header_len)
+        arrays = {}
+        for name, section in header["sections"].items():
+            dtype = np.dtype(section["dtype"])
+            start = data_start + section["offset"]
+            size = int(np.prod(section["shape"], dtype=np.int64)) * dtype.itemsize
+            arrays[name] = data[start:start + size].view(dtype).reshape(section["shape"])
+        return cls(path, header, arrays)
+
+    def __len__(self) -> int:
+        return int(self.header["count"])
+
+    def row_of(self, article_id: str) -> Optional[int]:
+        """法條 ID -> 列號（雜湊二分搜尋後比對 ID）"""
+        h = _id_hashes([article_id])[0]
+        start = int(np.searchsorted(self._id_hash, h, side="left"))
+        end = int(np.searchsorted(self._id_hash, h, side="right"))
+        for i in range(start, end):
+            row = int(self._id_hash_rows[i])
+            if self.articles.ids[row] == article_id:
+                return row
+        return None
+
+    def article(self, article_id: str) -> Optional[Dict[str, Any]]:
+        row = self.row_of(article_id)
+        return self.articles.row(row) if row is not None else None
+
+    def info(self) -> Dict[str, Any]:
+        """索引包摘要（不含字典與區段配置）"""
+        return {
+            key: self.header[key]
+            for key in ("format_version", "embedding_model", "dimensions", "count", "dim", "fingerprint", "created_at")
+        }
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+可續建的語料 Embedding 建立
+- 每個完成的批次立即寫入檢查點（以批次內容雜湊為鍵），中斷後重跑只補未完成的批次
+- 暫時性錯誤指數退避重試；輸入錯誤（過長、格式不符）則將批次二分，找出真正無法處理的輸入
+- 其他錯誤（驗證、權限、重試用盡的限流）立即拋出，不二分重送
+- 任何一列缺少向量時拒絕發布，不以零向量代替
+"""
+
+import hashlib
+import logging
+import random
+import shutil
+import time
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple, Type
+
+import numpy as np
+
+from .embedding_store import _atomic_write_bytes, text_hash
+
+logger = logging.getLogger(__name__)
+
+
+class CorpusBuildError(RuntimeError):
+    """語料 embedding 未完整建立（已完成的批次保留在檢查點中）"""
+
+
+def batch_key(texts: Sequence[str]) -> str:
+    """批次內容雜湊：依序串接各文本雜湊後的雜湊"""
+    return hashlib.sha256("".join(text_hash(text) for text in texts).encode("ascii")).hexdigest()
+
+
+# 輸入錯誤的 HTTP 狀態碼與訊息片段（二分後可讓其餘輸入完成）
+INPUT_ERROR_STATUS = (400, 413, 422)
+INPUT_ERROR_MESSAGES = ("context length", "maximum context", "too long", "too many tokens", "token limit")
+
+
+def is_input_error(error: BaseException) -> bool:
+    """是否為單一批次內容造成的錯誤（BadRequest / 超過長度上限），只有這類錯誤值得二分重送"""
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status is None and isinstance(getattr(error, "code", None), int):
+        status = error.code
+    if status in INPUT_ERROR_STATUS:
+        return True
+    if any(name in type(error).__name__ for name in ("BadRequest", "InvalidArgument")):
+        return True
+    message = str(error).lower()
+    return any(fragment in message for fragment in INPUT_ERROR_MESSAGES)
+
+
+def retry_delay(error: Exception, attempt: int, max_delay: float = 60.0) -> float:
+    """優先使用伺服器的 retry-after，否則指數退避加隨機抖動"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return min(max_delay, 2.0 ** attempt) * (1 + random.random() * 0.25)
+
+
+class BatchCheckpoint:
+    """批次檢查點：每個完成的批次一個 .npy 檔"""
+
+    def __init__(self, checkpoint_dir: str):
+        self.checkpoint_dir = Path(checkpoint_dir)
+
+    def _path(self, key: str) -> Path:
+        return self.checkpoint_dir / f"{key}.npy"
+
+    def get(self, texts: Sequence[str]) -> Optional[np.ndarray]:
+        path = self._path(batch_key(texts))
+        if not path.exists():
+            return None
+        try:
+            vectors = np.load(path)
+        except Exception as e:
+            logger.warning(f"⚠️ 檢查點損毀，重新請求: {path.name} ({e})")
+            return None
+        return vectors if len(vectors) == len(texts) else None
+
+    def put(self, texts: Sequence[str], vectors: np.ndarray) -> None:
+        matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        _atomic_write_bytes(self._path(batch_key(texts)), lambda f: np.save(f, matrix))
+
+    def clear(self) -> None:
+        """語料發布後移除檢查點"""
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+
+
+class ResilientEmbedder:
+    """
+    包裝單一批次的 embedding 請求：檢查點 → 退避重試 → 二分（僅輸入錯誤）
+
+    Args:
+        embed_batch: 送出單一請求並回傳該批向量的函式
+        checkpoint: 批次檢查點（None 則不保存）
+        retryable: 視為暫時性、需要退避重試的例外類型
+        max_retries: 暫時性錯誤的最大重試次數
+        sleep: 等待函式（可替換以便測試）
+        splittable: 判斷錯誤是否由輸入造成（是才二分，否則直接拋出）
+    """
+
+    def __init__(self, embed_batch: Callable[[List[str]], List[List[float]]],
+                 checkpoint: Optional[BatchCheckpoint] = None,
+                 retryable: Tuple[Type[BaseException], ...] = (),
+                 max_retries: int = 5, sleep: Callable[[float], None] = time.sleep,
+                 splittable: Callable[[BaseException], bool] = is_input_error):
+        self.embed_batch = embed_batch
+        self.checkpoint = checkpoint
+        self.retryable = retryable
+        self.max_retries = max_retries
+        self.sleep = sleep
+        self.splittable = splittable
+        self.failed_texts: List[str] = []
+
+    def __call__(self, batch: List[str]) -> List[Optional[np.ndarray]]:
+        """回傳與 batch 同序的向量，無法取得的位置為 None"""
+        if self.checkpoint is not None:
+            cached = self.checkpoint.get(batch)
+            if cached is not None:
+                return list(cached)
+
+        try:
+            vectors = np.asarray(self._request(batch), dtype=np.float32)
+        except Exception as e:
+            if not self.splittable(e):
+                raise
+            if len(batch) == 1:
+                logger.error(f"❌ 單筆輸入無法取得 embedding: {e}")
+                self.failed_texts.append(batch[0])
+                return [None]
+
+            # 二分：讓可處理的部分先完成並寫入檢查點
+            middle = len(batch) // 2
+            logger.warning(f"⚠️ 批次失敗（{type(e).__name__}），二分為 {middle} + {len(batch) - middle} 筆重試")
+            results = self(batch[:middle]) + self(batch[middle:])
+            if all(vector is not None for vector in results) and self.checkpoint is not None:
+                self.checkpoint.put(batch, np.stack(results))
+            return results
+
+        if self.checkpoint is not None:
+            self.checkpoint.put(batch, vectors)
+        return list(vectors)
+
+    def _request(self, batch: List[str]) -> List[List[float]]:
+        """送出請求，暫時性錯誤指數退避重試"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.embed_batch(batch)
+            except self.retryable as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = retry_delay(e, attempt)
+                logger.warning(f"⚠️ 批次請求失敗（{type(e).__name__}），{delay:.1f} 秒後重試 ({attempt + 1}/{self.max_retries})")
+                self.sleep(delay)
+
+
+def ensure_complete(vectors: Sequence[Optional[np.ndarray]]) -> np.ndarray:
+    """確認每一列都有向量，否則拒絕發布"""
+    missing = sum(1 for vector in vectors if vector is None)
+    if missing:
+        raise CorpusBuildError(f"{missing}/{len(vectors)} 段文本缺少 embedding，已完成的批次保留於檢查點，修正後重新執行即可續建")
+    return np.array(vectors, dtype=np.float32)
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+明確引用的法條解析
+考題常直接寫出「公寓大廈管理條例第 10 條」「依消費者保護法…」，引用的條文不需靠 embedding 搜尋：
+- 法規名稱與簡稱編譯成 Aho-Corasick 自動機，一次掃描找出所有法規名稱（最長優先、不重疊）
+- 「第X條(之Y)」以正規表示式取出（支援阿拉伯數字與中文數字），接在前方最近的法規名稱之後
+- 由 (法規名稱, 條號, 次號) 直接對應到列號：未知法規共用代碼（UNKN），代碼與條號無法區分不同法規
+"""
+
+import re
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from .article_table import ArticleKey, ArticleTable
+from .embedding_store import normalize_text
+
+# 常見簡稱 -> 法規全名（全名存在於語料時才加入自動機）
+LAW_ALIASES: Dict[str, str] = {
+    "消保法": "消費者保護法",
+    "公平法": "公平交易法",
+    "經紀業條例": "不動產經紀業管理條例",
+    "經紀條例": "不動產經紀業管理條例",
+    "公寓大廈條例": "公寓大廈管理條例",
+    "平均地權": "平均地權條例",
+    "土徵條例": "土地徵收條例",
+    "估價規則": "不動產估價技術規則",
+}
+
+# 指向前文法規的代稱（「本法第 2 條」「同條例第 5 條」）
+BACK_REFERENCES = ("本法", "本條例", "本細則", "本規則", "同法", "同條例", "該法", "該條例")
+
+_NUMERAL = r"[0-9〇零一二兩三四五六七八九十百千]+"
+ARTICLE_PATTERN = re.compile(rf"第\s*({_NUMERAL})\s*條(?:\s*之\s*({_NUMERAL}))?")
+
+# 條號與前方法規名稱之間允許的最大字數（「公寓大廈管理條例 第 10 條」「消費者保護法之第 2 條」）
+MAX_CITATION_GAP = 4
+
+_DIGITS = {"〇": 0, "零": 0, "一": 1, "二": 2, "兩": 2, "三": 3, "四": 4,
+           "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+_UNITS = {"十": 10, "百": 100, "千": 1000}
+
+
+def parse_numeral(text: str) -> int:
+    """阿拉伯數字或中文數字轉整數：'25' / '二十五' / '一百零三' / '十' -> 25 / 25 / 103 / 10"""
+    if text.isdigit():
+        return int(text)
+
+    total, digit = 0, None
+    for char in text:
+        if char in _DIGITS:
+            digit = _DIGITS[char]
+        elif char in _UNITS:
+            total += (1 if digit is None else digit) * _UNITS[char]
+            digit = None
+        elif char.isdigit():
+            digit = (digit or 0) * 10 + int(char)
+    return total + (digit or 0)
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick 多字串比對自動機（建立一次，之後每次掃描為 O(文本長度 + 命中數)）
+
+    Args:
+        patterns: 字串 -> 對應值
+    """
+
+    def __init__(self, patterns: Dict[str, str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[Optional[Tuple[int, str]]] = [None]  # 在此節點結尾的最長模式 (長度, 值)
+
+        for pattern, value in patterns.items():
+            if not pattern:
+                continue
+            node = 0
+            for char in pattern:
+                nxt = self.goto[node].get(char)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][char] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(None)
+                node = nxt
+            self.output[node] = (len(pattern), value)
+
+        # BFS 建立失敗連結；節點沒有自己的輸出時沿用失敗連結的輸出（較短的後綴模式）
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and char not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(char, 0)
+                if self.output[child] is None:
+                    self.output[child] = self.output[self.fail[child]]
+
+    def find_all(self, text: str) -> List[Tuple[int, int, str]]:
+        """命中的 (起點, 終點, 值)：每個終點取最長的模式，重疊時取最左、再取最長"""
+        matches = []
+        node = 0
+        for end, char in enumerate(text, start=1):
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            if self.output[node] is not None:
+                length, value = self.output[node]
+                matches.append((end - length, end, value))
+
+        selected = []
+        last_end = 0
+        for start, end, value in sorted(matches, key=lambda m: (m[0], -(m[1] - m[0]))):
+            if start >= last_end:
+                selected.append((start, end, value))
+                last_end = end
+        return selected
+
+
+@dataclass
+class Citation:
+    """文本中引用的法規（與條號）"""
+    law_code: str
+    law_name: str
+    article_no_main: Optional[int] = None
+    article_no_sub: int = 0
+
+    @property
+    def key(self) -> Optional[ArticleKey]:
+        """對應的條文識別 (法規名稱, 條號, 次號)；只引用法規時為 None"""
+        if self.article_no_main is None:
+            return None
+        return (self.law_name, self.article_no_main, self.article_no_sub)
+
+
+class CitationIndex:
+    """
+    法規名稱自動機 + 條文識別索引
+
+    Args:
+        articles: 法條表（法規名稱與代碼取自語料）
+        aliases: 額外的簡稱 -> 全名（預設 LAW_ALIASES）
+    """
+
+    def __init__(self, articles: ArticleTable, aliases: Optional[Dict[str, str]] = None):
+        self.articles = articles
+        self.law_codes: Dict[str, str] = {}
+        for law_name, law_code in zip(articles.column("law_name"), articles.column("law_code")):
+            if law_name and law_code:
+                self.law_codes.setdefault(law_name, law_code)
+
+        patterns = {name: name for name in self.law_codes}
+        for alias, name in (aliases if aliases is not None else LAW_ALIASES).items():
+            if name in self.law_codes and alias not in patterns:
+                patterns[alias] = name
+        for word in BACK_REFERENCES:
+            patterns.setdefault(word, "")
+        self.automaton = AhoCorasick(patterns)
+
+        # (法規名稱, 條號, 次號) -> 基底列號（快照有線上更新時改用快照的對照表）
+        self.rows: Dict[ArticleKey, int] = {}
+        for row, key in enumerate(articles.keys()):
+            self.rows.setdefault(key, row)
+
+    def find(self, text: str) -> List[Citation]:
+        """
+        找出文本引用的法規與條號
+
+        法規名稱後方（相隔不超過 MAX_CITATION_GAP 字）的「第X條(之Y)」視為該法規的條文；
+        代稱（本法 / 同法…）指向前文最近一次出現的法規
+        """
+        text = normalize_text(text)
+        citations: List[Citation] = []
+        mentions: List[Tuple[int, Citation]] = []  # (名稱終點, 引用)
+
+        last_name = None
+        for _, end, name in self.automaton.find_all(text):
+            name = name or last_name
+            if not name:
+                continue
+            last_name = name
+            citation = Citation(self.law_codes[name], name)
+            mentions.append((end, citation))
+            citations.append(citation)
+
+        for match in ARTICLE_PATTERN.finditer(text):
+            owner = None
+            for end, citation in mentions:
+                if end > match.start():
+                    break
+                owner = (end, citation)
+            if owner is None or match.start() - owner[0] > MAX_CITATION_GAP:
+                continue
+
+            citation = owner[1]
+            article = Citation(
+                citation.law_code, citation.law_name,
+                article_no_main=parse_numeral(match.group(1)),
+                article_no_sub=parse_numeral(match.group(2)) if match.group(2) else 0
+            )
+            # 「第 10 條及第 11 條」：同一法規之後的條號也接到該法規
+            mentions.append((match.end(), citation))
+            mentions.sort(key=lambda m: m[0])
+            citations.append(article)
+
+        return citations
+
+    def resolve(self, text: str, row_of: Optional[Dict[ArticleKey, int]] = None) -> Tuple[List[int], List[str]]:
+        """
+        解析文本引用
+
+        Args:
+            text: 查詢文本
+            row_of: (法規名稱, 條號, 次號) -> 列號（快照有線上更新時傳入；None 使用基底列號）
+
+        Returns:
+            (引用條文的列號, 引用的法規名稱)，皆依出現順序去重；條號不存在時只回傳法規
+        """
+        rows_of = row_of if row_of is not None else self.rows
+        rows: List[int] = []
+        law_names: List[str] = []
+        for citation in self.find(text):
+            if citation.law_name not in law_names:
+                law_names.append(citation.law_name)
+            key = citation.key
+            row = rows_of.get(key) if key else None
+            if row is not None and row not in rows:
+                rows.append(row)
+        return rows, law_names
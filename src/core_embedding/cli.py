@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+法條索引命令列介面
+build-index: 由 law_articles.csv 建立單檔索引包
+"""
+
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+import click
+from dotenv import load_dotenv
+
+from .async_builder import AsyncEmbeddingBuilder
+from .bundle import LawIndexBundle
+from .embedding_matcher import EmbeddingMatcher
+from .providers import PROVIDERS, provider_from_env
+
+
+def setup_logging(verbose: bool = False) -> logging.Logger:
+    """設置日誌記錄"""
+    level = logging.DEBUG if verbose else logging.INFO
+    logging.basicConfig(
+        level=level,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    return logging.getLogger(__name__)
+
+
+@click.command()
+@click.option('--laws-csv', type=click.Path(exists=True, path_type=Path),
+              default=Path('data/law_articles.csv'), show_default=True, help='法條 CSV')
+@click.option('--output', '-o', type=click.Path(path_type=Path),
+              default=Path('data/law_index.bundle'), show_default=True, help='輸出的索引包')
+@click.option('--backend', type=click.Choice(PROVIDERS), default=lambda: os.getenv('EMBEDDING_BACKEND', 'openai'),
+              help='embedding 後端（預設讀取 EMBEDDING_BACKEND）')
+@click.option('--model', default=None,
+              help='embedding 模型（預設依後端讀取 EMBEDDING_MODEL / GEMINI_EMBEDDING_MODEL / LOCAL_EMBEDDING_MODEL）')
+@click.option('--dimensions', type=int, default=None,
+              help='向量維度（預設讀取 EMBEDDING_DIMENSIONS；本機後端為 LOCAL_EMBEDDING_DIMENSIONS）')
+@click.option('--store-dir', default=lambda: os.getenv('EMBEDDING_STORE_DIR', 'data/embedding_store'),
+              help='embedding 儲存目錄，只重新 embedding 變動的條文')
+@click.option('--concurrency', type=int, default=8, show_default=True, help='語料建立的併發請求數')
+@click.option('--verbose', '-v', is_flag=True, help='啟用詳細輸出')
+def build_index(laws_csv: Path, output: Path, backend: str, model: Optional[str], dimensions: Optional[int],
+                store_dir: str, concurrency: int, verbose: bool):
+    """由法條 CSV 建立索引包（法條表 + embeddings + 分區 + ID 對照）"""
+    logger = setup_logging(verbose)
+
+    try:
+        provider = provider_from_env(backend, model, dimensions)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    # openai 的語料（重）建使用非同步併發建構器；其他後端（本機 / fake 可離線建立）由提供者逐批建立
+    corpus_builder = None
+    if backend == 'openai':
+        corpus_builder = AsyncEmbeddingBuilder(
+            api_key=provider.client.api_key,
+            embedding_model=provider.name,
+            dimensions=provider.dimensions,
+            concurrency=concurrency,
+            requests_per_minute=int(os.getenv('EMBEDDING_RPM', '3000')),
+            tokens_per_minute=int(os.getenv('EMBEDDING_TPM', '1000000'))
+        )
+
+    matcher = EmbeddingMatcher(store_dir=store_dir, provider=provider, corpus_builder=corpus_builder)
+    if not matcher.load_law_articles(str(laws_csv)):
+        raise click.ClickException(f"法條載入失敗: {laws_csv}")
+
+    path = matcher.save_bundle(str(output))
+
+    # 重新開啟驗證
+    bundle = LawIndexBundle.open(str(path))
+    logger.info(f"✅ 索引包完成: {path} ({len(bundle)} 條, {bundle.header['dim']} 維)")
+
+
+def main():
+    """build-index 進入點（先載入 .env，選項的預設值才讀得到其中的設定）"""
+    load_dotenv()
+    build_index()
+
+
+if __name__ == '__main__':
+    main()
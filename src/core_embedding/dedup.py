@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+跨年度近似重複考題偵測
+同一題目在不同年度（110180 / 111190 / 112190…）只有少許字詞差異，不需每次重新匹配：
+- 查詢的每個部分（題目；或題幹、選項）各自以字元 3-gram 的 MinHash 簽章表示，LSH 分段分桶找候選
+- 相似度取各部分的最小值：同一題的不同選項題幹相同但選項不同，不會被誤判為重複
+- 估計 Jaccard 相似度達門檻時，沿用先前的匹配結果（設定與語料列號配置相同時）或先前文本的查詢向量（經查詢快取，不呼叫 API）
+- 結果以列號保存（法條 ID 不保證唯一），設定鍵含語料指紋，語料改變後不會沿用到錯誤的法條
+- 簽章、結果與來源保存在 SQLite，重跑整個考古題庫時跨次執行沿用
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .embedding_store import normalize_text
+
+logger = logging.getLogger(__name__)
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_SHINGLE_SIZE = 3
+
+
+@dataclass
+class DuplicateEntry:
+    """已匹配過的查詢：查詢文本、來源與結果（列號、相似度與分數類型；舊格式的結果為 None，只沿用向量）"""
+    text: str
+    source: str
+    result_key: str
+    top_k: int
+    rows: Optional[List[int]]
+    scores: List[float]
+    score_types: List[str]
+
+
+class NearDuplicateIndex:
+    """
+    MinHash + LSH 近似重複索引
+
+    Args:
+        db_path: SQLite 檔案路徑（None 則只保存在記憶體）
+        threshold: 估計 Jaccard 相似度門檻（達到才視為近似重複）
+        num_perm: MinHash 排列數（簽章長度）
+        bands: LSH 分段數（num_perm 須可被整除；分段越多，低相似度的候選越多）
+        seed: 雜湊參數的種子（改變後既有簽章失效）
+    """
+
+    def __init__(self, db_path: Optional[str] = None, threshold: float = 0.85,
+                 num_perm: int = 64, bands: int = 16, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) 必須可被 bands ({bands}) 整除")
+        self.db_path = db_path
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 32, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, num_perm, dtype=np.uint64)
+
+        self._lock = threading.Lock()
+        self._entries: List[DuplicateEntry] = []
+        self._signatures: List[np.ndarray] = []
+        self._buckets: Dict[Tuple[int, int, bytes], List[int]] = {}
+        self._loaded = False
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid: Optional[int] = None
+        if db_path:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def _db(self) -> Optional[sqlite3.Connection]:
+        """目前行程的 SQLite 連線（第一次使用或 fork 後才開啟）"""
+        if self.db_path is None:
+            return None
+        if self._conn is not None and self._conn_pid == os.getpid():
+            return self._conn
+
+        conn = sqlite3.connect(self.db_path, timeout=30.0, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS near_duplicates ("
+            "entry_id INTEGER PRIMARY KEY AUTOINCREMENT, signature BLOB NOT NULL, text TEXT NOT NULL, "
+            "source TEXT NOT NULL, result_key TEXT NOT NULL, top_k INTEGER NOT NULL, result TEXT NOT NULL)"
+        )
+        conn.commit()
+        self._conn, self._conn_pid = conn, os.getpid()
+        return conn
+
+    def close(self) -> None:
+        """關閉目前行程的連線（fork 前呼叫，之後使用時會重新開啟）"""
+        if self._conn is not None and self._conn_pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+        self._conn_pid = None
+
+    def after_fork(self) -> None:
+        """在 fork 出的子行程中捨棄繼承的 SQLite 連線（記憶體中的簽章以寫時複製沿用）"""
+        self._conn = None
+        self._conn_pid = None
+
+    def signature(self, parts: Tuple[str, ...]) -> np.ndarray:
+        """各部分的 MinHash 簽章依序串接（每部分 num_perm 個值）"""
+        return np.concatenate([self._minhash(part) for part in parts])
+
+    def _minhash(self, text: str) -> np.ndarray:
+        """字元 3-gram（去除空白）的 MinHash 簽章"""
+        text = "".join(normalize_text(text).split())
+        shingles = {text[i:i + _SHINGLE_SIZE] for i in range(max(len(text) - _SHINGLE_SIZE + 1, 1))}
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles),
+            dtype=np.uint64, count=len(shingles)
+        )
+        # (a × x + b) mod p；a、b、x 皆小於 2^32，乘積不會溢位
+        permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % _MERSENNE_PRIME
+        return (permuted.min(axis=1) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> List[Tuple[int, int, bytes]]:
+        """LSH 分桶鍵 (分段總數, 分段, 內容)：部分數不同的簽章不會互為候選"""
+        num_bands = len(signature) // self.rows_per_band
+        return [
+            (num_bands, band, signature[band * self.rows_per_band:(band + 1) * self.rows_per_band].tobytes())
+            for band in range(num_bands)
+        ]
+
+    def similarity(self, a: np.ndarray, b: np.ndarray) -> float:
+        """估計 Jaccard 相似度：各部分簽章相同的比例，取最小值"""
+        if len(a) != len(b):
+            return 0.0
+        return float((a == b).reshape(-1, self.num_perm).mean(axis=1).min())
+
+    def _remember(self, entry: DuplicateEntry, signature: np.ndarray) -> None:
+        """加入記憶體索引（呼叫端須持有鎖）"""
+        position = len(self._entries)
+        self._entries.append(entry)
+        self._signatures.append(signature)
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, []).append(position)
+
+    def _ensure_loaded(self) -> None:
+        """第一次使用時由 SQLite 載入先前執行的簽章（呼叫端須持有鎖）"""
+        if self._loaded:
+            return
+        self._loaded = True
+        db = self._db
+        if db is None:
+            return
+        for signature, text, source, result_key, top_k, result in db.execute(
+            "SELECT signature, text, source, result_key, top_k, result FROM near_duplicates ORDER BY entry_id"
+        ):
+            signature = np.frombuffer(signature, dtype=np.uint32)
+            if len(signature) % self.num_perm:
+                continue
+            stored = json.loads(result)
+            self._remember(DuplicateEntry(text, source, result_key, top_k, stored.get("rows"), stored["scores"],
+                                          stored.get("score_types", [])), signature)
+        if self._entries:
+            logger.info(f"📚 載入近似重複索引: {len(self._entries)} 筆 ({self.db_path})")
+
+    def lookup(self, keys: List[Tuple[str, ...]],
+               result_key: Optional[str] = None) -> List[Optional[Tuple[DuplicateEntry, float]]]:
+        """
+        每個查詢最相似的既有查詢
+
+        Args:
+            keys: 每個查詢的比對部分（題目為 (題目,)；選項為 (題幹, 選項)）
+            result_key: 優先選擇此匹配設定鍵的既有查詢（結果可直接沿用）
+
+        Returns:
+            與 keys 同序的 (既有查詢, 估計 Jaccard 相似度)；沒有達到門檻者為 None
+        """
+        matches: List[Optional[Tuple[DuplicateEntry, float]]] = []
+        with self._lock:
+            self._ensure_loaded()
+            for parts in keys:
+                signature = self.signature(parts)
+                candidates = {position for key in self._band_keys(signature) for position in self._buckets.get(key, ())}
+                best, best_rank = None, None
+                for position in sorted(candidates, reverse=True):  # 相似度相同時取最新的
+                    similarity = self.similarity(self._signatures[position], signature)
+                    entry = self._entries[position]
+                    rank = (entry.result_key == result_key, similarity)
+                    if similarity >= self.threshold and (best_rank is None or rank > best_rank):
+                        best, best_rank = (entry, similarity), rank
+                matches.append(best)
+        return matches
+
+    def add(self, keys: List[Tuple[str, ...]], texts: List[str], sources: List[str],
+            results: List[Tuple[List[int], List[float], List[str]]], result_key: str, top_k: int) -> None:
+        """
+        登記已匹配的查詢
+
+        Args:
+            keys: 每個查詢的比對部分（同 lookup）
+            texts: 查詢文本（近似重複沿用向量時以此文本查詢快取）
+            sources: 來源（考卷 / 題號 / 選項，寫入重用結果的出處）
+            results: 每個查詢的 (列號, 相似度, 分數類型)
+            result_key: 匹配設定鍵（模型、語料指紋、範圍等不同時結果不可沿用）
+            top_k: 結果的名次數
+        """
+        rows = []
+        with self._lock:
+            self._ensure_loaded()
+            for parts, text, source, (result_rows, scores, score_types) in zip(keys, texts, sources, results):
+                signature = self.signature(parts)
+                entry = DuplicateEntry(text, source, result_key, top_k, [int(r) for r in result_rows],
+                                       [float(s) for s in scores], [str(t) for t in score_types])
+                self._remember(entry, signature)
+                rows.append((signature.tobytes(), text, source, result_key, top_k,
+                             json.dumps({"rows": entry.rows, "scores": entry.scores, "score_types": entry.score_types})))
+
+            db = self._db
+            if db is not None and rows:
+                db.executemany(
+                    "INSERT INTO near_duplicates (signature, text, source, result_key, top_k, result) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", rows
+                )
+                db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._entries)
@@ -3,27 +3,72 @@
 """
 純粹的 Embedding 匹配系統
 題目 <-> 法條的直接 embedding 相似度比對
+
+向量由提供者（providers.py：OpenAI / Gemini / 本機 / fake）取得，
+批次打包、檢查點、儲存、快取、索引與排序由本引擎統一處理
 """
 
 import json
 import logging
 import os
 import time
-from typing import List, Dict, Any, Optional
+from pathlib import Path
+from typing import List, Dict, Any, Callable, Optional, Tuple
 from dataclasses import dataclass
 import pandas as pd
 import numpy as np
-from openai import OpenAI
+
+from .ann_index import build_index, evaluate_recall
+from .async_builder import AsyncEmbeddingBuilder
+from .batching import embed_in_batches
+from .article_table import ArticleTable
+from .bundle import LawIndexBundle, write_bundle
+from .checkpoint import BatchCheckpoint, ResilientEmbedder, is_input_error
+from .citations import CitationIndex
+from .dedup import NearDuplicateIndex
+from .live_index import IndexSnapshot, LiveLawIndex
+from .match_results import (
+    ARTICLE_REFS_FORMAT, CITATION_SCORE, SCORE_BM25, SCORE_CITATION, SCORE_COSINE, SCORE_HYBRID,
+    ArticleRefWriter, LazyArticles
+)
+from .embedding_store import EmbeddingStore
+from .providers import EmbeddingProvider, OpenAIProvider
+from .rerank import LLMReranker
+from .query_cache import QueryEmbeddingCache, stats_delta
+from .routing import PartitionMap, route_targets, subject_from_filename
+from .sparse_index import SparseLawIndex
 
 logger = logging.getLogger(__name__)
 
+# 混合檢索（retrieval="hybrid"）的預設參數
+# - shortlist: BM25 候選數，dense 分數只在候選上計算
+# - dense_weight: 融合分數中 dense 的權重（其餘為正規化後的 BM25 分數）
+# - confident_score / confident_margin: 第一名的 BM25 正規化分數夠高、且領先第二名夠多時視為確定命中
+# - skip_dense: 確定命中的查詢不呼叫 embedding
+HYBRID_DEFAULTS = {
+    "shortlist": 100,
+    "dense_weight": 0.7,
+    "confident_score": 0.35,
+    "confident_margin": 0.25,
+    "skip_dense": True,
+}
+
+# 一次融合計分的查詢數（候選向量為 查詢數 × shortlist × 維度）
+_FUSION_CHUNK = 32
+
+# 選項查詢的組成方式
+# - concat: 「題目 + 選項」整段 embedding（每個選項都重送一次題幹）
+# - stem: 題幹與選項分別 embedding（題幹每題只送一次），以加權和組成選項查詢向量
+OPTION_MODES = ("concat", "stem")
+
 @dataclass
 class MatchResult:
     """匹配結果"""
     question_id: str
     question_content: str
-    matched_articles: List[Dict[str, Any]]
+    matched_articles: LazyArticles  # 用法同 List[Dict]，另有 rows / scores
     processing_time: float
+    duplicate_of: Optional[Dict[str, Any]] = None  # 近似重複的來源 {source, similarity, reused}
 
 @dataclass 
 class OptionMatchResult:
@@ -31,21 +76,119 @@ class OptionMatchResult:
     question_id: str
     option_letter: str
     option_content: str
-    matched_articles: List[Dict[str, Any]]
+    matched_articles: LazyArticles  # 用法同 List[Dict]，另有 rows / scores
     processing_time: float
+    reranked: bool = False  # 前兩名分差過小、經 LLM 重排
+    duplicate_of: Optional[Dict[str, Any]] = None  # 近似重複的來源 {source, similarity, reused}
+
+@dataclass
+class OptionQuery:
+    """選項查詢（批次匹配用）"""
+    question_id: str
+    question_content: str
+    option_letter: str
+    option_content: str
+    source: str = ""  # 來源考卷（記錄於近似重複索引）
 
 class EmbeddingMatcher:
-    """純粹的 Embedding 匹配器"""
+    """
+    純粹的 Embedding 匹配器
     
-    def __init__(self, openai_api_key: str, embedding_model: str = "text-embedding-3-large"):
-        self.client = OpenAI(api_key=openai_api_key)
-        self.embedding_model = embedding_model
+    未指定 provider 時使用 OpenAI（openai_api_key / embedding_model / dimensions）；
+    指定 provider 時三者以提供者為準
+    """
+    
+    def __init__(self, openai_api_key: Optional[str] = None, embedding_model: str = "text-embedding-3-large",
+                 store_dir: Optional[str] = None, index_type: str = "flat",
+                 index_params: Optional[Dict[str, Any]] = None, dimensions: Optional[int] = None,
+                 subject_routes: Optional[Dict[str, List[str]]] = None,
+                 query_cache_path: Optional[str] = None, use_query_cache: bool = True,
+                 corpus_builder: Optional[AsyncEmbeddingBuilder] = None,
+                 provider: Optional[EmbeddingProvider] = None,
+                 retrieval: str = "dense", retrieval_params: Optional[Dict[str, Any]] = None,
+                 citations: bool = True, option_mode: str = "concat", stem_weight: float = 0.35,
+                 reranker: Optional[LLMReranker] = None, dedup: Optional[NearDuplicateIndex] = None):
+        self.provider = provider or OpenAIProvider(openai_api_key, embedding_model, dimensions)
+        self.embedding_model = self.provider.name
+        
+        # text-embedding-3 系列可要求縮短的向量（Matryoshka），法條與查詢使用相同維度
+        self.dimensions = self.provider.dimensions
+        
+        # 依模型 tokenizer 計數（未安裝 tiktoken 時為保守估計），用於打包請求與切分長條文
+        self.count_tokens = self.provider.count_tokens
         
         # 法條資料
-        self.law_articles: List[Dict[str, Any]] = []
+        self.law_articles: Optional[ArticleTable] = None
         self.law_embeddings: Optional[np.ndarray] = None
         
-        logger.info(f"🎯 初始化 Embedding 匹配器: {embedding_model}")
+        # 法條 embedding 磁碟儲存（未指定則每次重新建立）、批次檢查點與查詢 embedding 快取
+        self.store_dir = store_dir
+        self.query_cache_path = query_cache_path
+        self.use_query_cache = use_query_cache  # False：查詢一律實際呼叫 embedding（量測延遲 / 請求數用）
+        self._open_storage()
+        
+        # 非同步語料建構器（未指定則以同步 client 逐批建立）
+        if corpus_builder is not None and (corpus_builder.embedding_model, corpus_builder.dimensions) != (self.embedding_model, self.dimensions):
+            raise ValueError("corpus_builder 的模型 / 維度與匹配器不一致")
+        self.corpus_builder = corpus_builder
+        
+        # 向量索引：flat（全量）/ ivf / hnsw / float16 / int8 / matryoshka，近似索引隨 embedding 儲存一起保存
+        self.index_type = index_type
+        self.index_params = index_params or {}
+        self.index = None
+        
+        # 常駐索引的線上更新（新增 / 修正 / 刪除法條不需重建），查詢一律讀取其快照
+        self.live_index: Optional[LiveLawIndex] = None
+        
+        # 檢索方式：dense（全語料向量搜尋）/ hybrid（BM25 bigram 候選 + dense 重排，確定命中時不呼叫 embedding）
+        if retrieval not in ("dense", "hybrid"):
+            raise ValueError(f"未知的檢索方式: {retrieval}（可用: dense / hybrid）")
+        self.retrieval = retrieval
+        self.retrieval_params = {**HYBRID_DEFAULTS, **(retrieval_params or {})}
+        self.sparse_index = SparseLawIndex(self._table_texts) if retrieval == "hybrid" else None
+        self.retrieval_stats = {"sparse_only": 0, "hybrid": 0, "dense_fallback": 0,
+                                "citation_hit": 0, "citation_scope": 0, "query_tokens": 0,
+                                "duplicate_results": 0, "duplicate_vectors": 0}
+        
+        # 選項查詢：concat（題目 + 選項整段）/ stem（題幹 × stem_weight + 選項 × (1 - stem_weight)）
+        if option_mode not in OPTION_MODES:
+            raise ValueError(f"未知的選項查詢方式: {option_mode}（可用: {' / '.join(OPTION_MODES)}）")
+        self.option_mode = option_mode
+        self.stem_weight = stem_weight
+        
+        # 選項匹配後的 LLM 重排（只處理前兩名分差低於門檻的選項；None 為停用）
+        self.reranker = reranker
+        
+        # 跨年度近似重複考題：設定相同時沿用先前的匹配結果，否則沿用先前文本的查詢向量（None 為停用）
+        self.dedup = dedup
+        
+        # 明確引用（「公寓大廈管理條例第 10 條」）的條文排在最前（以實際相似度計分），引用的法規限定搜尋範圍；
+        # 法規名稱自動機依快照的基底法條表建立（壓實後重建）
+        self.citations = citations
+        self._citation_index: Optional[CitationIndex] = None
+        
+        # 法條分區與考科路由（None 表示使用預設路由表）
+        self.partitions: Optional[PartitionMap] = None
+        self.subject_routes = subject_routes
+        
+        logger.info(f"🎯 初始化 Embedding 匹配器: {self.embedding_model} [{self.provider.kind}]"
+                    + (f" ({self.dimensions} 維)" if self.dimensions else "")
+                    + (" 混合檢索" if self.sparse_index is not None else ""))
+
+    @property
+    def store_key(self) -> str:
+        """儲存與快取的模型鍵（模型名稱 + 維度），不同模型的向量互不混用"""
+        return f"{self.embedding_model}@{self.dimensions}" if self.dimensions else self.embedding_model
+
+    def _open_storage(self) -> None:
+        """依目前的模型鍵開啟 embedding 儲存、批次檢查點與查詢快取"""
+        self.store = EmbeddingStore(self.store_dir, self.store_key) if self.store_dir else None
+        
+        # 建立中的批次檢查點（隨儲存目錄保存，中斷後重跑可續建）
+        self.checkpoint = BatchCheckpoint(self.store.store_dir / "checkpoints") if self.store is not None else None
+        
+        # 查詢 embedding 快取（記憶體 LRU，指定路徑時另存 SQLite）
+        self.query_cache = QueryEmbeddingCache(self.query_cache_path, self.store_key)
 
     def load_law_articles(self, csv_path: str) -> bool:
         """載入法條資料並建立 embeddings"""
@@ -56,21 +199,10 @@ class EmbeddingMatcher:
             df = pd.read_csv(csv_path, encoding='utf-8')
             logger.info(f"📋 載入 {len(df)} 條法規資料")
             
-            # 轉換為字典格式
-            self.law_articles = []
-            for _, row in df.iterrows():
-                article = {
-                    "id": f"{row['法規代碼']}-{row['條文主號']}-{row['條文次號']}" if row['條文次號'] > 0 else f"{row['法規代碼']}-{row['條文主號']}",
-                    "law_code": row['法規代碼'],
-                    "law_name": row['法規名稱'],
-                    "chapter_title": row['章節標題'],
-                    "article_no_main": row['條文主號'],
-                    "article_no_sub": row['條文次號'],
-                    "content": row['條文完整內容'],
-                    "category": row.get('法規類別', ''),
-                    "authority": row.get('主管機關', '')
-                }
-                self.law_articles.append(article)
+            # 轉換為欄式法條表，依 (類別, 法規代碼) 穩定排序，使每個分區成為連續的子矩陣
+            table = ArticleTable.from_dataframe(df)
+            self.law_articles = table.take(table.sort_order())
+            self.partitions = PartitionMap(self.law_articles)
             
             # 建立 embeddings
             self._build_embeddings()
@@ -82,175 +214,845 @@ class EmbeddingMatcher:
             logger.error(f"❌ 載入法條資料失敗: {e}")
             return False
 
+    def resolve_route(self, subject: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        依考科取得搜尋範圍
+
+        Returns:
+            路由資訊（科目、法規、涵蓋列數）；無路由或路由內的法規不在語料中時返回 None（全語料搜尋）
+        """
+        targets = route_targets(subject, self.subject_routes)
+        snapshot = self._sync_base()
+        if not targets or self.partitions is None:
+            return None
+        
+        matched = [t for t in targets if t in self.partitions.ranges]
+        ranges = self.partitions.resolve(matched)
+        if not ranges:
+            logger.warning(f"⚠️ 考科「{subject}」的路由法規不在語料中，改用全語料搜尋")
+            return None
+        
+        # 涵蓋列數與法規含尚未壓實的線上更新（區段中屬於路由的列，扣除墓碑）
+        tombstones = set(snapshot.tombstones.tolist()) if snapshot is not None else set()
+        law_code_column = self.law_articles.column('law_code')
+        live_codes = [law_code_column[row] for start, end in ranges for row in range(start, end) if row not in tombstones]
+        for segment in snapshot.segments if snapshot is not None else ():
+            segment_codes = segment.articles.column('law_code')
+            live_codes += [segment_codes[row] for row in snapshot.rows_in_scope(segment, matched).tolist()
+                           if segment.offset + row not in tombstones]
+        num_live = snapshot.num_live if snapshot is not None else len(self.law_articles)
+        
+        return {
+            "subject": subject,
+            "targets": matched,
+            "law_codes": sorted(set(live_codes)),
+            "rows": len(live_codes),
+            "fraction": len(live_codes) / max(num_live, 1)
+        }
+
+    def _sync_base(self, compact: bool = False) -> Optional[IndexSnapshot]:
+        """
+        以線上索引目前的快照更新 law_articles / law_embeddings / partitions / index（壓實後即為最新基底）
+
+        compact=True 時先將尚未壓實的更新併入基底（索引包與 recall 評估需要完整語料）
+        """
+        if self.live_index is None:
+            return None
+        snapshot = self.live_index.snapshot()
+        if compact and (snapshot.segments or len(snapshot.tombstones)):
+            snapshot = self.live_index.compact()
+        self.law_articles = snapshot.base_articles
+        self.law_embeddings = snapshot.base_vectors
+        self.partitions = snapshot.partitions
+        self.index = snapshot.base_index
+        return snapshot
+
+    def check_index_recall(self, k: int = 10, sample_size: int = 100) -> float:
+        """比較目前索引與全精度全量搜尋的 recall@k"""
+        if self.index is None:
+            raise ValueError("法條 embeddings 尚未建立")
+        
+        self._sync_base(compact=True)
+        recall = evaluate_recall(self.index, self.law_embeddings, k=k, sample_size=sample_size)
+        logger.info(f"🎯 {self.index_type} 索引 recall@{k}: {recall:.4f}")
+        return recall
+
     def _build_embeddings(self):
-        """建立法條 embeddings"""
+        """建立法條 embeddings（有磁碟儲存時只補齊缺少的條文）"""
         logger.info("🔧 建立法條 embeddings...")
         
         # 準備文本
-        law_texts = []
-        for article in self.law_articles:
-            # 簡單組合：法規名稱 + 條文內容
-            text = f"{article['law_name']} 第{article['article_no_main']}條 {article['content']}"
-            law_texts.append(text)
-        
-        # 批次呼叫 OpenAI Embeddings API
-        embeddings = []
-        batch_size = 100
-        
-        for i in range(0, len(law_texts), batch_size):
-            batch = law_texts[i:i + batch_size]
-            response = self.client.embeddings.create(
-                input=batch,
-                model=self.embedding_model
+        law_texts = self._corpus_texts()
+        
+        # 需要訓練的提供者（本機 TF-IDF）先以目前語料訓練
+        if self.provider.needs_fit:
+            self._fit_provider(law_texts)
+        
+        if self.store is not None:
+            article_ids = self.law_articles.ids.tolist()
+            self.law_embeddings = self.store.get_or_build(article_ids, law_texts, self._embed_documents)
+        else:
+            self.law_embeddings = self._embed_documents(law_texts)
+        if self.checkpoint is not None:
+            self.checkpoint.clear()
+        
+        self._init_index(
+            store_dir=self.store.current_dir if self.store is not None else None,
+            fingerprint=self.store.fingerprint if self.store is not None else ""
+        )
+        
+        logger.info(f"✅ 完成建立 {len(law_texts)} 條法條的 embeddings")
+
+    def _corpus_texts(self) -> List[str]:
+        """法條表中每一列的 embedding 文本"""
+        return self._table_texts(self.law_articles)
+
+    @staticmethod
+    def _table_texts(articles: ArticleTable) -> List[str]:
+        """任一法條表（含線上更新的區段）每一列的文本，embedding 與 BM25 索引共用"""
+        return [
+            EmbeddingMatcher._format_article_text(law_name, article_no_main, content)
+            for law_name, article_no_main, content in zip(
+                articles.column('law_name'), articles.article_no_main, articles.contents()
             )
-            batch_embeddings = [data.embedding for data in response.data]
-            embeddings.extend(batch_embeddings)
+        ]
+
+    def _fit_provider(self, texts: List[str]) -> None:
+        """訓練提供者（或載入以同一語料訓練過的模型），並改用帶語料指紋的模型鍵"""
+        fingerprint = self.provider.corpus_fingerprint(texts)
+        model_path = Path(self.store_dir) / "local_models" / f"{fingerprint}.pkl" if self.store_dir else None
+        
+        if model_path is not None and self.provider.load(model_path):
+            logger.info(f"⚡ 使用既有本機 embedding 模型: {model_path}")
+        else:
+            self.provider.fit(texts)
+            if model_path is not None:
+                self.provider.save(model_path)
+        
+        # 不同語料訓練出的向量空間不同，不可共用儲存與查詢快取
+        self.embedding_model = f"{self.provider.name}@{fingerprint[:12]}"
+        self._open_storage()
+
+    def _load_fitted_provider(self, bundle_model: str) -> bool:
+        """載入建立索引包時訓練的模型（位於 store_dir/local_models）"""
+        name, _, short_fingerprint = bundle_model.partition("@")
+        model_dir = Path(self.store_dir) / "local_models" if self.store_dir else None
+        model_paths = sorted(model_dir.glob(f"{short_fingerprint}*.pkl")) if model_dir and short_fingerprint else []
+        if name != self.provider.name or not model_paths or not self.provider.load(model_paths[0]):
+            return False
+        self.embedding_model = bundle_model
+        self._open_storage()
+        return True
+
+    def _init_index(self, store_dir: Optional[Path], fingerprint: str) -> None:
+        """建立（或載入已保存的）向量索引與線上更新索引"""
+        self.index = build_index(
+            self.index_type,
+            self.law_embeddings,
+            self.index_params,
+            store_dir=store_dir,
+            fingerprint=fingerprint
+        )
+        self.live_index = LiveLawIndex(
+            self.law_articles, self.law_embeddings, self.index,
+            index_factory=lambda vectors: build_index(self.index_type, vectors, self.index_params),
+            partitions=self.partitions
+        )
+
+    def save_bundle(self, path: str) -> Path:
+        """將目前的法條表、向量與分區寫成單檔索引包"""
+        if self.law_embeddings is None:
+            raise ValueError("法條 embeddings 尚未建立")
+        self._sync_base(compact=True)
+        return write_bundle(
+            path, self.law_articles, self.law_embeddings, self.partitions,
+            embedding_model=self.embedding_model,
+            dimensions=self.dimensions,
+            fingerprint=self.store.fingerprint if self.store is not None else ""
+        )
+
+    def load_bundle(self, path: str) -> bool:
+        """
+        由索引包載入法條與 embeddings（memmap，不解析 CSV、不呼叫 API）
+        
+        索引包的模型 / 維度須與匹配器一致；近似索引保存在索引包旁
+        """
+        try:
+            start_time = time.time()
+            bundle = LawIndexBundle.open(path)
+            if self.provider.needs_fit and not self._load_fitted_provider(bundle.embedding_model):
+                logger.error(f"❌ 找不到索引包對應的本機 embedding 模型: {bundle.embedding_model}")
+                return False
+            if (bundle.embedding_model, bundle.dimensions) != (self.embedding_model, self.dimensions):
+                logger.error(f"❌ 索引包模型不符: {bundle.embedding_model}@{bundle.dimensions}，"
+                             f"匹配器為 {self.embedding_model}@{self.dimensions}")
+                return False
             
-            logger.info(f"完成批次 {i//batch_size + 1}/{(len(law_texts)-1)//batch_size + 1}")
+            self.law_articles = bundle.articles
+            self.law_embeddings = bundle.vectors
+            self.partitions = bundle.partitions
+            self._init_index(store_dir=Path(path).parent, fingerprint=bundle.fingerprint)
+            
+            logger.info(f"📦 載入索引包: {path} ({len(bundle)} 條, {(time.time() - start_time) * 1000:.1f} ms)")
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ 載入索引包失敗: {e}")
+            return False
+
+    def after_fork(self) -> None:
+        """
+        在 fork 出的 worker 行程中呼叫（法條表、向量與索引以寫時複製沿用，不需重新載入）
         
-        self.law_embeddings = np.array(embeddings)
-        logger.info(f"✅ 完成建立 {len(embeddings)} 條法條的 embeddings")
+        HTTP 連線池與 SQLite 連線不可跨行程共用，於子行程中重新建立
+        """
+        self.provider.after_fork()
+        self.query_cache.after_fork()
+        if self.reranker is not None:
+            self.reranker.after_fork()
+        if self.dedup is not None:
+            self.dedup.after_fork()
 
-    def match_question(self, question_content: str, question_id: str = "", top_k: int = 1) -> MatchResult:
-        """匹配單一題目"""
-        start_time = time.time()
+    @staticmethod
+    def _article_text(article: Dict[str, Any]) -> str:
+        """法條 embedding 文本：法規名稱 + 條文內容"""
+        return EmbeddingMatcher._format_article_text(article['law_name'], article['article_no_main'], article['content'])
+
+    @staticmethod
+    def _format_article_text(law_name: str, article_no_main: int, content: str) -> str:
+        return f"{law_name} 第{article_no_main}條 {content}"
+
+    def _embed_documents(self, texts: List[str]) -> np.ndarray:
+        """
+        批次取得法條 embeddings（有非同步建構器時併發建立）
+        
+        遠端提供者完成的批次寫入檢查點，失敗的批次退避重試後二分；仍有缺漏時拋出 CorpusBuildError
+        """
+        if self.corpus_builder is not None:
+            return self.corpus_builder.build(texts, self.checkpoint)
+        
+        return self._embed_in_batches(texts, resilient=self.provider.remote)
+
+    def _embed_in_batches(self, texts: List[str], resilient: bool = False, query: bool = False) -> np.ndarray:
+        """依提供者的請求上限打包，過長文本切段後加權平均（保持輸入順序）"""
+        provider = self.provider
+        embed_batch = lambda batch: provider.embed_batch(batch, query=query)
+        if resilient:
+            embed_batch = ResilientEmbedder(embed_batch, self.checkpoint, retryable=provider.retryable_errors)
+        
+        return embed_in_batches(
+            texts, embed_batch,
+            provider.max_batch_items, provider.max_batch_tokens, provider.max_input_tokens, self.count_tokens
+        )
+
+    def _embed_queries(self, texts: List[str]) -> np.ndarray:
+        """取得查詢 embeddings：先查快取，只對未命中（且去重後）的文本呼叫 API（停用快取時全部呼叫）"""
+        if not self.use_query_cache:
+            self.retrieval_stats["query_tokens"] += sum(self.count_tokens(text) for text in texts)
+            return self._embed_in_batches(texts, query=True)
+        
+        cached = self.query_cache.get_many(texts)
+        missing_texts = list(dict.fromkeys(text for text, vector in zip(texts, cached) if vector is None))
+        
+        if missing_texts:
+            self.retrieval_stats["query_tokens"] += sum(self.count_tokens(text) for text in missing_texts)
+            new_vectors = self._embed_in_batches(missing_texts, query=True)
+            self.query_cache.put_many(missing_texts, new_vectors)
+            fetched = dict(zip(missing_texts, new_vectors))
+            cached = [vector if vector is not None else fetched[text] for text, vector in zip(texts, cached)]
+        
+        return np.array(cached, dtype=np.float32)
+
+    def _rank(self, query_embeddings: np.ndarray, top_k: int,
+              scope: Optional[List[str]] = None, snapshot: Optional[IndexSnapshot] = None) -> List[LazyArticles]:
+        """
+        計算所有查詢的相似度並取 top-k 法條
+
+        查詢讀取線上索引的當下快照（不受進行中的更新影響）；
+        指定 scope 時只掃描對應分區的連續子矩陣（精確計分），否則透過向量索引搜尋全語料
+        """
+        snapshot = snapshot or self.live_index.snapshot()
+        top_indices, top_scores = snapshot.search(query_embeddings, top_k, scope)
         
+        # 只保留 (列號, 分數)，法條欄位在讀取時才從快照的法條表取出
+        ranked = []
+        for indices, scores in zip(top_indices, top_scores):
+            found = indices >= 0
+            ranked.append(LazyArticles(snapshot, indices[found], scores[found]))
+        
+        return ranked
+
+    def upsert_articles(self, articles: List[Dict[str, Any]]) -> int:
+        """
+        線上新增或修正法條（常駐程序用，不重建索引）
+        
+        Args:
+            articles: 與 load_law_articles 相同欄位的法條字典；同一條文（法規名稱 + 條號）已存在時取代舊版本
+        
+        Returns:
+            目前有效的法條數
+        """
+        if self.live_index is None:
+            raise ValueError("法條 embeddings 尚未建立")
+        vectors = self._embed_in_batches([self._article_text(article) for article in articles])
+        num_live = self.live_index.upsert(articles, vectors).num_live
+        self._sync_base()
+        return num_live
+
+    def remove_articles(self, article_ids: List[str]) -> int:
+        """線上刪除法條，返回目前有效的法條數"""
+        if self.live_index is None:
+            raise ValueError("法條 embeddings 尚未建立")
+        num_live = self.live_index.remove(article_ids).num_live
+        self._sync_base()
+        return num_live
+
+    def _match_texts(self, texts: List[str], top_k: int, scope: Optional[List[str]] = None,
+                     embed: Optional[Callable[[List[str]], np.ndarray]] = None,
+                     query_parts: Optional[List[Tuple[str, str]]] = None,
+                     citation_top_k: Optional[int] = None) -> List[LazyArticles]:
+        """
+        批次 embedding 後排序（明確引用的條文排在最前）
+
+        引用條文已達 top_k 的查詢不搜尋也不 embedding（分數為 CITATION_SCORE，類型 citation）；
+        其餘查詢的引用條文在 dense 檢索時以實際的餘弦相似度計分
+
+        Args:
+            embed: 取得查詢向量的函式（如選項的 stem 模式），預設為 _embed_queries
+            query_parts: 每個查詢的 (查詢本身, 題目上下文)；選項為 (選項, 題目)，None 則為 (查詢文本, "")。
+                引用的條文只取自查詢本身（題幹引用的條文不會套用到每個選項），上下文引用的法規只用於限定範圍；
+                混合檢索的 BM25 確定命中也以查詢本身判斷（題幹很長時整段的正規化分數偏低）
+            citation_top_k: 引用條文最多排入幾名（預設 top_k）；多取候選給重排時傳入呼叫端的 top_k，
+                引用條文不會占用候選名額，引用已達此數的查詢也不需搜尋
+        """
         if self.law_embeddings is None:
             raise ValueError("法條 embeddings 尚未建立")
+        if not texts:
+            return []
         
-        # 取得題目 embedding
-        response = self.client.embeddings.create(
-            input=[question_content],
-            model=self.embedding_model
-        )
-        question_embedding = np.array(response.data[0].embedding).reshape(1, -1)
+        snapshot = self.live_index.snapshot()
+        citation_index = self._citations_for(snapshot) if self.citations else None
+        query_parts = query_parts or [(text, "") for text in texts]
+        ranked: List[Optional[LazyArticles]] = [None] * len(texts)
+        cited: Dict[int, List[int]] = {}
+        
+        # 依搜尋範圍分組：引用了法規的查詢只搜尋路由範圍內被引用的法規；引用條文已達 top_k 的查詢不需搜尋
+        route = tuple(scope) if scope else None
+        citation_top_k = min(citation_top_k or top_k, top_k)
+        groups: Dict[Optional[Tuple[str, ...]], List[int]] = {}
+        for i, (own_text, context) in enumerate(query_parts):
+            rows, law_names = citation_index.resolve(own_text, snapshot.key_rows) if citation_index else ([], [])
+            if citation_index and context:
+                law_names += [name for name in citation_index.resolve(context, snapshot.key_rows)[1]
+                              if name not in law_names]
+            if rows:
+                cited[i] = rows[:citation_top_k]
+            if len(rows) >= citation_top_k:
+                self.retrieval_stats["citation_hit"] += 1
+                continue
+            group_scope = self._citation_scope(snapshot, law_names, route)
+            if group_scope != route:
+                self.retrieval_stats["citation_scope"] += 1
+            groups.setdefault(group_scope, []).append(i)
+        
+        # dense 檢索：所有分組的查詢合併成一次 embedding 請求（混合檢索的向量在 _hybrid_rank 內取得）
+        embed = embed or self._embed_queries
+        pending = [i for indices in groups.values() for i in indices]
+        embeddings: Dict[int, np.ndarray] = {}
+        if self.sparse_index is None and pending:
+            embeddings = dict(zip(pending, embed([texts[i] for i in pending])))
+        
+        for group_scope, indices in groups.items():
+            group_scope = list(group_scope) if group_scope else None
+            if self.sparse_index is not None:
+                own_texts = [query_parts[i][0] for i in indices]
+                results = self._hybrid_rank([texts[i] for i in indices], top_k, group_scope, snapshot, embed,
+                                            own_texts if own_texts != [texts[i] for i in indices] else None)
+            else:
+                results = self._rank(np.array([embeddings[i] for i in indices]), top_k, group_scope, snapshot)
+            for i, matched in zip(indices, results):
+                ranked[i] = matched
+        
+        for i, rows in cited.items():
+            ranked[i] = self._with_cited(snapshot, rows, embeddings.get(i), ranked[i], top_k)
+        
+        return ranked
+
+    @staticmethod
+    def _citation_scope(snapshot: IndexSnapshot, law_names: List[str],
+                        route: Optional[Tuple[str, ...]]) -> Optional[Tuple[str, ...]]:
+        """
+        引用的法規與路由範圍的交集
+
+        沒有路由時即為引用的法規；有路由時只保留路由內的法規（名稱在路由中，或基底分區落在路由的列範圍內），
+        引用的法規都不在路由內時沿用路由，不擴大搜尋範圍
+        """
+        if not law_names:
+            return route
+        if route is None:
+            return tuple(law_names)
+        partitions = snapshot.partitions
+        route_ranges = partitions.resolve(list(route))
+        
+        def in_route(name: str) -> bool:
+            if name in route:
+                return True
+            spans = partitions.resolve([name])
+            return bool(spans) and all(any(start <= s and e <= end for start, end in route_ranges) for s, e in spans)
+        
+        inside = tuple(name for name in law_names if in_route(name))
+        return inside or route
+
+    def _citations_for(self, snapshot: IndexSnapshot) -> CitationIndex:
+        """快照基底法條表的引用索引（基底不變時沿用）"""
+        citation_index = self._citation_index
+        if citation_index is None or citation_index.articles is not snapshot.base_articles:
+            citation_index = self._citation_index = CitationIndex(snapshot.base_articles)
+        return citation_index
+
+    @staticmethod
+    def _with_cited(snapshot: IndexSnapshot, cited_rows: List[int], query_vector: Optional[np.ndarray],
+                    matched: Optional[LazyArticles], top_k: int) -> LazyArticles:
+        """
+        引用的條文排在最前，其餘名次由搜尋結果補足
+
+        有查詢向量時引用條文的相似度為實際 cosine；沒有（不需搜尋或混合檢索）時不為此 embedding，
+        分數為 CITATION_SCORE、類型 citation
+        """
+        rows = np.array(cited_rows, dtype=np.int64)
+        if query_vector is not None:
+            scores = (snapshot.vectors_of(rows) @ np.asarray(query_vector, dtype=np.float32)).astype(np.float32)
+            score_types = np.full(len(rows), SCORE_COSINE, dtype=object)
+        else:
+            scores = np.full(len(rows), CITATION_SCORE, dtype=np.float32)
+            score_types = np.full(len(rows), SCORE_CITATION, dtype=object)
+        cited = np.ones(len(rows), dtype=bool)
+        if matched is not None:
+            rest = ~np.isin(matched.rows, rows)
+            rows = np.concatenate([rows, matched.rows[rest]])
+            scores = np.concatenate([scores, matched.scores[rest].astype(np.float32)])
+            score_types = np.concatenate([score_types, matched.score_types[rest]])
+            cited = np.concatenate([cited, np.zeros(int(rest.sum()), dtype=bool)])
+        return LazyArticles(snapshot, rows[:top_k], scores[:top_k], score_types[:top_k], cited[:top_k])
+
+    def _hybrid_rank(self, texts: List[str], top_k: int, scope: Optional[List[str]] = None,
+                     snapshot: Optional[IndexSnapshot] = None,
+                     embed: Optional[Callable[[List[str]], np.ndarray]] = None,
+                     confidence_texts: Optional[List[str]] = None) -> List[LazyArticles]:
+        """
+        混合檢索：BM25 bigram 取候選，dense 分數只在候選上計算並與 BM25 分數融合
+
+        - BM25 確定命中（第一名分數夠高且明顯領先）的查詢直接以 BM25 排序，不呼叫 embedding；
+          指定 confidence_texts（如選項本身）時以其 BM25 分數判斷並排序，
+          分數以查詢上界正規化，「題目 + 選項」整段的題幹 bigram 會壓低分數而幾乎不會確定命中
+        - 其餘查詢一次批次 embedding；融合分數 = dense_weight × 餘弦相似度 + (1 - dense_weight) × BM25 正規化分數
+        - 沒有任何 bigram 命中的查詢退回全語料 dense 搜尋
+        """
+        params = self.retrieval_params
+        snapshot = snapshot or self.live_index.snapshot()
+        rows, sparse_scores = self.sparse_index.shortlist(snapshot, texts, max(params["shortlist"], top_k), scope)
+        if confidence_texts is not None:
+            own_rows, own_scores = self.sparse_index.shortlist(snapshot, confidence_texts, max(top_k, 2), scope)
+        else:
+            own_rows, own_scores = rows, sparse_scores
+        
+        top1 = own_scores[:, 0]
+        top2 = own_scores[:, 1] if own_scores.shape[1] > 1 else np.zeros_like(top1)
+        confident = (top1 >= params["confident_score"]) & (top2 <= (1 - params["confident_margin"]) * top1)
+        if not params["skip_dense"]:
+            confident[:] = False
+        
+        ranked: List[Optional[LazyArticles]] = [None] * len(texts)
+        for i in np.flatnonzero(confident):
+            found = own_rows[i, :top_k] >= 0
+            ranked[i] = LazyArticles(snapshot, own_rows[i, :top_k][found], own_scores[i, :top_k][found], SCORE_BM25)
         
-        # 計算相似度
-        similarities = np.dot(question_embedding, self.law_embeddings.T)[0]
+        dense_queries = np.flatnonzero(~confident)
+        if len(dense_queries):
+            query_embeddings = (embed or self._embed_queries)([texts[i] for i in dense_queries])
+            
+            # 有候選的查詢：只在候選上計算 dense 分數，分塊向量化融合
+            has_shortlist = rows[dense_queries, 0] >= 0
+            shortlisted = np.flatnonzero(has_shortlist)
+            w = params["dense_weight"]
+            for start in range(0, len(shortlisted), _FUSION_CHUNK):
+                chunk = shortlisted[start:start + _FUSION_CHUNK]
+                chunk_rows = rows[dense_queries[chunk]]
+                candidates = snapshot.vectors_of(chunk_rows.ravel()).reshape(*chunk_rows.shape, -1)
+                dense = np.einsum('qd,qsd->qs', query_embeddings[chunk], candidates)
+                fused = np.where(chunk_rows >= 0, w * dense + (1 - w) * sparse_scores[dense_queries[chunk]], -np.inf)
+                order = np.argsort(-fused, axis=1, kind="stable")[:, :top_k]
+                for j, query in enumerate(dense_queries[chunk]):
+                    keep = fused[j, order[j]] > -np.inf
+                    ranked[query] = LazyArticles(snapshot, chunk_rows[j, order[j]][keep], fused[j, order[j]][keep],
+                                                 SCORE_HYBRID)
+            
+            # 沒有 bigram 命中的查詢：全語料 dense 搜尋
+            fallback = np.flatnonzero(~has_shortlist)
+            if len(fallback):
+                top_indices, top_scores = snapshot.search(query_embeddings[fallback], top_k, scope)
+                for query, indices, scores in zip(dense_queries[fallback], top_indices, top_scores):
+                    found = indices >= 0
+                    ranked[query] = LazyArticles(snapshot, indices[found], scores[found])
+            
+            self.retrieval_stats["hybrid"] += len(shortlisted)
+            self.retrieval_stats["dense_fallback"] += len(fallback)
+        
+        self.retrieval_stats["sparse_only"] += int(confident.sum())
+        return ranked
+
+    def _dedup_key(self, snapshot: IndexSnapshot, scope: Optional[List[str]], kind: str) -> str:
+        """
+        匹配設定鍵：模型、語料、範圍與查詢方式相同時，近似重複的結果才可直接沿用
+
+        語料以快照的列號配置指紋表示（結果以列號保存），新增 / 修正 / 刪除法條或重新排序後不會沿用
+        """
+        option_mode = f"{self.option_mode}@{self.stem_weight}" if self.option_mode == "stem" else self.option_mode
+        return "|".join([
+            self.store_key, snapshot.fingerprint, ",".join(scope or []), kind,
+            option_mode if kind == "option" else "", self.retrieval, str(self.citations),
+            f"{self.reranker.model}@{self.reranker.margin}" if self.reranker is not None and kind == "option" else ""
+        ])
+
+    def _match_with_duplicates(self, texts: List[str], keys: List[Tuple[str, ...]], sources: List[str],
+                               top_k: int, scope: Optional[List[str]], kind: str,
+                               match: Callable[[List[str], Optional[Callable[[List[str]], np.ndarray]]], List[LazyArticles]],
+                               reuse_vectors: bool = True) -> Tuple[List[LazyArticles], List[Optional[Dict[str, Any]]]]:
+        """
+        先查近似重複索引，再匹配其餘查詢並登記結果
+
+        Args:
+            texts: 查詢文本
+            keys: 近似重複的比對部分（與 texts 同序）
+            sources: 查詢來源（登記用）
+            match: (查詢文本, 查詢向量函式或 None) -> 匹配結果
+            reuse_vectors: 設定不同時是否改以先前文本的查詢向量匹配（只適用於整段 embedding 的查詢）
+
+        Returns:
+            (與輸入同序的匹配結果, 近似重複的來源（無則為 None）)
+        """
+        if self.dedup is None:
+            return match(texts, None), [None] * len(texts)
+        
+        snapshot = self.live_index.snapshot()
+        result_key = self._dedup_key(snapshot, scope, kind)
+        ranked: List[Optional[LazyArticles]] = [None] * len(texts)
+        provenance: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+        canonical: Dict[str, str] = {}
+        
+        for i, found in enumerate(self.dedup.lookup(keys, result_key)):
+            if found is None:
+                continue
+            entry, similarity = found
+            if entry.result_key == result_key and entry.top_k >= top_k and entry.rows is not None:
+                score_types = (entry.score_types or [SCORE_COSINE] * len(entry.rows))[:top_k]
+                ranked[i] = LazyArticles(snapshot, np.array(entry.rows[:top_k], dtype=np.int64),
+                                         np.array(entry.scores[:top_k], dtype=np.float32), score_types)
+                provenance[i] = {"source": entry.source, "similarity": round(similarity, 4), "reused": "results"}
+                self.retrieval_stats["duplicate_results"] += 1
+            elif reuse_vectors:
+                canonical[texts[i]] = entry.text
+                provenance[i] = {"source": entry.source, "similarity": round(similarity, 4), "reused": "vector"}
+                self.retrieval_stats["duplicate_vectors"] += 1
         
-        # 取得 top-k 結果
-        top_indices = np.argsort(similarities)[-top_k:][::-1]
+        pending = [i for i, matched in enumerate(ranked) if matched is None]
+        if pending:
+            # 近似重複的查詢以先前的文本取得向量（查詢快取命中，不呼叫 API）；引用解析與 BM25 仍用本次文本
+            embed = (lambda batch: self._embed_queries([canonical.get(text, text) for text in batch])) if canonical else None
+            for i, matched in zip(pending, match([texts[i] for i in pending], embed)):
+                ranked[i] = matched
+            self.dedup.add(
+                [keys[i] for i in pending], [canonical.get(texts[i], texts[i]) for i in pending],
+                [sources[i] for i in pending],
+                [(ranked[i].rows.tolist(), ranked[i].scores.tolist(), ranked[i].score_types.tolist()) for i in pending],
+                result_key, top_k
+            )
         
-        matched_articles = []
-        for idx in top_indices:
-            article = self.law_articles[idx].copy()
-            article['similarity'] = float(similarities[idx])
-            matched_articles.append(article)
+        return ranked, provenance
+
+    @staticmethod
+    def _option_text(question_content: str, option_letter: str, option_content: str) -> str:
+        """組合題目與選項"""
+        return f"題目: {question_content}\n選項 {option_letter}: {option_content}"
+
+    def match_question(self, question_content: str, question_id: str = "", top_k: int = 1) -> MatchResult:
+        """匹配單一題目"""
+        start_time = time.time()
         
-        processing_time = time.time() - start_time
+        matched_articles = self._match_texts([question_content], top_k)[0]
         
         return MatchResult(
             question_id=question_id,
             question_content=question_content,
             matched_articles=matched_articles,
-            processing_time=processing_time
+            processing_time=time.time() - start_time
         )
 
     def match_option(self, question_content: str, option_letter: str, option_content: str, question_id: str = "", top_k: int = 1) -> OptionMatchResult:
         """匹配單一選項"""
+        query = OptionQuery(question_id, question_content, option_letter, option_content)
+        return self.match_options_batch([query], top_k=top_k)[0]
+
+    def match_questions_batch(self, questions: List[Tuple[str, str]], top_k: int = 1,
+                              scope: Optional[List[str]] = None, source: str = "") -> List[MatchResult]:
+        """
+        批次匹配題目
+
+        Args:
+            questions: (question_id, question_content) 列表
+            top_k: 每題返回的法條數
+            scope: 限定搜尋的分區（法規代碼 / 法規名稱 / 法規類別，None 為全語料）
+            source: 來源考卷（記錄於近似重複索引）
+
+        Returns:
+            與輸入同序的匹配結果（processing_time 為批次平均）
+        """
         start_time = time.time()
         
-        if self.law_embeddings is None:
-            raise ValueError("法條 embeddings 尚未建立")
+        texts = [content for _, content in questions]
+        ranked, duplicates = self._match_with_duplicates(
+            texts, [(text,) for text in texts], [f"{source}#{question_id}" for question_id, _ in questions],
+            top_k, scope, "question", lambda batch, embed: self._match_texts(batch, top_k, scope, embed)
+        )
+        per_item_time = (time.time() - start_time) / max(len(questions), 1)
         
-        # 組合題目與選項
-        combined_text = f"題目: {question_content}\n選項 {option_letter}: {option_content}"
+        return [
+            MatchResult(
+                question_id=question_id,
+                question_content=content,
+                matched_articles=matched_articles,
+                processing_time=per_item_time,
+                duplicate_of=duplicate_of
+            )
+            for (question_id, content), matched_articles, duplicate_of in zip(questions, ranked, duplicates)
+        ]
+
+    def match_options_batch(self, queries: List[OptionQuery], top_k: int = 1,
+                            scope: Optional[List[str]] = None) -> List[OptionMatchResult]:
+        """
+        批次匹配選項：整份考卷的選項以最少的 API 請求取得 embeddings，
+        再以單次矩陣乘法計算相似度；結果與逐一呼叫 match_option 相同
+
+        Args:
+            queries: 選項查詢列表
+            top_k: 每個選項返回的法條數
+            scope: 限定搜尋的分區（法規代碼 / 法規名稱 / 法規類別，None 為全語料）
+
+        Returns:
+            與輸入同序的匹配結果（processing_time 為批次平均）
+        """
+        start_time = time.time()
         
-        # 取得 embedding
-        response = self.client.embeddings.create(
-            input=[combined_text],
-            model=self.embedding_model
-        )
-        option_embedding = np.array(response.data[0].embedding).reshape(1, -1)
+        # BM25 候選使用完整的「題目 + 選項」文本（確定命中以選項本身判斷）；stem 模式只改變 dense 查詢向量的組成
+        texts = [self._option_text(q.question_content, q.option_letter, q.option_content) for q in queries]
+        # 引用的條文只取自選項本身，題目引用的法規只用來限定搜尋範圍
+        query_parts = {text: (q.option_content, q.question_content) for text, q in zip(texts, queries)}
+        stem_embed = self._stem_option_embedder(queries) if self.option_mode == "stem" else None
+        reranked_texts = set()
         
-        # 計算相似度
-        similarities = np.dot(option_embedding, self.law_embeddings.T)[0]
+        def match(batch: List[str], embed: Optional[Callable[[List[str]], np.ndarray]]) -> List[LazyArticles]:
+            embed = stem_embed or embed
+            # 有重排時至少取 candidates 名，模糊的選項重排後再截斷為 top_k
+            parts = [query_parts[text] for text in batch]
+            if self.reranker is None:
+                return self._match_texts(batch, top_k, scope, embed, parts)
+            ranked = self._match_texts(batch, max(top_k, self.reranker.candidates), scope, embed, parts, top_k)
+            ranked, flags = self.reranker.rerank(batch, ranked)
+            reranked_texts.update(text for text, flag in zip(batch, flags) if flag)
+            return [m.take(slice(0, top_k)) for m in ranked]
         
-        # 取得 top-k 結果
-        top_indices = np.argsort(similarities)[-top_k:][::-1]
+        # 近似重複以 (題幹, 選項) 比對：同一題的其他選項不會誤判為重複；stem 模式的向量不以整段文本快取，不沿用
+        ranked, duplicates = self._match_with_duplicates(
+            texts, [(q.question_content, q.option_content) for q in queries],
+            [f"{q.source}#{q.question_id}{q.option_letter}" for q in queries],
+            top_k, scope, "option", match, reuse_vectors=stem_embed is None
+        )
+        reranked = [text in reranked_texts for text in texts]
+        per_item_time = (time.time() - start_time) / max(len(queries), 1)
         
-        matched_articles = []
-        for idx in top_indices:
-            article = self.law_articles[idx].copy()
-            article['similarity'] = float(similarities[idx])
-            matched_articles.append(article)
+        return [
+            OptionMatchResult(
+                question_id=q.question_id,
+                option_letter=q.option_letter,
+                option_content=q.option_content,
+                matched_articles=matched_articles,
+                processing_time=per_item_time,
+                reranked=was_reranked,
+                duplicate_of=duplicate_of
+            )
+            for q, matched_articles, was_reranked, duplicate_of in zip(queries, ranked, reranked, duplicates)
+        ]
+
+    def _stem_option_embedder(self, queries: List[OptionQuery]) -> Callable[[List[str]], np.ndarray]:
+        """
+        stem 模式的查詢向量：題幹與選項分別 embedding（去重，題幹每題只送一次），
+        選項查詢向量 = normalize(stem_weight × 題幹 + (1 - stem_weight) × 選項)
+        """
+        parts = {
+            self._option_text(q.question_content, q.option_letter, q.option_content): (q.question_content, q.option_content)
+            for q in queries
+        }
         
-        processing_time = time.time() - start_time
+        def embed(texts: List[str]) -> np.ndarray:
+            stems = [parts[text][0] for text in texts]
+            options = [parts[text][1] for text in texts]
+            unique_texts = list(dict.fromkeys(stems + options))
+            vectors = dict(zip(unique_texts, self._embed_queries(unique_texts)))
+            
+            combined = (self.stem_weight * np.array([vectors[s] for s in stems])
+                        + (1 - self.stem_weight) * np.array([vectors[o] for o in options]))
+            norms = np.linalg.norm(combined, axis=1, keepdims=True)
+            return (combined / np.where(norms > 0, norms, 1.0)).astype(np.float32)
         
-        return OptionMatchResult(
-            question_id=question_id,
-            option_letter=option_letter,
-            option_content=option_content,
-            matched_articles=matched_articles,
-            processing_time=processing_time
-        )
+        return embed
+
+    def _is_item_error(self, error: BaseException) -> bool:
+        """
+        是否可能只由個別題目 / 選項造成（輸入錯誤或資料錯誤），逐筆重送才有意義
+
+        連線、限流等暫時性錯誤與其他 API 錯誤與輸入無關，逐筆重送只會放大請求數
+        """
+        if is_input_error(error):
+            return True
+        if isinstance(error, self.provider.retryable_errors):
+            return False
+        return isinstance(error, (ValueError, KeyError, IndexError, TypeError, AttributeError))
+
+    def _match_isolated(self, items: List[Any], match_batch: Callable[[List[Any]], List[Any]],
+                        describe: Callable[[Any], str]) -> List[Any]:
+        """
+        整批匹配；整批因個別輸入失敗時改為逐筆匹配，單筆失敗只記錄並略過該筆
+
+        其他錯誤（連線、限流、驗證）直接拋出，不逐筆重送
+
+        Returns:
+            與 items 同序的匹配結果，失敗的位置為 None
+        """
+        try:
+            return match_batch(items)
+        except Exception as e:
+            if not self._is_item_error(e):
+                raise
+            logger.warning(f"⚠️ 批次匹配失敗，改為逐筆匹配（{len(items)} 筆）: {e}")
+        
+        results = []
+        for item in items:
+            try:
+                results.extend(match_batch([item]))
+            except Exception as e:
+                if not self._is_item_error(e):
+                    raise
+                logger.error(f"{describe(item)} 匹配失敗: {e}")
+                results.append(None)
+        return results
 
-    def process_exam_questions(self, questions_file: str, output_file: str = None) -> Dict[str, Any]:
-        """處理完整考題集"""
+    def process_exam_questions(self, questions_file: str, output_file: str = None,
+                               subject: Optional[str] = None) -> Dict[str, Any]:
+        """
+        處理完整考題集（整份考卷批次 embedding）
+
+        subject 未指定時由檔名取出考科，並依考科路由限定搜尋的法規分區
+        """
         logger.info(f"📝 處理考題集: {questions_file}")
         
         # 讀取考題
         with open(questions_file, 'r', encoding='utf-8') as f:
             exam_data = json.load(f)
         
+        route = self.resolve_route(subject or subject_from_filename(questions_file))
+        scope = route["targets"] if route else None
+        cache_before = self.query_cache.stats()
+        
         results = {
             "metadata": {
                 "source_file": questions_file,
                 "embedding_model": self.embedding_model,
+                "embedding_dimensions": self.dimensions,
+                "provider": self.provider.kind,
+                "index_type": self.index_type,
+                "retrieval": self.retrieval,
+                "citations": self.citations,
+                "option_mode": self.option_mode,
                 "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-                "total_law_articles": len(self.law_articles)
+                "total_law_articles": self.live_index.snapshot().num_live,
+                "route": route,
+                "result_format": ARTICLE_REFS_FORMAT
             },
             "question_matches": [],
             "option_matches": [],
             "statistics": {
                 "total_processing_time": 0.0,
                 "questions_processed": 0,
-                "options_processed": 0
+                "options_processed": 0,
+                "options_reranked": 0,
+                "near_duplicates": 0
             }
         }
         
         start_time = time.time()
         
-        # 處理選擇題
+        # 收集選擇題的題目與選項
         mc_questions = exam_data.get('multiple_choice_section', {}).get('questions', [])
         
+        question_items = []
+        option_queries = []
         for question in mc_questions:
             question_id = str(question['question_number'])
             question_content = question['content']
+            question_items.append((question_id, question_content))
             
-            # 匹配題目
-            try:
-                question_match = self.match_question(question_content, question_id)
+            options = question.get('options', {})
+            for option_letter, option_content in options.items():
+                option_queries.append(OptionQuery(question_id, question_content, option_letter, option_content,
+                                                  source=Path(questions_file).name))
+        
+        # 每個法條只寫入一次 articles 表，題目 / 選項以 id 引用
+        article_refs = ArticleRefWriter()
+        
+        # 匹配題目（整批失敗時逐題匹配，只略過失敗的題目）
+        question_matches = self._match_isolated(
+            question_items,
+            lambda items: self.match_questions_batch(items, scope=scope, source=Path(questions_file).name),
+            lambda item: f"題目 {item[0]}"
+        )
+        for question_match in question_matches:
+            if question_match is not None:
                 results["question_matches"].append({
                     "question_id": question_match.question_id,
                     "question_content": question_match.question_content,
-                    "matched_articles": question_match.matched_articles,
-                    "processing_time": question_match.processing_time
+                    "matched_articles": article_refs.refs(question_match.matched_articles),
+                    "processing_time": question_match.processing_time,
+                    "near_duplicate": question_match.duplicate_of
                 })
                 results["statistics"]["questions_processed"] += 1
-                
-            except Exception as e:
-                logger.error(f"題目 {question_id} 匹配失敗: {e}")
-            
-            # 匹配選項
-            options = question.get('options', {})
-            for option_letter, option_content in options.items():
-                try:
-                    option_match = self.match_option(question_content, option_letter, option_content, question_id)
-                    results["option_matches"].append({
-                        "question_id": option_match.question_id,
-                        "option_letter": option_match.option_letter,
-                        "option_content": option_match.option_content,
-                        "matched_articles": option_match.matched_articles,
-                        "processing_time": option_match.processing_time
-                    })
-                    results["statistics"]["options_processed"] += 1
-                    
-                except Exception as e:
-                    logger.error(f"選項 {question_id}-{option_letter} 匹配失敗: {e}")
+                results["statistics"]["near_duplicates"] += int(question_match.duplicate_of is not None)
+        
+        # 匹配選項（整批失敗時逐一匹配，只略過失敗的選項）
+        option_matches = self._match_isolated(
+            option_queries,
+            lambda items: self.match_options_batch(items, scope=scope),
+            lambda item: f"選項 {item.question_id}-{item.option_letter}"
+        )
+        for option_match in option_matches:
+            if option_match is not None:
+                results["option_matches"].append({
+                    "question_id": option_match.question_id,
+                    "option_letter": option_match.option_letter,
+                    "option_content": option_match.option_content,
+                    "matched_articles": article_refs.refs(option_match.matched_articles),
+                    "processing_time": option_match.processing_time,
+                    "reranked": option_match.reranked,
+                    "near_duplicate": option_match.duplicate_of
+                })
+                results["statistics"]["options_processed"] += 1
+                results["statistics"]["options_reranked"] += int(option_match.reranked)
+                results["statistics"]["near_duplicates"] += int(option_match.duplicate_of is not None)
+        
+        results["articles"] = article_refs.articles
         
         total_time = time.time() - start_time
         results["statistics"]["total_processing_time"] = total_time
+        results["statistics"]["query_cache"] = stats_delta(cache_before, self.query_cache.stats())
         
         # 保存結果
         if output_file:
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+法條 Embedding 磁碟儲存
+以 (embedding 模型, 正規化文本雜湊) 為鍵，保存 float32 矩陣與 id manifest
+語料未變動時直接以 memmap 開啟，不需任何 API 呼叫
+
+每次寫入產生新的世代目錄（generations/<n>/），完成後才以原子方式切換 CURRENT 指標，
+中斷的寫入不會讓矩陣與 manifest 不一致
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import unicodedata
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 2
+
+# 切換後保留的舊世代數（其他行程可能仍以 memmap 開啟）
+KEEP_GENERATIONS = 2
+
+
+def normalize_text(text: str) -> str:
+    """正規化文本：NFKC 全半形統一 + 合併空白"""
+    return " ".join(unicodedata.normalize("NFKC", str(text)).split())
+
+
+def text_hash(text: str) -> str:
+    """計算正規化文本的 SHA-256 雜湊"""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def model_slug(embedding_model: str) -> str:
+    """將模型名稱轉為安全的目錄名稱"""
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", embedding_model)
+
+
+def _atomic_write_bytes(path: Path, writer: Callable) -> None:
+    """寫入暫存檔後再以 os.replace 取代，避免留下半寫入的檔案"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        writer(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+@dataclass
+class CorpusDiff:
+    """新語料與已儲存 manifest 的差異（以法條 ID + 內容雜湊比對）"""
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: int = 0
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.added or self.changed or self.removed)
+
+    def summary(self) -> str:
+        return f"新增 {len(self.added)} / 修改 {len(self.changed)} / 刪除 {len(self.removed)} / 未變 {self.unchanged}"
+
+
+class EmbeddingStore:
+    """內容定址的法條 embedding 儲存（每個模型一個目錄）"""
+
+    VECTORS_FILE = "vectors.npy"
+    MANIFEST_FILE = "manifest.json"
+    CURRENT_FILE = "CURRENT"
+    GENERATIONS_DIR = "generations"
+
+    def __init__(self, root_dir: str, embedding_model: str):
+        self.embedding_model = embedding_model
+        self.store_dir = Path(root_dir) / model_slug(embedding_model)
+
+        self.ids: List[str] = []
+        self.hashes: List[str] = []
+        self.vectors: Optional[np.ndarray] = None
+        self.generation = 0
+        self._row_of: Dict[str, int] = {}
+
+        self._load()
+
+    @property
+    def current_dir(self) -> Path:
+        """目前世代的目錄（沒有 CURRENT 指標時為舊版的單層目錄）"""
+        current_path = self.store_dir / self.CURRENT_FILE
+        if current_path.exists():
+            return self.store_dir / self.GENERATIONS_DIR / current_path.read_text(encoding="utf-8").strip()
+        return self.store_dir
+
+    @property
+    def vectors_path(self) -> Path:
+        return self.current_dir / self.VECTORS_FILE
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.current_dir / self.MANIFEST_FILE
+
+    @property
+    def fingerprint(self) -> str:
+        """語料指紋：依序串接所有文本雜湊後的雜湊（衍生索引用來判斷是否需重建）"""
+        return hashlib.sha256("".join(self.hashes).encode("ascii")).hexdigest()
+
+    def _load(self) -> None:
+        """載入 manifest 並以唯讀 memmap 開啟向量矩陣"""
+        if not self.manifest_path.exists() or not self.vectors_path.exists():
+            return
+
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+
+            if manifest.get("embedding_model") != self.embedding_model:
+                logger.warning(f"⚠️ Embedding 儲存模型不符，忽略: {self.store_dir}")
+                return
+
+            vectors = np.load(self.vectors_path, mmap_mode='r')
+            if vectors.shape[0] != len(manifest["hashes"]):
+                logger.warning(f"⚠️ Embedding 儲存筆數與 manifest 不一致，忽略: {self.store_dir}")
+                return
+
+            self.ids = list(manifest["ids"])
+            self.hashes = list(manifest["hashes"])
+            self.vectors = vectors
+            self.generation = int(manifest.get("generation", 0))
+            self._row_of = {h: i for i, h in enumerate(self.hashes)}
+
+        except Exception as e:
+            logger.warning(f"⚠️ 讀取 Embedding 儲存失敗，將重新建立: {e}")
+
+    def diff(self, ids: List[str], hashes: List[str]) -> CorpusDiff:
+        """比對新語料與目前 manifest"""
+        stored = dict(zip(self.ids, self.hashes))
+        corpus_diff = CorpusDiff()
+        for article_id, h in zip(ids, hashes):
+            if article_id not in stored:
+                corpus_diff.added.append(article_id)
+            elif stored[article_id] != h:
+                corpus_diff.changed.append(article_id)
+            else:
+                corpus_diff.unchanged += 1
+        new_ids = set(ids)
+        corpus_diff.removed = [article_id for article_id in self.ids if article_id not in new_ids]
+        return corpus_diff
+
+    def save(self, ids: List[str], hashes: List[str], vectors: np.ndarray) -> None:
+        """將矩陣與 manifest 寫入新世代目錄，再原子切換 CURRENT 指標並重新以 memmap 開啟"""
+        matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+        if not np.isfinite(matrix).all() or not np.abs(matrix).sum(axis=1).all():
+            raise ValueError("向量矩陣含缺失列（零向量或非有限值），拒絕保存")
+
+        generation = self.generation + 1
+        generations_dir = self.store_dir / self.GENERATIONS_DIR
+        generation_dir = generations_dir / f"{generation:06d}"
+        if generation_dir.exists():
+            shutil.rmtree(generation_dir)
+        generation_dir.mkdir(parents=True)
+
+        _atomic_write_bytes(generation_dir / self.VECTORS_FILE, lambda f: np.save(f, matrix))
+
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "embedding_model": self.embedding_model,
+            "generation": generation,
+            "dim": int(matrix.shape[1]),
+            "count": int(matrix.shape[0]),
+            "ids": list(ids),
+            "hashes": list(hashes),
+        }
+        payload = json.dumps(manifest, ensure_ascii=False).encode("utf-8")
+        _atomic_write_bytes(generation_dir / self.MANIFEST_FILE, lambda f: f.write(payload))
+
+        # 切換指標：在此之前讀取者看到的仍是完整的舊世代
+        _atomic_write_bytes(self.store_dir / self.CURRENT_FILE, lambda f: f.write(generation_dir.name.encode("ascii")))
+        self._load()
+        self._prune_generations(generations_dir)
+
+    def _prune_generations(self, generations_dir: Path) -> None:
+        """移除較舊的世代（保留最近 KEEP_GENERATIONS 個）"""
+        for old_dir in sorted(generations_dir.iterdir())[:-KEEP_GENERATIONS]:
+            shutil.rmtree(old_dir, ignore_errors=True)
+
+    def get_or_build(self, ids: List[str], texts: List[str],
+                     embed_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        依文本雜湊取出 embeddings，缺少的部分呼叫 embed_fn 補齊後寫回
+
+        Args:
+            ids: 法條 ID（與 texts 同序）
+            texts: 要 embedding 的文本
+            embed_fn: 接收文本列表、回傳 (n, dim) 矩陣的函式
+
+        Returns:
+            與 texts 同序的 float32 矩陣（語料未變動時為唯讀 memmap）
+        """
+        hashes = [text_hash(text) for text in texts]
+        if not hashes:
+            return np.empty((0, 0), dtype=np.float32)
+
+        # 語料完全相同：直接回傳 memmap
+        if self.vectors is not None and hashes == self.hashes and list(ids) == self.ids:
+            logger.info(f"⚡ 使用既有 embedding 儲存: {len(hashes)} 條 ({self.store_dir})")
+            return self.vectors
+
+        if self.vectors is not None:
+            logger.info(f"📝 法條差異: {self.diff(ids, hashes).summary()}")
+
+        # 以內容雜湊重用既有向量：新增與修改的條文才需要呼叫 API，刪除的條文自然不再寫入
+        rows = [self._row_of.get(h, -1) for h in hashes]
+        missing = [i for i, row in enumerate(rows) if row < 0]
+        logger.info(f"🔍 Embedding 儲存命中 {len(hashes) - len(missing)}/{len(hashes)} 條，需建立 {len(missing)} 條")
+
+        new_vectors = None
+        if missing:
+            new_vectors = np.asarray(embed_fn([texts[i] for i in missing]), dtype=np.float32)
+
+        dim = new_vectors.shape[1] if new_vectors is not None else self.vectors.shape[1]
+        matrix = np.empty((len(hashes), dim), dtype=np.float32)
+
+        hit_positions = [i for i, row in enumerate(rows) if row >= 0]
+        if hit_positions:
+            matrix[hit_positions] = self.vectors[[rows[i] for i in hit_positions]]
+        if missing:
+            matrix[missing] = new_vectors
+
+        self.save(ids, hashes, matrix)
+        logger.info(f"💾 Embedding 儲存已更新: {self.store_dir}")
+        return self.vectors
@@ -3,317 +3,73 @@
 """
 Gemini Embedding 匹配系統
 基於 Google Gemini API 的 embedding 相似度比對
+（匹配流程與 EmbeddingMatcher 共用，只替換 embedding 提供者）
 """
 
-import json
-import logging
-import os
-import time
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
-import pandas as pd
-import numpy as np
+from typing import List, Optional
+
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+from .checkpoint import BatchCheckpoint
+from .embedding_matcher import EmbeddingMatcher, MatchResult, OptionMatchResult
+from .providers import EmbeddingProvider
+
+__all__ = ["GeminiProvider", "GeminiEmbeddingMatcher", "MatchResult", "OptionMatchResult"]
+
+# 視為暫時性、需要退避重試的 Gemini API 錯誤
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+)
 
-logger = logging.getLogger(__name__)
 
-@dataclass
-class MatchResult:
-    """匹配結果"""
-    question_id: str
-    question_content: str
-    matched_articles: List[Dict[str, Any]]
-    processing_time: float
+class GeminiProvider(EmbeddingProvider):
+    """Gemini embed_content（法條與查詢使用不同的 task_type）"""
 
-@dataclass 
-class OptionMatchResult:
-    """選項匹配結果"""
-    question_id: str
-    option_letter: str
-    option_content: str
-    matched_articles: List[Dict[str, Any]]
-    processing_time: float
+    kind = "gemini"
+    retryable_errors = RETRYABLE_ERRORS
 
-class GeminiEmbeddingMatcher:
-    """基於 Gemini API 的 Embedding 匹配器"""
-    
-    def __init__(self, gemini_api_key: str, embedding_model: str = "models/embedding-001"):
-        # 配置 Gemini API
-        genai.configure(api_key=gemini_api_key)
-        self.embedding_model = embedding_model
-        
-        # 法條資料
-        self.law_articles: List[Dict[str, Any]] = []
-        self.law_embeddings: Optional[np.ndarray] = None
-        
-        logger.info(f"🎯 初始化 Gemini Embedding 匹配器: {embedding_model}")
+    # Gemini batch embed 單次請求上限（單筆輸入 2048 token）
+    max_batch_items = 100
+    max_batch_tokens = 204800
+    max_input_tokens = 2048
 
-    def load_law_articles(self, csv_path: str) -> bool:
-        """載入法條資料並建立 embeddings"""
-        try:
-            logger.info(f"📊 載入法條資料: {csv_path}")
-            
-            # 讀取 CSV
-            df = pd.read_csv(csv_path, encoding='utf-8')
-            logger.info(f"📋 載入 {len(df)} 條法規資料")
-            
-            # 轉換為字典格式
-            self.law_articles = []
-            for _, row in df.iterrows():
-                article = {
-                    "id": f"{row['法規代碼']}-{row['條文主號']}-{row['條文次號']}" if row['條文次號'] > 0 else f"{row['法規代碼']}-{row['條文主號']}",
-                    "law_code": row['法規代碼'],
-                    "law_name": row['法規名稱'],
-                    "chapter_title": row['章節標題'],
-                    "article_no_main": row['條文主號'],
-                    "article_no_sub": row['條文次號'],
-                    "content": row['條文完整內容'],
-                    "category": row.get('法規類別', ''),
-                    "authority": row.get('主管機關', '')
-                }
-                self.law_articles.append(article)
-            
-            # 建立 embeddings
-            self._build_embeddings()
-            
-            logger.info(f"✅ 法條資料載入完成: {len(self.law_articles)} 條")
-            return True
-            
-        except Exception as e:
-            logger.error(f"❌ 載入法條資料失敗: {e}")
-            return False
+    def __init__(self, api_key: Optional[str], model: str = "models/embedding-001"):
+        super().__init__(model)
+        genai.configure(api_key=api_key)
 
-    def _build_embeddings(self):
-        """建立法條 embeddings"""
-        logger.info("🔧 建立法條 embeddings...")
-        
-        # 準備文本
-        law_texts = []
-        for article in self.law_articles:
-            # 簡單組合：法規名稱 + 條文內容
-            text = f"{article['law_name']} 第{article['article_no_main']}條 {article['content']}"
-            law_texts.append(text)
-        
-        # 批次呼叫 Gemini Embeddings API
-        embeddings = []
-        batch_size = 100  # Gemini API 支援批次處理
-        
-        for i in range(0, len(law_texts), batch_size):
-            batch = law_texts[i:i + batch_size]
-            
-            try:
-                # 使用 Gemini API 生成 embeddings
-                response = genai.embed_content(
-                    model=self.embedding_model,
-                    content=batch,
-                    task_type="retrieval_document"
-                )
-                
-                # 提取 embeddings
-                batch_embeddings = response['embedding']
-                if isinstance(batch_embeddings[0], list):
-                    # 如果是批次請求，直接使用
-                    embeddings.extend(batch_embeddings)
-                else:
-                    # 如果是單個請求，包裝成列表
-                    embeddings.append(batch_embeddings)
-                
-                logger.info(f"完成批次 {i//batch_size + 1}/{(len(law_texts)-1)//batch_size + 1}")
-                
-            except Exception as e:
-                logger.error(f"批次 {i//batch_size + 1} 處理失敗: {e}")
-                # 如果批次失敗，嘗試單個處理
-                for text in batch:
-                    try:
-                        response = genai.embed_content(
-                            model=self.embedding_model,
-                            content=text,
-                            task_type="retrieval_document"
-                        )
-                        embeddings.append(response['embedding'])
-                    except Exception as single_e:
-                        logger.error(f"單個文本處理失敗: {single_e}")
-                        # 使用零向量作為備用
-                        embeddings.append([0.0] * 768)  # Gemini embedding 維度
-        
-        self.law_embeddings = np.array(embeddings)
-        logger.info(f"✅ 完成建立 {len(embeddings)} 條法條的 embeddings")
+    def embed_batch(self, texts: List[str], query: bool = False) -> List[List[float]]:
+        response = genai.embed_content(
+            model=self.model,
+            content=texts,
+            task_type="retrieval_query" if query else "retrieval_document"
+        )
 
-    def match_question(self, question_content: str, question_id: str = "", top_k: int = 1) -> MatchResult:
-        """匹配單一題目"""
-        start_time = time.time()
-        
-        if self.law_embeddings is None:
-            raise ValueError("法條 embeddings 尚未建立")
-        
-        try:
-            # 取得題目 embedding
-            response = genai.embed_content(
-                model=self.embedding_model,
-                content=question_content,
-                task_type="retrieval_query"
-            )
-            question_embedding = np.array(response['embedding']).reshape(1, -1)
-            
-            # 計算相似度
-            similarities = np.dot(question_embedding, self.law_embeddings.T)[0]
-            
-            # 取得 top-k 結果
-            top_indices = np.argsort(similarities)[-top_k:][::-1]
-            
-            matched_articles = []
-            for idx in top_indices:
-                article = self.law_articles[idx].copy()
-                article['similarity'] = float(similarities[idx])
-                matched_articles.append(article)
-            
-            processing_time = time.time() - start_time
-            
-            return MatchResult(
-                question_id=question_id,
-                question_content=question_content,
-                matched_articles=matched_articles,
-                processing_time=processing_time
-            )
-            
-        except Exception as e:
-            logger.error(f"題目匹配失敗: {e}")
-            # 返回空結果
-            return MatchResult(
-                question_id=question_id,
-                question_content=question_content,
-                matched_articles=[],
-                processing_time=time.time() - start_time
-            )
+        # 提取 embeddings
+        batch_embeddings = response['embedding']
+        if isinstance(batch_embeddings[0], list):
+            # 如果是批次請求，直接使用
+            return batch_embeddings
+        # 如果是單個請求，包裝成列表
+        return [batch_embeddings]
 
-    def match_option(self, question_content: str, option_letter: str, option_content: str, question_id: str = "", top_k: int = 1) -> OptionMatchResult:
-        """匹配單一選項"""
-        start_time = time.time()
-        
-        if self.law_embeddings is None:
-            raise ValueError("法條 embeddings 尚未建立")
-        
-        try:
-            # 組合題目與選項
-            combined_text = f"題目: {question_content}\n選項 {option_letter}: {option_content}"
-            
-            # 取得 embedding
-            response = genai.embed_content(
-                model=self.embedding_model,
-                content=combined_text,
-                task_type="retrieval_query"
-            )
-            option_embedding = np.array(response['embedding']).reshape(1, -1)
-            
-            # 計算相似度
-            similarities = np.dot(option_embedding, self.law_embeddings.T)[0]
-            
-            # 取得 top-k 結果
-            top_indices = np.argsort(similarities)[-top_k:][::-1]
-            
-            matched_articles = []
-            for idx in top_indices:
-                article = self.law_articles[idx].copy()
-                article['similarity'] = float(similarities[idx])
-                matched_articles.append(article)
-            
-            processing_time = time.time() - start_time
-            
-            return OptionMatchResult(
-                question_id=question_id,
-                option_letter=option_letter,
-                option_content=option_content,
-                matched_articles=matched_articles,
-                processing_time=processing_time
-            )
-            
-        except Exception as e:
-            logger.error(f"選項匹配失敗: {e}")
-            # 返回空結果
-            return OptionMatchResult(
-                question_id=question_id,
-                option_letter=option_letter,
-                option_content=option_content,
-                matched_articles=[],
-                processing_time=time.time() - start_time
-            )
 
-    def process_exam_questions(self, questions_file: str, output_file: str = None) -> Dict[str, Any]:
-        """處理完整考題集"""
-        logger.info(f"📝 處理考題集: {questions_file}")
-        
-        # 讀取考題
-        with open(questions_file, 'r', encoding='utf-8') as f:
-            exam_data = json.load(f)
-        
-        results = {
-            "metadata": {
-                "source_file": questions_file,
-                "embedding_model": self.embedding_model,
-                "provider": "gemini",
-                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-                "total_law_articles": len(self.law_articles)
-            },
-            "question_matches": [],
-            "option_matches": [],
-            "statistics": {
-                "total_processing_time": 0.0,
-                "questions_processed": 0,
-                "options_processed": 0
-            }
-        }
-        
-        start_time = time.time()
-        
-        # 處理選擇題
-        mc_questions = exam_data.get('multiple_choice_section', {}).get('questions', [])
-        
-        for question in mc_questions:
-            question_id = str(question['question_number'])
-            question_content = question['content']
-            
-            # 匹配題目
-            try:
-                question_match = self.match_question(question_content, question_id)
-                results["question_matches"].append({
-                    "question_id": question_match.question_id,
-                    "question_content": question_match.question_content,
-                    "matched_articles": question_match.matched_articles,
-                    "processing_time": question_match.processing_time
-                })
-                results["statistics"]["questions_processed"] += 1
-                
-            except Exception as e:
-                logger.error(f"題目 {question_id} 匹配失敗: {e}")
-            
-            # 匹配選項
-            options = question.get('options', {})
-            for option_letter, option_content in options.items():
-                try:
-                    option_match = self.match_option(question_content, option_letter, option_content, question_id)
-                    results["option_matches"].append({
-                        "question_id": option_match.question_id,
-                        "option_letter": option_match.option_letter,
-                        "option_content": option_match.option_content,
-                        "matched_articles": option_match.matched_articles,
-                        "processing_time": option_match.processing_time
-                    })
-                    results["statistics"]["options_processed"] += 1
-                    
-                except Exception as e:
-                    logger.error(f"選項 {question_id}-{option_letter} 匹配失敗: {e}")
-        
-        total_time = time.time() - start_time
-        results["statistics"]["total_processing_time"] = total_time
-        
-        # 保存結果
-        if output_file:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(results, f, ensure_ascii=False, indent=2)
-            logger.info(f"💾 結果已保存: {output_file}")
-        
-        logger.info(f"✅ 處理完成: {results['statistics']['questions_processed']} 題目, {results['statistics']['options_processed']} 選項")
-        
-        return results
+class GeminiEmbeddingMatcher(EmbeddingMatcher):
+    """
+    基於 Gemini API 的 Embedding 匹配器
 
+    Args:
+        gemini_api_key: Gemini API Key
+        embedding_model: Gemini embedding 模型
+        checkpoint_dir: 批次檢查點目錄（未指定 store_dir 時，指定此目錄仍可中斷後續建）
+        其餘參數同 EmbeddingMatcher
+    """
 
+    def __init__(self, gemini_api_key: str, embedding_model: str = "models/embedding-001",
+                 checkpoint_dir: Optional[str] = None, **kwargs):
+        super().__init__(provider=GeminiProvider(gemini_api_key, embedding_model), **kwargs)
+        if checkpoint_dir:
+            self.checkpoint = BatchCheckpoint(checkpoint_dir)
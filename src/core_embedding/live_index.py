@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+可線上更新的常駐法條索引
+- 基底：載入時建立的法條矩陣 + 向量索引（唯讀）
+- 區段：新增 / 修正的法條以 append-only 區段附加，不重建基底索引
+- 墓碑：刪除或被修正取代的列只做標記，查詢時過濾
+- 識別：更新以 (法規名稱, 條號, 次號) 對應舊版本，法條 ID 只在唯一時使用（未知法規共用代碼）
+- 壓實：墓碑或區段累積到門檻後，於背景執行緒合併成新的基底
+每次更新都產生新的不可變快照，查詢只讀取呼叫當下的快照，不受進行中的更新影響
+"""
+
+import bisect
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .article_table import ArticleKey, ArticleTable, article_key
+from .routing import PartitionMap
+from .scoring import top_k_search, top_k_search_ranges
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Segment:
+    """append-only 區段：一次更新加入的法條"""
+    offset: int
+    vectors: np.ndarray
+    articles: ArticleTable
+
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    """
+    索引的不可變快照
+
+    列號為全域編號：基底 0..B-1，之後依序接續各區段
+    """
+    version: int
+    base_vectors: np.ndarray
+    base_articles: ArticleTable
+    base_index: Any
+    partitions: PartitionMap
+    segments: Tuple[Segment, ...]
+    tombstones: np.ndarray
+
+    @property
+    def num_rows(self) -> int:
+        if self.segments:
+            last = self.segments[-1]
+            return last.offset + len(last.articles)
+        return len(self.base_articles)
+
+    @property
+    def num_live(self) -> int:
+        return self.num_rows - len(self.tombstones)
+
+    @property
+    def segment_rows(self) -> int:
+        return self.num_rows - len(self.base_articles)
+
+    def article_id(self, row: int) -> str:
+        if row < len(self.base_articles):
+            return str(self.base_articles.ids[row])
+        segment = self.segments[bisect.bisect_right([s.offset for s in self.segments], row) - 1]
+        return str(segment.articles.ids[row - segment.offset])
+
+    def _group_live(self, values: Sequence[Hashable]) -> Dict[Any, List[int]]:
+        """有效列依值分組：值 -> 全域列號"""
+        dead = set(self.tombstones.tolist())
+        groups: Dict[Any, List[int]] = {}
+        for row, value in enumerate(values):
+            if row not in dead:
+                groups.setdefault(value, []).append(row)
+        return groups
+
+    @cached_property
+    def live_ids(self) -> Dict[str, List[int]]:
+        """有效列的 法條 ID -> 全域列號（同一 ID 可能有多列）"""
+        tables = [self.base_articles] + [segment.articles for segment in self.segments]
+        return self._group_live([article_id for table in tables for article_id in table.ids.tolist()])
+
+    @cached_property
+    def live_keys(self) -> Dict[ArticleKey, List[int]]:
+        """有效列的 (法規名稱, 條號, 次號) -> 全域列號"""
+        tables = [self.base_articles] + [segment.articles for segment in self.segments]
+        return self._group_live([key for table in tables for key in table.keys()])
+
+    @cached_property
+    def fingerprint(self) -> str:
+        """列號配置的指紋：依列號順序的 (ID, 內容) 與墓碑；相同時兩個快照的列號指向相同的法條"""
+        digest = hashlib.sha256()
+        for table in [self.base_articles] + [segment.articles for segment in self.segments]:
+            for article_id, content in zip(table.ids.tolist(), table.contents()):
+                digest.update(f"{article_id}\0{content}\0".encode("utf-8"))
+        digest.update(np.asarray(self.tombstones, dtype=np.int64).tobytes())
+        return digest.hexdigest()
+
+    @cached_property
+    def key_rows(self) -> Optional[Dict[ArticleKey, int]]:
+        """有線上更新時，(法規名稱, 條號, 次號) -> 有效列號；尚未有更新時為 None（列號即基底列號）"""
+        if not self.segments and len(self.tombstones) == 0:
+            return None
+        return {key: rows[0] for key, rows in self.live_keys.items()}
+
+    def article(self, row: int) -> Dict[str, Any]:
+        """將單一列還原為法條 dict"""
+        if row < len(self.base_articles):
+            return self.base_articles.row(row)
+        segment = self.segments[bisect.bisect_right([s.offset for s in self.segments], row) - 1]
+        return segment.articles.row(row - segment.offset)
+
+    def vectors_of(self, rows: np.ndarray) -> np.ndarray:
+        """依全域列號取出向量（-1 的位置為零向量）"""
+        rows = np.asarray(rows, dtype=np.int64)
+        vectors = np.zeros((len(rows), self.base_vectors.shape[1]), dtype=np.float32)
+        num_base = len(self.base_articles)
+        in_base = (rows >= 0) & (rows < num_base)
+        vectors[in_base] = self.base_vectors[rows[in_base]]
+        for segment in self.segments:
+            in_segment = (rows >= segment.offset) & (rows < segment.offset + len(segment.articles))
+            vectors[in_segment] = segment.vectors[rows[in_segment] - segment.offset]
+        return vectors
+
+    @staticmethod
+    def rows_in_scope(segment: Segment, scope: Optional[List[str]]) -> np.ndarray:
+        """區段中屬於 scope（法規代碼 / 名稱 / 類別）的區段內列號"""
+        rows = np.arange(len(segment.articles))
+        if not scope:
+            return rows
+        in_scope = np.zeros(len(rows), dtype=bool)
+        for field in ("law_code", "law_name", "category"):
+            in_scope |= np.isin(segment.articles.column(field), list(scope))
+        return rows[in_scope]
+
+    def search(self, queries: np.ndarray, k: int,
+               scope: Optional[List[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        搜尋快照中仍有效的列
+
+        Returns:
+            (indices, scores)：全域列號，不足 k 的位置填 -1 / -inf
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        num_base = len(self.base_articles)
+
+        # 基底：多取被墓碑占掉的名額
+        dead_base = int(np.searchsorted(self.tombstones, num_base))
+        fetch = min(k + dead_base, num_base)
+        if scope:
+            base_idx, base_scores = top_k_search_ranges(queries, self.base_vectors, fetch, self.partitions.resolve(scope))
+        else:
+            base_idx, base_scores = self.base_index.search(queries, fetch)
+        parts_idx = [np.asarray(base_idx, dtype=np.int64)]
+        parts_scores = [np.asarray(base_scores, dtype=np.float32)]
+
+        # 區段：逐段精確計分（區段通常很小）
+        for segment in self.segments:
+            rows = self.rows_in_scope(segment, scope)
+            if len(rows) == 0:
+                continue
+            idx, scores = top_k_search(queries, segment.vectors[rows], k)
+            parts_idx.append(rows[idx] + segment.offset)
+            parts_scores.append(scores.astype(np.float32))
+
+        indices = np.concatenate(parts_idx, axis=1)
+        scores = np.concatenate(parts_scores, axis=1)
+        dead = (indices < 0) | np.isin(indices, self.tombstones)
+        scores = np.where(dead, -np.inf, scores)
+
+        order = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+        indices = np.take_along_axis(indices, order, axis=1)
+        scores = np.take_along_axis(scores, order, axis=1)
+        return np.where(np.isneginf(scores), -1, indices), scores
+
+
+class LiveLawIndex:
+    """
+    常駐法條索引的線上更新
+
+    Args:
+        articles: 基底法條表（須依 sort_order() 排序）
+        vectors: 基底法條向量
+        index: 基底向量索引（具備 search(queries, k)）
+        index_factory: 壓實時為新基底建立索引的函式
+        compact_ratio: 墓碑 + 區段列數超過基底此比例時觸發背景壓實
+        max_segments: 區段數超過此值時觸發背景壓實
+    """
+
+    def __init__(self, articles: ArticleTable, vectors: np.ndarray, index: Any,
+                 index_factory: Callable[[np.ndarray], Any],
+                 compact_ratio: float = 0.1, max_segments: int = 16,
+                 partitions: Optional[PartitionMap] = None):
+        self.index_factory = index_factory
+        self.compact_ratio = compact_ratio
+        self.max_segments = max_segments
+
+        self._write_lock = threading.Lock()
+        self._compaction: Optional[threading.Thread] = None
+        self._snapshot = self._base_snapshot(0, articles, vectors, index, partitions)
+
+    @staticmethod
+    def _base_snapshot(version: int, articles: ArticleTable, vectors: np.ndarray, index: Any,
+                       partitions: Optional[PartitionMap] = None) -> IndexSnapshot:
+        return IndexSnapshot(
+            version=version,
+            base_vectors=vectors,
+            base_articles=articles,
+            base_index=index,
+            partitions=partitions if partitions is not None else PartitionMap(articles),
+            segments=(),
+            tombstones=np.empty(0, dtype=np.int64),
+        )
+
+    @staticmethod
+    def _row_of_id(snapshot: IndexSnapshot, article_id: str) -> Optional[int]:
+        """法條 ID 對應的有效列；ID 對應多列時無法判斷要更新哪一條"""
+        rows = snapshot.live_ids.get(article_id, [])
+        if len(rows) > 1:
+            raise ValueError(f"法條 ID {article_id} 對應 {len(rows)} 條法條，無法判斷要更新哪一條")
+        return rows[0] if rows else None
+
+    def snapshot(self) -> IndexSnapshot:
+        """目前的快照（讀取為單一參照賦值，不需加鎖）"""
+        return self._snapshot
+
+    def search(self, queries: np.ndarray, k: int, scope: Optional[List[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        return self._snapshot.search(queries, k, scope)
+
+    def upsert(self, articles: List[Dict[str, Any]], vectors: np.ndarray) -> IndexSnapshot:
+        """
+        新增或修正法條：舊版本標記為墓碑，新版本附加為區段
+
+        舊版本以 (法規名稱, 條號, 次號) 對應；ID 已存在時必須屬於同一條文，
+        否則（如不同法規共用的 UNKN-1）拒絕更新，不會取代其他法規的條文
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(articles) != len(vectors):
+            raise ValueError(f"法條數 ({len(articles)}) 與向量數 ({len(vectors)}) 不一致")
+        ids = [str(article['id']) for article in articles]
+        keys = [article_key(article) for article in articles]
+        if len(set(ids)) < len(ids) or len(set(keys)) < len(keys):
+            raise ValueError("同一批更新中有重複的法條 ID 或條文")
+
+        with self._write_lock:
+            current = self._snapshot
+            replaced = []
+            for article_id, key in zip(ids, keys):
+                row = self._row_of_id(current, article_id)
+                if row is not None:
+                    existing = article_key(current.article(row))
+                    if existing != key:
+                        raise ValueError(f"法條 ID {article_id} 已屬於 {existing[0]} 第 {existing[1]} 條，"
+                                         f"不能用於 {key[0]} 第 {key[1]} 條")
+                else:
+                    rows = current.live_keys.get(key, [])
+                    if len(rows) > 1:
+                        raise ValueError(f"{key[0]} 第 {key[1]} 條對應 {len(rows)} 列，無法判斷要更新哪一條")
+                    row = rows[0] if rows else None
+                if row is not None:
+                    replaced.append(row)
+
+            segment = Segment(offset=current.num_rows, vectors=vectors, articles=ArticleTable.from_records(articles))
+            self._publish(current, segments=current.segments + (segment,), dead_rows=replaced)
+            logger.info(f"➕ 線上更新法條: {len(articles)} 條（取代 {len(replaced)} 條）")
+        self.maybe_compact()
+        return self._snapshot
+
+    def remove(self, article_ids: List[str]) -> IndexSnapshot:
+        """刪除法條（標記墓碑）"""
+        with self._write_lock:
+            current = self._snapshot
+            rows = [self._row_of_id(current, str(article_id)) for article_id in article_ids]
+            removed = sorted({row for row in rows if row is not None})
+            self._publish(current, segments=current.segments, dead_rows=removed)
+            logger.info(f"➖ 線上刪除法條: {len(removed)} 條")
+        self.maybe_compact()
+        return self._snapshot
+
+    def _publish(self, current: IndexSnapshot, segments: Tuple[Segment, ...], dead_rows: List[int]) -> None:
+        """以新快照取代目前快照（呼叫端須持有寫入鎖）"""
+        tombstones = np.union1d(current.tombstones, np.asarray(dead_rows, dtype=np.int64))
+        self._snapshot = IndexSnapshot(
+            version=current.version + 1,
+            base_vectors=current.base_vectors,
+            base_articles=current.base_articles,
+            base_index=current.base_index,
+            partitions=current.partitions,
+            segments=segments,
+            tombstones=tombstones,
+        )
+
+    def needs_compaction(self) -> bool:
+        snapshot = self._snapshot
+        pending = len(snapshot.tombstones) + snapshot.segment_rows
+        return (len(snapshot.segments) > self.max_segments
+                or pending > self.compact_ratio * max(len(snapshot.base_articles), 1))
+
+    def maybe_compact(self) -> None:
+        """達到門檻且沒有進行中的壓實時，於背景執行緒壓實"""
+        if not self.needs_compaction():
+            return
+        if self._compaction is not None and self._compaction.is_alive():
+            return
+        self._compaction = threading.Thread(target=self.compact, name="law-index-compaction", daemon=True)
+        self._compaction.start()
+
+    def compact(self) -> IndexSnapshot:
+        """
+        將有效列合併為新的基底並重建索引
+
+        壓實期間持有寫入鎖（更新會等待），查詢仍讀取舊快照
+        """
+        with self._write_lock:
+            current = self._snapshot
+            live = np.setdiff1d(np.arange(current.num_rows), current.tombstones)
+            articles = ArticleTable.concat([current.base_articles] + [s.articles for s in current.segments]).take(live)
+            vectors = np.concatenate([current.base_vectors] + [s.vectors for s in current.segments])[live]
+
+            order = articles.sort_order()
+            articles = articles.take(order)
+            vectors = np.ascontiguousarray(vectors[order], dtype=np.float32)
+
+            index = self.index_factory(vectors)
+            self._snapshot = self._base_snapshot(current.version + 1, articles, vectors, index)
+            logger.info(f"🧹 索引壓實完成: {current.num_rows} 列 → {len(articles)} 列")
+        return self._snapshot
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本機 CPU Embedding 後端
+不需呼叫遠端 API 即可建立法條與查詢向量（離線 / 隔離環境可用，沒有網路延遲）
+- char-tfidf: 字元 n-gram TF-IDF + TruncatedSVD，以法條語料訓練（需 scikit-learn）
+- sentence-transformers: 本機 transformer 模型（選用，需 sentence-transformers 與事先下載的模型）
+
+向量與遠端模型一樣寫入 EmbeddingStore 與查詢快取；
+TF-IDF 模型由語料決定，引擎以語料指紋作為模型鍵，語料變動時重新訓練並使用新的儲存目錄
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .embedding_matcher import EmbeddingMatcher
+from .embedding_store import text_hash
+from .providers import EmbeddingProvider
+
+logger = logging.getLogger(__name__)
+
+LOCAL_BACKENDS = ("char-tfidf", "sentence-transformers")
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+class CharNgramEncoder:
+    """
+    字元 n-gram TF-IDF + SVD 編碼器
+
+    Args:
+        ngram_range: 字元 n-gram 長度範圍（中文條文不需斷詞，1~3 字即可涵蓋多數法律用語）
+        dimensions: SVD 降維後的向量維度
+        max_features: n-gram 詞彙表上限
+        seed: SVD 隨機種子（固定，使同一語料訓練出相同模型）
+    """
+
+    kind = "char-tfidf"
+    needs_fit = True
+
+    def __init__(self, ngram_range: Tuple[int, int] = (1, 3), dimensions: int = 256,
+                 max_features: int = 200000, seed: int = 0):
+        try:
+            import sklearn  # noqa: F401
+        except ImportError as e:
+            raise ImportError("char-tfidf 本機 embedding 需要 scikit-learn: pip install scikit-learn") from e
+
+        self.ngram_range = tuple(ngram_range)
+        self.dimensions = dimensions
+        self.max_features = max_features
+        self.seed = seed
+        self.vectorizer = None
+        self.svd = None
+
+    @property
+    def name(self) -> str:
+        return f"local-char-tfidf-{self.ngram_range[0]}{self.ngram_range[1]}-{self.dimensions}"
+
+    def corpus_fingerprint(self, texts: List[str]) -> str:
+        """模型參數 + 語料文本雜湊的指紋（相同指紋訓練出相同模型）"""
+        digest = hashlib.sha256(f"{self.name}|{self.max_features}|{self.seed}".encode("utf-8"))
+        for text in texts:
+            digest.update(text_hash(text).encode("ascii"))
+        return digest.hexdigest()
+
+    def fit(self, texts: List[str]) -> "CharNgramEncoder":
+        from sklearn.decomposition import TruncatedSVD
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        start_time = time.time()
+        self.vectorizer = TfidfVectorizer(
+            analyzer="char", ngram_range=self.ngram_range, max_features=self.max_features,
+            sublinear_tf=True, dtype=np.float32
+        )
+        matrix = self.vectorizer.fit_transform(texts)
+
+        # 降維後的維度不得超過語料筆數與詞彙數
+        components = max(1, min(self.dimensions, matrix.shape[0] - 1, matrix.shape[1] - 1))
+        self.svd = TruncatedSVD(n_components=components, random_state=self.seed)
+        self.svd.fit(matrix)
+
+        logger.info(f"🔧 訓練字元 n-gram TF-IDF: {len(texts)} 條, 詞彙 {matrix.shape[1]}, "
+                    f"{components} 維, {time.time() - start_time:.1f} 秒")
+        return self
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        if self.svd is None:
+            raise ValueError("char-tfidf 編碼器尚未訓練")
+        return _normalize_rows(self.svd.transform(self.vectorizer.transform(texts)))
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"vectorizer": self.vectorizer, "svd": self.svd}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def load(self, path: Path) -> bool:
+        """載入已訓練的模型（只讀取本機 embedding 儲存中由 save 寫入的檔案）"""
+        if not path.exists():
+            return False
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        self.vectorizer = state["vectorizer"]
+        self.svd = state["svd"]
+        return True
+
+
+class SentenceTransformerEncoder:
+    """
+    本機 transformer 編碼器（sentence-transformers）
+
+    Args:
+        model_name: 模型名稱或本機路徑（隔離環境請指定事先下載的目錄）
+        batch_size: 每批編碼筆數
+        device: 執行裝置
+    """
+
+    kind = "sentence-transformers"
+    needs_fit = False
+
+    def __init__(self, model_name: str = "paraphrase-multilingual-MiniLM-L12-v2",
+                 batch_size: int = 64, device: str = "cpu"):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError("本機 transformer embedding 需要 sentence-transformers: "
+                              "pip install sentence-transformers") from e
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.model = SentenceTransformer(model_name, device=device)
+
+    @property
+    def name(self) -> str:
+        return f"local-st-{Path(self.model_name).name}"
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = self.model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True,
+                                    normalize_embeddings=True, show_progress_bar=False)
+        return np.asarray(vectors, dtype=np.float32)
+
+
+def create_encoder(backend: str, model_name: Optional[str] = None, dimensions: int = 256,
+                   **params: Any):
+    """依後端名稱建立本機編碼器"""
+    if backend == "char-tfidf":
+        return CharNgramEncoder(dimensions=dimensions, **params)
+    if backend == "sentence-transformers":
+        return SentenceTransformerEncoder(model_name, **params) if model_name else SentenceTransformerEncoder(**params)
+    raise ValueError(f"未知的本機 embedding 後端: {backend}（可用: {', '.join(LOCAL_BACKENDS)}）")
+
+
+class LocalProvider(EmbeddingProvider):
+    """本機編碼器提供者（不連網，不需檢查點與重試）"""
+
+    remote = False
+
+    # 本機編碼沒有請求大小限制，只依筆數分塊以控制記憶體
+    max_batch_items = 1024
+    max_batch_tokens = 10 ** 12
+    max_input_tokens = 10 ** 12
+
+    def __init__(self, encoder):
+        super().__init__(encoder.name, None)
+        self.encoder = encoder
+        self.kind = encoder.kind
+        self.needs_fit = encoder.needs_fit
+
+    @property
+    def name(self) -> str:
+        return self.encoder.name
+
+    def embed_batch(self, texts: List[str], query: bool = False) -> np.ndarray:
+        return self.encoder.encode(texts)
+
+    def corpus_fingerprint(self, texts: List[str]) -> str:
+        return self.encoder.corpus_fingerprint(texts)
+
+    def fit(self, texts: List[str]) -> None:
+        self.encoder.fit(texts)
+
+    def save(self, path: Path) -> None:
+        self.encoder.save(path)
+
+    def load(self, path: Path) -> bool:
+        return self.encoder.load(path)
+
+
+class LocalEmbeddingMatcher(EmbeddingMatcher):
+    """
+    以本機 CPU 模型計算 embedding 的匹配器（EmbeddingMatcher + LocalProvider）
+
+    Args:
+        backend: char-tfidf / sentence-transformers
+        model_name: sentence-transformers 模型名稱或路徑
+        dimensions: char-tfidf 的 SVD 維度
+        encoder_params: 傳給編碼器的其他參數
+        其餘參數同 EmbeddingMatcher
+    """
+
+    def __init__(self, backend: str = "char-tfidf", model_name: Optional[str] = None,
+                 dimensions: int = 256, store_dir: Optional[str] = None, index_type: str = "flat",
+                 index_params: Optional[Dict[str, Any]] = None,
+                 subject_routes: Optional[Dict[str, List[str]]] = None,
+                 query_cache_path: Optional[str] = None,
+                 encoder_params: Optional[Dict[str, Any]] = None):
+        super().__init__(
+            provider=LocalProvider(create_encoder(backend, model_name, dimensions, **(encoder_params or {}))),
+            store_dir=store_dir,
+            index_type=index_type,
+            index_params=index_params,
+            subject_routes=subject_routes,
+            query_cache_path=query_cache_path
+        )
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+精簡的匹配結果
+- 匹配 API 回傳 (列號, 分數) 陣列，法條欄位在實際讀取時才從法條表取出
+- 結果檔每個法條只寫一次（articles 表），各題目 / 選項以 {id, similarity, score_type} 引用
+- 每個命中標示分數類型（score_type），不同類型的 similarity 不在同一尺度，不應直接比較
+"""
+
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+
+# 結果檔格式標記（metadata.result_format）
+ARTICLE_REFS_FORMAT = "article-refs-v1"
+
+# 分數類型（similarity 欄位的尺度）
+# - cosine: 查詢向量與法條向量的餘弦相似度
+# - hybrid: dense 與 BM25 的融合分數（dense_weight × 餘弦 + (1 - dense_weight) × BM25 正規化分數）
+# - bm25: BM25 以查詢上界正規化的分數（0~1）
+# - citation: 查詢明確引用的條文，未計算相似度，固定為 CITATION_SCORE
+SCORE_COSINE = "cosine"
+SCORE_HYBRID = "hybrid"
+SCORE_BM25 = "bm25"
+SCORE_CITATION = "citation"
+CITATION_SCORE = 1.0
+
+
+class LazyArticles(Sequence):
+    """
+    top-k 命中的延遲載入清單
+
+    行為與 List[Dict] 相同（索引 / 迭代時才還原 dict），另提供 rows / scores / ids 精簡存取
+
+    Args:
+        resolver: 具備 article(row) 與 article_id(row) 的法條來源（索引快照）
+        rows: 命中的列號
+        scores: 對應的相似度
+        score_types: 分數類型（全部相同時傳入單一字串，否則為與 rows 同序的序列）
+        cited: 是否為查詢明確引用而排在最前的條文（None 為皆否）
+    """
+
+    def __init__(self, resolver: Any, rows: np.ndarray, scores: np.ndarray,
+                 score_types: Union[str, Sequence[str]] = SCORE_COSINE, cited: Optional[np.ndarray] = None):
+        self.resolver = resolver
+        self.rows = rows
+        self.scores = scores
+        if isinstance(score_types, str):
+            self.score_types = np.full(len(rows), score_types, dtype=object)
+        else:
+            self.score_types = np.asarray(score_types, dtype=object)
+        self.cited = np.zeros(len(rows), dtype=bool) if cited is None else np.asarray(cited, dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        article = self.resolver.article(int(self.rows[i]))
+        article['similarity'] = float(self.scores[i])
+        article['score_type'] = self.score_types[i]
+        return article
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return (self[i] for i in range(len(self)))
+
+    @property
+    def ids(self) -> List[str]:
+        return [self.resolver.article_id(int(row)) for row in self.rows]
+
+    def take(self, indices: Union[slice, np.ndarray]) -> "LazyArticles":
+        """依位置截斷 / 重排（分數、分數類型與引用標記隨法條移動）"""
+        return LazyArticles(self.resolver, self.rows[indices], self.scores[indices],
+                            self.score_types[indices], self.cited[indices])
+
+
+class ArticleRefWriter:
+    """收集結果檔的 articles 表，並將命中清單轉為引用"""
+
+    def __init__(self):
+        self.articles: Dict[str, Dict[str, Any]] = {}
+
+    def refs(self, matched_articles: Union[LazyArticles, Sequence[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """登記命中的法條（每個法條只還原一次），返回 [{id, similarity, score_type}, ...]"""
+        if isinstance(matched_articles, LazyArticles):
+            refs = []
+            for i, (article_id, score) in enumerate(zip(matched_articles.ids, matched_articles.scores)):
+                if article_id not in self.articles:
+                    article = matched_articles.resolver.article(int(matched_articles.rows[i]))
+                    self.articles[article_id] = article
+                refs.append({"id": article_id, "similarity": float(score),
+                             "score_type": matched_articles.score_types[i]})
+            return refs
+
+        refs = []
+        for article in matched_articles:
+            article_id = article['id']
+            if article_id not in self.articles:
+                self.articles[article_id] = {key: value for key, value in article.items()
+                                             if key not in ('similarity', 'score_type')}
+            refs.append({"id": article_id, "similarity": article.get('similarity', 0.0),
+                         "score_type": article.get('score_type', SCORE_COSINE)})
+        return refs
+
+
+def expand_article_refs(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    將引用格式的結果檔還原為每個命中都帶完整法條欄位的舊格式（就地修改）
+
+    舊格式的檔案（沒有 articles 表）原樣返回
+    """
+    articles = data.get("articles")
+    if not isinstance(articles, dict):
+        return data
+    del data["articles"]
+
+    def expand(refs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [{**articles.get(ref["id"], {"id": ref["id"]}), "similarity": ref.get("similarity", 0.0),
+                 "score_type": ref.get("score_type", SCORE_COSINE)} for ref in refs]
+
+    for question in data.get("question_matches", []):
+        if "matched_articles" in question:
+            question["matched_articles"] = expand(question["matched_articles"])
+        for option in question.get("options", []):
+            option["matched_articles"] = expand(option.get("matched_articles", []))
+    for option in data.get("option_matches", []):
+        option["matched_articles"] = expand(option.get("matched_articles", []))
+    return data
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Embedding 提供者
+匹配引擎（EmbeddingMatcher）只透過提供者取得向量；批次打包、檢查點、快取、索引與排序都由引擎負責
+- openai: OpenAI Embeddings API
+- gemini: Google Gemini API（見 gemini_embedding_matcher.py）
+- char-tfidf / sentence-transformers: 本機 CPU 模型（見 local_embedding.py）
+- fake: 以文本雜湊為種子的決定性向量，可設定延遲，用於不連網的測試與效能量測
+"""
+
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from openai import OpenAI
+
+from .async_builder import RETRYABLE_ERRORS
+from .batching import get_token_counter
+
+PROVIDERS = ("openai", "gemini", "char-tfidf", "sentence-transformers", "fake")
+
+
+class EmbeddingProvider:
+    """
+    提供者介面：子類別實作 embed_batch（單次請求），並設定請求大小上限
+
+    Attributes:
+        kind: 提供者類型
+        remote: 是否為遠端 API（建立語料時使用批次檢查點與退避重試）
+        needs_fit: 是否需要以法條語料訓練（見 local_embedding.LocalProvider）
+        retryable_errors: 視為暫時性、需要退避重試的錯誤
+    """
+
+    kind = "base"
+    remote = True
+    needs_fit = False
+    retryable_errors: Tuple[type, ...] = ()
+
+    # 單次請求上限
+    max_batch_items = 2048
+    max_batch_tokens = 300000
+    max_input_tokens = 8191
+
+    def __init__(self, model: str, dimensions: Optional[int] = None):
+        self.model = model
+        self.dimensions = dimensions
+        self.count_tokens = get_token_counter(model)
+
+    @property
+    def name(self) -> str:
+        """模型名稱（embedding 儲存、查詢快取與索引包以此區分向量空間）"""
+        return self.model
+
+    def embed_batch(self, texts: List[str], query: bool = False) -> List[List[float]]:
+        """
+        送出單一批次請求
+
+        Args:
+            texts: 不超過請求上限的文本
+            query: True 為查詢（題目 / 選項），False 為文件（法條）
+
+        Returns:
+            與 texts 同序的向量
+        """
+        raise NotImplementedError
+
+    def after_fork(self) -> None:
+        """在 fork 出的子行程中重建不可跨行程共用的連線"""
+
+
+class OpenAIProvider(EmbeddingProvider):
+    """OpenAI Embeddings API（text-embedding-3 系列可要求縮短的向量）"""
+
+    kind = "openai"
+    retryable_errors = RETRYABLE_ERRORS
+
+    def __init__(self, api_key: Optional[str], model: str = "text-embedding-3-large",
+                 dimensions: Optional[int] = None):
+        super().__init__(model, dimensions)
+        self.client = OpenAI(api_key=api_key)
+
+    def embed_batch(self, texts: List[str], query: bool = False) -> List[List[float]]:
+        kwargs = {"dimensions": self.dimensions} if self.dimensions else {}
+        response = self.client.embeddings.create(input=texts, model=self.model, **kwargs)
+        return [data.embedding for data in response.data]
+
+    def after_fork(self) -> None:
+        self.client = OpenAI(api_key=self.client.api_key)
+
+
+class FakeProvider(EmbeddingProvider):
+    """
+    決定性的假提供者：向量只由 (seed, 文本) 決定，不連網
+
+    Args:
+        dimensions: 向量維度
+        latency: 每次請求的固定延遲（秒），模擬網路往返
+        per_item_latency: 每筆文本額外的延遲（秒）
+        model: 模型名稱（不同名稱的向量不會共用儲存與快取）
+        seed: 向量種子
+        max_batch_items / max_batch_tokens / max_input_tokens: 模擬的請求上限
+    """
+
+    kind = "fake"
+
+    def __init__(self, dimensions: int = 64, latency: float = 0.0, per_item_latency: float = 0.0,
+                 model: str = "fake-embedding", seed: int = 0, max_batch_items: int = 2048,
+                 max_batch_tokens: int = 300000, max_input_tokens: int = 8191):
+        super().__init__(model, dimensions)
+        self.latency = latency
+        self.per_item_latency = per_item_latency
+        self.seed = seed
+        self.max_batch_items = max_batch_items
+        self.max_batch_tokens = max_batch_tokens
+        self.max_input_tokens = max_input_tokens
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.items = 0
+
+    def vector(self, text: str) -> np.ndarray:
+        """單一文本的決定性單位向量"""
+        digest = hashlib.blake2b(f"{self.seed}|{text}".encode("utf-8"), digest_size=8).digest()
+        vector = np.random.default_rng(int.from_bytes(digest, "little")).standard_normal(self.dimensions)
+        return (vector / np.linalg.norm(vector)).astype(np.float32)
+
+    def embed_batch(self, texts: List[str], query: bool = False) -> List[List[float]]:
+        delay = self.latency + self.per_item_latency * len(texts)
+        if delay > 0:
+            time.sleep(delay)
+        with self._lock:
+            self.requests += 1
+            self.items += len(texts)
+        return [self.vector(text) for text in texts]
+
+    def stats(self) -> Dict[str, int]:
+        """累計請求數與文本數（量測批次與快取的效果）"""
+        with self._lock:
+            return {"requests": self.requests, "items": self.items}
+
+
+def create_provider(backend: str, model: Optional[str] = None, dimensions: Optional[int] = None,
+                    api_key: Optional[str] = None, **params: Any) -> EmbeddingProvider:
+    """
+    依名稱建立提供者
+
+    Args:
+        backend: openai / gemini / char-tfidf / sentence-transformers / fake
+        model: 模型名稱（None 為各提供者預設）
+        dimensions: 向量維度（openai 為縮短維度；char-tfidf 為 SVD 維度；fake 為向量維度）
+        api_key: 遠端 API Key
+        params: 其他提供者參數
+    """
+    if backend == "openai":
+        return OpenAIProvider(api_key, model or "text-embedding-3-large", dimensions)
+
+    if backend == "gemini":
+        from .gemini_embedding_matcher import GeminiProvider
+        return GeminiProvider(api_key, model or "models/embedding-001")
+
+    if backend in ("char-tfidf", "sentence-transformers"):
+        from .local_embedding import LocalProvider, create_encoder
+        return LocalProvider(create_encoder(backend, model, dimensions or 256, **params))
+
+    if backend == "fake":
+        return FakeProvider(dimensions=dimensions or 64, model=model or "fake-embedding", **params)
+
+    raise ValueError(f"未知的 embedding 提供者: {backend}（可用: {', '.join(PROVIDERS)}）")
+
+
+def _env_int(name: str) -> Optional[int]:
+    return int(os.getenv(name, "0") or 0) or None
+
+
+def provider_from_env(backend: Optional[str] = None, model: Optional[str] = None,
+                      dimensions: Optional[int] = None, api_key: Optional[str] = None) -> EmbeddingProvider:
+    """
+    依環境變數建立提供者（命令列與服務共用；參數優先於環境變數）
+
+    Args:
+        backend: 提供者名稱（None 讀取 EMBEDDING_BACKEND，預設 openai）
+        model: 模型名稱（None 依提供者讀取 EMBEDDING_MODEL / GEMINI_EMBEDDING_MODEL / LOCAL_EMBEDDING_MODEL）
+        dimensions: 向量維度（None 讀取 EMBEDDING_DIMENSIONS；本機提供者為 LOCAL_EMBEDDING_DIMENSIONS）
+        api_key: 遠端 API Key（None 讀取 OPENAI_API_KEY / GEMINI_API_KEY）
+
+    Raises:
+        ValueError: 未知的提供者，或遠端提供者沒有 API Key
+    """
+    backend = backend or os.getenv("EMBEDDING_BACKEND", "openai")
+    if backend == "openai":
+        api_key = api_key or os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("openai 提供者需要 OPENAI_API_KEY")
+        return create_provider(backend, model or os.getenv("EMBEDDING_MODEL"),
+                               dimensions or _env_int("EMBEDDING_DIMENSIONS"), api_key=api_key)
+
+    if backend == "gemini":
+        api_key = api_key or os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("gemini 提供者需要 GEMINI_API_KEY")
+        return create_provider(backend, model or os.getenv("GEMINI_EMBEDDING_MODEL"), api_key=api_key)
+
+    if backend == "fake":
+        return create_provider(backend, model, dimensions or _env_int("EMBEDDING_DIMENSIONS"),
+                               latency=float(os.getenv("FAKE_EMBEDDING_LATENCY", "0")))
+
+    return create_provider(backend, model or os.getenv("LOCAL_EMBEDDING_MODEL") or None,
+                           dimensions or _env_int("LOCAL_EMBEDDING_DIMENSIONS"))
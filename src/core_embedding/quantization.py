@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+量化法條向量
+- float16: 記憶體減半
+- int8:    每維度獨立縮放，記憶體約 1/4
+第一階段以量化矩陣計分取候選，最終候選以 float32 原始向量（memmap）重新計分
+"""
+
+import json
+import logging
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+import numpy as np
+
+from .scoring import top_k_search
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_MODES = ("float16", "int8")
+
+
+def quantize(vectors: np.ndarray, mode: str, block_size: int = 16384) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    量化向量矩陣
+
+    Args:
+        vectors: (N, D) 原始向量（可為 memmap）
+        mode: float16 或 int8
+        block_size: 分塊處理的列數，避免一次載入整個矩陣
+
+    Returns:
+        (codes, scale)：int8 時 codes × scale 還原向量；float16 時 scale 全為 1
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"不支援的量化模式: {mode}（可用: {', '.join(QUANTIZATION_MODES)}）")
+
+    num_rows, dim = vectors.shape
+    if mode == "float16":
+        codes = np.empty((num_rows, dim), dtype=np.float16)
+        for start in range(0, num_rows, block_size):
+            codes[start:start + block_size] = vectors[start:start + block_size]
+        return codes, np.ones(dim, dtype=np.float32)
+
+    # int8：每維度以最大絕對值縮放到 [-127, 127]
+    max_abs = np.zeros(dim, dtype=np.float32)
+    for start in range(0, num_rows, block_size):
+        np.maximum(max_abs, np.abs(vectors[start:start + block_size]).max(axis=0), out=max_abs)
+    scale = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+
+    codes = np.empty((num_rows, dim), dtype=np.int8)
+    for start in range(0, num_rows, block_size):
+        block = np.asarray(vectors[start:start + block_size], dtype=np.float32)
+        codes[start:start + block_size] = np.clip(np.rint(block / scale), -127, 127)
+    return codes, scale
+
+
+class QuantizedIndex:
+    """
+    量化向量索引
+
+    Args:
+        vectors: (N, D) float32 原始向量（建議為 memmap，僅重新計分時讀取）
+        mode: float16 或 int8
+        rerank_factor: 第一階段取 k × rerank_factor 個候選
+    """
+
+    def __init__(self, vectors: np.ndarray, mode: str = "int8", rerank_factor: int = 4):
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"不支援的量化模式: {mode}（可用: {', '.join(QUANTIZATION_MODES)}）")
+        self.vectors = vectors
+        self.mode = mode
+        self.kind = mode
+        self.rerank_factor = rerank_factor
+        self.codes: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+
+    @property
+    def nbytes(self) -> int:
+        """常駐記憶體（量化矩陣 + 縮放係數）"""
+        return int(self.codes.nbytes + self.scale.nbytes)
+
+    def train(self) -> "QuantizedIndex":
+        self.codes, self.scale = quantize(self.vectors, self.mode)
+        full_bytes = self.vectors.shape[0] * self.vectors.shape[1] * 4
+        logger.info(f"🔧 {self.mode} 量化完成: {full_bytes / 1e6:.1f} MB → {self.nbytes / 1e6:.1f} MB")
+        return self
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        k = min(k, len(self.vectors))
+
+        # 第一階段：量化矩陣計分（int8 的縮放併入查詢向量）
+        candidates, _ = top_k_search(queries * self.scale, self.codes, k * self.rerank_factor)
+
+        # 第二階段：float32 重新計分
+        indices = np.empty((len(queries), k), dtype=np.int64)
+        scores = np.empty((len(queries), k), dtype=np.float32)
+        for i, rows in enumerate(candidates):
+            rows = np.sort(rows)
+            local_idx, local_scores = top_k_search(queries[i:i + 1], self.vectors[rows], k)
+            indices[i] = rows[local_idx[0]]
+            scores[i] = local_scores[0]
+        return indices, scores
+
+    def save(self, path: Path, fingerprint: str) -> None:
+        params = {"mode": self.mode, "fingerprint": fingerprint}
+        with open(path, 'wb') as f:
+            np.savez(f, codes=self.codes, scale=self.scale, params=json.dumps(params))
+
+    @classmethod
+    def load(cls, path: Path, vectors: np.ndarray, fingerprint: str, **params: Any) -> Optional["QuantizedIndex"]:
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            saved = json.loads(str(data["params"]))
+            if saved["fingerprint"] != fingerprint or saved["mode"] != params.get("mode", saved["mode"]):
+                return None
+            index = cls(vectors, **params)
+            index.codes = data["codes"]
+            index.scale = data["scale"]
+        return index
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+查詢 Embedding 快取
+記憶體 LRU + SQLite 磁碟儲存，以 (模型, 正規化文本雜湊) 為鍵
+重新處理同一份考卷（或跨年度重複的題目 / 選項）時不需再呼叫 embedding API
+
+SQLite 連線不可跨 fork 共用：連線在第一次使用時才開啟，並記錄開啟的行程，
+fork 出的子行程會自行重新連線（多個行程以 WAL 模式共用同一個檔案）
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .embedding_store import text_hash
+
+logger = logging.getLogger(__name__)
+
+
+class QueryEmbeddingCache:
+    """
+    兩層查詢 embedding 快取
+
+    Args:
+        db_path: SQLite 檔案路徑（None 則只使用記憶體）
+        model_key: 模型鍵（模型名稱 + 維度），不同模型的向量互不混用
+        max_memory_items: 記憶體 LRU 上限
+        max_disk_items: 磁碟筆數上限，超過時淘汰最久未使用者
+        busy_timeout: 其他行程寫入中時等待鎖的秒數
+    """
+
+    def __init__(self, db_path: Optional[str], model_key: str,
+                 max_memory_items: int = 10000, max_disk_items: int = 200000,
+                 busy_timeout: float = 30.0):
+        self.db_path = db_path
+        self.model_key = model_key
+        self.max_memory_items = max_memory_items
+        self.max_disk_items = max_disk_items
+        self.busy_timeout = busy_timeout
+
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid: Optional[int] = None
+        if db_path:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def _db(self) -> Optional[sqlite3.Connection]:
+        """目前行程的 SQLite 連線（第一次使用或 fork 後才開啟）"""
+        if self.db_path is None:
+            return None
+        if self._conn is not None and self._conn_pid == os.getpid():
+            return self._conn
+
+        # 繼承自父行程的連線不可使用也不可關閉，直接捨棄
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS query_embeddings ("
+            "model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+            "last_used REAL NOT NULL, PRIMARY KEY (model, text_hash))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON query_embeddings (last_used)")
+        conn.commit()
+        self._conn, self._conn_pid = conn, os.getpid()
+        return conn
+
+    def close(self) -> None:
+        """關閉目前行程的連線（fork 前呼叫，之後使用時會重新開啟）"""
+        if self._conn is not None and self._conn_pid == os.getpid():
+            self._conn.close()
+        self._conn, self._conn_pid = None, None
+
+    def after_fork(self) -> None:
+        """在 fork 出的子行程中呼叫：重建鎖並歸零統計（記憶體 LRU 以寫時複製沿用）"""
+        self._lock = threading.Lock()
+        self._stats = {key: 0 for key in self._stats}
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        """放入記憶體 LRU，超過上限時淘汰最舊的項目"""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """批次查詢，未命中的位置為 None"""
+        keys = [text_hash(text) for text in texts]
+        found: Dict[str, np.ndarray] = {}
+
+        with self._lock:
+            for key in keys:
+                if key in self._memory and key not in found:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+            memory_found = set(found)
+
+            pending = list({key for key in keys if key not in found})
+            if pending and self._db is not None:
+                for start in range(0, len(pending), 500):
+                    chunk = pending[start:start + 500]
+                    rows = self._db.execute(
+                        f"SELECT text_hash, vector FROM query_embeddings "
+                        f"WHERE model = ? AND text_hash IN ({','.join('?' * len(chunk))})",
+                        [self.model_key, *chunk]
+                    ).fetchall()
+                    for key, blob in rows:
+                        found[key] = np.frombuffer(blob, dtype=np.float32)
+                        self._remember(key, found[key])
+
+                disk_found = [key for key in found if key not in memory_found]
+                if disk_found:
+                    now = time.time()
+                    self._db.executemany(
+                        "UPDATE query_embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                        [(now, self.model_key, key) for key in disk_found]
+                    )
+                    self._db.commit()
+
+            for key in keys:
+                if key in memory_found:
+                    self._stats["memory_hits"] += 1
+                elif key in found:
+                    self._stats["disk_hits"] += 1
+                else:
+                    self._stats["misses"] += 1
+
+        return [found.get(key) for key in keys]
+
+    def put_many(self, texts: List[str], vectors: np.ndarray) -> None:
+        """寫入新取得的查詢 embeddings"""
+        keys = [text_hash(text) for text in texts]
+        vectors = np.asarray(vectors, dtype=np.float32)
+
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._remember(key, vector.copy())
+
+            if self._db is None:
+                return
+
+            now = time.time()
+            self._db.executemany(
+                "INSERT OR REPLACE INTO query_embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                [(self.model_key, key, vector.tobytes(), now) for key, vector in zip(keys, vectors)]
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self) -> None:
+        """磁碟筆數超過上限時，淘汰最久未使用的項目"""
+        (count,) = self._db.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()
+        overflow = count - self.max_disk_items
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM query_embeddings WHERE rowid IN "
+                "(SELECT rowid FROM query_embeddings ORDER BY last_used LIMIT ?)",
+                (overflow,)
+            )
+            self._stats["evictions"] += overflow
+
+    def stats(self) -> Dict[str, float]:
+        """累計命中統計"""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hits"] = stats["memory_hits"] + stats["disk_hits"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+def stats_delta(before: Dict[str, float], after: Dict[str, float]) -> Dict[str, float]:
+    """兩次 stats() 快照之間的命中統計（用於單一考卷）"""
+    delta = {key: after[key] - before.get(key, 0) for key in ("memory_hits", "disk_hits", "misses", "evictions")}
+    lookups = delta["memory_hits"] + delta["disk_hits"] + delta["misses"]
+    delta["hits"] = delta["memory_hits"] + delta["disk_hits"]
+    delta["hit_rate"] = delta["hits"] / lookups if lookups else 0.0
+    return delta
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+低分差匹配的 LLM 重排
+前兩名相似度接近（分差低於門檻）的選項才送 LLM 重排，LLM 成本隨模糊的選項數而非總選項數增加：
+- 多個模糊選項合併成一次請求（每批 batch_size 個）
+- 結果以 (查詢文本雜湊, 候選法條 ID) 為鍵快取（記憶體 + SQLite），重跑同一份考卷不再呼叫 LLM
+- LLM 失敗或回傳無法解析時保留原排序
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .embedding_store import text_hash
+from .match_results import LazyArticles
+
+logger = logging.getLogger(__name__)
+
+RERANK_PROMPT = """你是法律條文比對助手。以下每一項包含一個考題選項與數個候選法條，
+請依候選法條與該選項的相關程度由高到低排序。
+只輸出 JSON，格式為 {{"rankings": [{{"item": 項目編號, "order": [候選編號, ...]}}, ...]}}
+
+{items}"""
+
+
+class LLMReranker:
+    """
+    低分差匹配的批次 LLM 重排
+
+    Args:
+        api_key: OpenAI API Key（指定 complete 時不使用）
+        model: 重排使用的對話模型
+        margin: 第一名與第二名的相似度差低於此值時視為模糊、送交重排
+        candidates: 送交重排的候選數（匹配時至少取這麼多名）
+        batch_size: 每次請求合併的模糊選項數
+        cache_path: SQLite 快取路徑（None 則只使用記憶體）
+        max_article_chars: 候選條文送入提示詞的最大字數
+        complete: 自訂的 LLM 呼叫（提示詞 -> 回應文本），預設為 OpenAI chat completions
+    """
+
+    def __init__(self, api_key: Optional[str] = None, model: str = "gpt-4o-mini", margin: float = 0.02,
+                 candidates: int = 5, batch_size: int = 8, cache_path: Optional[str] = None,
+                 max_article_chars: int = 300, complete: Optional[Callable[[str], str]] = None):
+        self.api_key = api_key
+        self.model = model
+        self.margin = margin
+        self.candidates = candidates
+        self.batch_size = batch_size
+        self.cache_path = cache_path
+        self.max_article_chars = max_article_chars
+        self.complete = complete or self._openai_complete
+        self._client = None
+
+        self._memory: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+        self._stats = {"ambiguous": 0, "reranked": 0, "cache_hits": 0, "llm_requests": 0, "failed": 0}
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid: Optional[int] = None
+        if cache_path:
+            Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+
+    def _openai_complete(self, prompt: str) -> str:
+        """以 OpenAI chat completions（JSON 模式）呼叫 LLM"""
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=self.api_key)
+        response = self._client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0,
+            response_format={"type": "json_object"}
+        )
+        return response.choices[0].message.content
+
+    @property
+    def _db(self) -> Optional[sqlite3.Connection]:
+        """目前行程的 SQLite 連線（第一次使用或 fork 後才開啟）"""
+        if self.cache_path is None:
+            return None
+        if self._conn is not None and self._conn_pid == os.getpid():
+            return self._conn
+
+        conn = sqlite3.connect(self.cache_path, timeout=30.0, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rerank_cache ("
+            "cache_key TEXT PRIMARY KEY, ranked_ids TEXT NOT NULL)"
+        )
+        conn.commit()
+        self._conn, self._conn_pid = conn, os.getpid()
+        return conn
+
+    def close(self) -> None:
+        """關閉目前行程的連線（fork 前呼叫，之後使用時會重新開啟）"""
+        if self._conn is not None and self._conn_pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+        self._conn_pid = None
+
+    def after_fork(self) -> None:
+        """在 fork 出的子行程中捨棄繼承的 HTTP 連線與 SQLite 連線"""
+        self._client = None
+        self._conn = None
+        self._conn_pid = None
+
+    def cache_key(self, text: str, candidate_ids: List[str]) -> str:
+        """快取鍵：模型 + 查詢文本雜湊 + 候選法條 ID（候選不同即重新排序）"""
+        raw = f"{self.model}|{text_hash(text)}|{','.join(candidate_ids)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _cache_get(self, key: str) -> Optional[List[str]]:
+        with self._lock:
+            if key in self._memory:
+                return self._memory[key]
+            db = self._db
+            row = db.execute("SELECT ranked_ids FROM rerank_cache WHERE cache_key = ?", (key,)).fetchone() if db else None
+            if row is None:
+                return None
+            ranked_ids = json.loads(row[0])
+            self._memory[key] = ranked_ids
+            return ranked_ids
+
+    def _cache_put(self, entries: Dict[str, List[str]]) -> None:
+        with self._lock:
+            self._memory.update(entries)
+            db = self._db
+            if db is not None and entries:
+                db.executemany(
+                    "INSERT OR REPLACE INTO rerank_cache (cache_key, ranked_ids) VALUES (?, ?)",
+                    [(key, json.dumps(ids)) for key, ids in entries.items()]
+                )
+                db.commit()
+
+    def is_ambiguous(self, matched: LazyArticles) -> bool:
+        """前兩名的相似度差低於門檻（第一名為明確引用的條文時不重排）"""
+        if len(matched.scores) < 2 or matched.cited[0]:
+            return False
+        return float(matched.scores[0] - matched.scores[1]) < self.margin
+
+    def _prompt(self, batch: List[Tuple[str, LazyArticles]]) -> str:
+        """組合一批模糊選項的重排提示詞"""
+        items = []
+        for item, (text, matched) in enumerate(batch):
+            lines = [f"[項目 {item}]", text, "候選法條："]
+            for candidate, article in enumerate(matched):
+                content = article['content'][:self.max_article_chars]
+                lines.append(f"({candidate}) {article['law_name']} 第{article['article_no_main']}條：{content}")
+            items.append("\n".join(lines))
+        return RERANK_PROMPT.format(items="\n\n".join(items))
+
+    @staticmethod
+    def _parse(response: str, batch_size: int, num_candidates: List[int]) -> Dict[int, List[int]]:
+        """解析 LLM 回應：每個項目的候選順序（略過無效編號，漏列的候選依原順序補在後面）"""
+        orders = {}
+        for ranking in json.loads(response).get("rankings", []):
+            item = ranking.get("item")
+            if not isinstance(item, int) or not 0 <= item < batch_size:
+                continue
+            seen = []
+            for candidate in ranking.get("order", []):
+                if isinstance(candidate, int) and 0 <= candidate < num_candidates[item] and candidate not in seen:
+                    seen.append(candidate)
+            orders[item] = seen + [c for c in range(num_candidates[item]) if c not in seen]
+        return orders
+
+    def rerank(self, texts: List[str], ranked: List[LazyArticles]) -> Tuple[List[LazyArticles], List[bool]]:
+        """
+        重排模糊的匹配
+
+        Args:
+            texts: 查詢文本（與 ranked 同序）
+            ranked: 匹配結果（只重排前 candidates 名）
+
+        Returns:
+            (重排後的匹配結果, 是否經過重排)；相似度隨法條一起移動，重排後不一定遞減
+        """
+        results = list(ranked)
+        reranked = [False] * len(ranked)
+        heads: Dict[int, LazyArticles] = {}
+        pending: List[Tuple[int, str]] = []  # (位置, 快取鍵)
+
+        for i, (text, matched) in enumerate(zip(texts, ranked)):
+            if not self.is_ambiguous(matched):
+                continue
+            candidates = heads[i] = matched.take(slice(0, self.candidates))
+            key = self.cache_key(text, candidates.ids)
+            cached = self._cache_get(key)
+            with self._lock:
+                self._stats["ambiguous"] += 1
+                if cached is not None:
+                    self._stats["cache_hits"] += 1
+            if cached is None:
+                pending.append((i, key))
+            else:
+                results[i] = self._reorder(matched, cached)
+                reranked[i] = True
+
+        # 未快取的模糊選項分批送出
+        for start in range(0, len(pending), self.batch_size):
+            batch = pending[start:start + self.batch_size]
+            try:
+                response = self.complete(self._prompt([(texts[i], heads[i]) for i, _ in batch]))
+                orders = self._parse(response, len(batch), [len(heads[i]) for i, _ in batch])
+            except Exception as e:
+                logger.warning(f"⚠️ LLM 重排失敗，保留原排序（{len(batch)} 個選項）: {e}")
+                with self._lock:
+                    self._stats["llm_requests"] += 1
+                    self._stats["failed"] += len(batch)
+                continue
+
+            entries = {}
+            for item, (i, key) in enumerate(batch):
+                if item not in orders:
+                    continue
+                ranked_ids = [heads[i].ids[c] for c in orders[item]]
+                entries[key] = ranked_ids
+                results[i] = self._reorder(results[i], ranked_ids)
+                reranked[i] = True
+            self._cache_put(entries)
+            with self._lock:
+                self._stats["llm_requests"] += 1
+                self._stats["failed"] += len(batch) - len(entries)
+
+        with self._lock:
+            self._stats["reranked"] += sum(reranked)
+        return results, reranked
+
+    @staticmethod
+    def _reorder(matched: LazyArticles, ranked_ids: List[str]) -> LazyArticles:
+        """前段依法條 ID 順序重排，其餘名次不變（相似度隨法條移動）"""
+        position = {article_id: j for j, article_id in enumerate(matched.ids)}
+        head = [position[article_id] for article_id in ranked_ids if article_id in position]
+        order = np.array(head + [j for j in range(len(matched.ids)) if j not in head], dtype=np.int64)
+        return matched.take(order)
+
+    def stats(self) -> Dict[str, int]:
+        """累計的模糊 / 重排 / 快取命中 / LLM 請求 / 失敗數"""
+        with self._lock:
+            return dict(self._stats)
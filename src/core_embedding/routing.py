@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+考科路由與法條分區
+法條依 (法規類別, 法規代碼) 排序後，每個法規 / 類別對應法條矩陣中連續的列範圍；
+考科路由表將考卷科目對應到相關法規，查詢只需掃描部分語料
+"""
+
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .article_table import ArticleTable
+
+# 考科 -> 相關法規（可填法規代碼、法規名稱或法規類別）
+SUBJECT_ROUTES: Dict[str, List[str]] = {
+    "不動產經紀相關法規概要": [
+        "不動產經紀業管理條例", "不動產經紀業管理條例施行細則",
+        "公寓大廈管理條例", "公平交易法", "消費者保護法",
+        "REAA", "REAAR", "CMBA", "FTLA", "CPLA",
+    ],
+    "民法概要": ["民法"],
+    "土地法與土地相關稅法概要": [
+        "土地法", "土地稅法", "平均地權條例", "房屋稅條例", "契稅條例", "土地徵收條例",
+    ],
+    "不動產估價概要": ["不動產估價技術規則"],
+}
+
+
+def subject_from_filename(filename: str) -> Optional[str]:
+    """從考卷檔名取出科目：112190_1201_民法概要_mapped.json / 112190_1201_民法概要.json -> 民法概要"""
+    match = re.match(r"\d+_\d+_([^_]+)", Path(filename).stem)
+    return match.group(1) if match else None
+
+
+def route_targets(subject: Optional[str], routes: Optional[Dict[str, List[str]]] = None) -> Optional[List[str]]:
+    """查詢考科路由（完全相符優先，其次為包含關係）"""
+    if not subject:
+        return None
+    routes = routes if routes is not None else SUBJECT_ROUTES
+    if subject in routes:
+        return routes[subject]
+    for key, targets in routes.items():
+        if key in subject or subject in key:
+            return targets
+    return None
+
+
+class PartitionMap:
+    """法條分區：法規代碼 / 法規名稱 / 法規類別 -> 連續列範圍（法條表須依 sort_order() 排序）"""
+
+    def __init__(self, articles: Optional[ArticleTable] = None):
+        self.num_rows = len(articles) if articles is not None else 0
+        self.ranges: Dict[str, Tuple[int, int]] = {}
+        if articles is None:
+            return
+
+        for field in ("law_code", "law_name", "category"):
+            for row, key in enumerate(articles.column(field)):
+                if not key:
+                    continue
+                start, _ = self.ranges.get(key, (row, row))
+                self.ranges[key] = (start, row + 1)
+
+    @classmethod
+    def from_ranges(cls, ranges: Dict[str, Tuple[int, int]], num_rows: int) -> "PartitionMap":
+        """由已保存的分區範圍還原（不需掃描法條表）"""
+        partitions = cls()
+        partitions.num_rows = num_rows
+        partitions.ranges = {key: (int(start), int(end)) for key, (start, end) in ranges.items()}
+        return partitions
+
+    def resolve(self, targets: List[str]) -> List[Tuple[int, int]]:
+        """將法規代碼 / 名稱 / 類別轉為合併後的列範圍"""
+        spans = sorted(self.ranges[t] for t in targets if t in self.ranges)
+
+        merged: List[Tuple[int, int]] = []
+        for start, end in spans:
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+    def rows_in(self, ranges: List[Tuple[int, int]]) -> int:
+        return sum(end - start for start, end in ranges)
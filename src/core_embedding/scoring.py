@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相似度計分核心
+Q×D 查詢矩陣對 N×D 法條矩陣做分塊 GEMM，並以 argpartition 取每列 top-k
+EmbeddingMatcher 與 GeminiEmbeddingMatcher 共用
+"""
+
+from typing import List, Tuple
+
+import numpy as np
+
+# 分塊大小：單塊分數矩陣最多 256 × 16384 個元素（float32 約 16 MB）
+DEFAULT_QUERY_BLOCK = 256
+DEFAULT_CORPUS_BLOCK = 16384
+
+
+def _top_k_columns(scores: np.ndarray, k: int) -> np.ndarray:
+    """每列分數最高的 k 個欄位索引（未排序）"""
+    if k >= scores.shape[1]:
+        return np.broadcast_to(np.arange(scores.shape[1]), scores.shape).copy()
+    return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+
+def _merge_top_k(idx_a: np.ndarray, scores_a: np.ndarray,
+                 idx_b: np.ndarray, scores_b: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """合併兩組候選，保留每列 top-k"""
+    indices = np.concatenate([idx_a, idx_b], axis=1)
+    scores = np.concatenate([scores_a, scores_b], axis=1)
+    keep = _top_k_columns(scores, k)
+    return np.take_along_axis(indices, keep, axis=1), np.take_along_axis(scores, keep, axis=1)
+
+
+def top_k_search(queries: np.ndarray, corpus: np.ndarray, k: int,
+                 query_block: int = DEFAULT_QUERY_BLOCK,
+                 corpus_block: int = DEFAULT_CORPUS_BLOCK) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    多查詢 top-k 內積搜尋
+
+    Args:
+        queries: (Q, D) 查詢矩陣
+        corpus: (N, D) 法條矩陣（可為 memmap）
+        k: 每個查詢返回的數量
+        query_block: 每次處理的查詢列數
+        corpus_block: 每次處理的法條列數
+
+    Returns:
+        (indices, scores)：皆為 (Q, min(k, N))，每列依分數由高到低排序
+    """
+    queries = np.atleast_2d(queries)
+    num_queries, num_rows = queries.shape[0], corpus.shape[0]
+    k = min(k, num_rows)
+
+    all_indices = np.empty((num_queries, k), dtype=np.int64)
+    all_scores = np.empty((num_queries, k), dtype=np.result_type(queries.dtype, corpus.dtype))
+    if k == 0:
+        return all_indices, all_scores
+
+    for q_start in range(0, num_queries, query_block):
+        q_block = queries[q_start:q_start + query_block]
+        best_idx = best_scores = None
+
+        for c_start in range(0, num_rows, corpus_block):
+            block_scores = q_block @ corpus[c_start:c_start + corpus_block].T
+            cols = _top_k_columns(block_scores, k)
+            cand_scores = np.take_along_axis(block_scores, cols, axis=1)
+            cand_idx = cols + c_start
+
+            if best_idx is None:
+                best_idx, best_scores = cand_idx, cand_scores
+            else:
+                best_idx, best_scores = _merge_top_k(best_idx, best_scores, cand_idx, cand_scores, k)
+
+        order = np.argsort(-best_scores, axis=1, kind='stable')
+        q_end = q_start + q_block.shape[0]
+        all_indices[q_start:q_end] = np.take_along_axis(best_idx, order, axis=1)
+        all_scores[q_start:q_end] = np.take_along_axis(best_scores, order, axis=1)
+
+    return all_indices, all_scores
+
+
+def top_k_search_ranges(queries: np.ndarray, corpus: np.ndarray, k: int,
+                        row_ranges: List[Tuple[int, int]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    只在指定的連續列範圍（分區子矩陣）內做 top-k 搜尋
+
+    Args:
+        queries: (Q, D) 查詢矩陣
+        corpus: (N, D) 法條矩陣
+        k: 每個查詢返回的數量
+        row_ranges: [(start, end), ...] 不重疊的列範圍
+
+    Returns:
+        (indices, scores)：索引為整個法條矩陣中的列號，每列依分數由高到低排序
+    """
+    queries = np.atleast_2d(queries)
+    best_idx = best_scores = None
+
+    for start, end in row_ranges:
+        idx, scores = top_k_search(queries, corpus[start:end], k)
+        idx = idx + start
+        if best_idx is None:
+            best_idx, best_scores = idx, scores
+        else:
+            best_idx, best_scores = _merge_top_k(best_idx, best_scores, idx, scores, k)
+
+    if best_idx is None:
+        return top_k_search(queries, corpus[:0], k)
+
+    order = np.argsort(-best_scores, axis=1, kind='stable')
+    return np.take_along_axis(best_idx, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
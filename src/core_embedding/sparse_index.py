@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+字元 bigram BM25 倒排索引（混合檢索的第一階段）
+- 中文條文不需斷詞：以連續字元的 bigram 為詞彙，「定型化契約」「區分所有權人」等法律用語可精確命中
+- 倒排列表以 CSR 陣列保存，每個 posting 預先算好 BM25 權重，查詢只需一次 bincount
+- 常駐索引的基底與各區段分別建立（區段沿用基底的詞彙與 idf，只為新詞補上 idf），墓碑列與範圍外的列不列入候選
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .article_table import ArticleTable
+from .embedding_store import normalize_text
+
+logger = logging.getLogger(__name__)
+
+_WORD_RUN = re.compile(r"\w+")
+
+
+def char_bigrams(text: str) -> List[str]:
+    """正規化後取連續字元的 bigram（標點與空白切斷；單字元片段保留為 unigram）"""
+    terms = []
+    for run in _WORD_RUN.findall(normalize_text(text).lower()):
+        if len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+class BM25Index:
+    """
+    BM25 倒排索引
+
+    Args:
+        vocab: 詞彙 -> 詞彙編號
+        idf: 每個詞彙的 idf
+        avgdl: 平均文件長度（bigram 數）
+        term_offsets: 每個詞彙在 postings 中的起訖位置
+        doc_ids: posting 的文件編號
+        weights: posting 的 BM25 權重
+        num_docs: 文件數
+        k1 / b: BM25 參數
+    """
+
+    def __init__(self, vocab: Dict[str, int], idf: np.ndarray, avgdl: float,
+                 term_offsets: np.ndarray, doc_ids: np.ndarray, weights: np.ndarray,
+                 num_docs: int, k1: float, b: float):
+        self.vocab = vocab
+        self.idf = idf
+        self.avgdl = avgdl
+        self.term_offsets = term_offsets
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.num_docs = num_docs
+        self.k1 = k1
+        self.b = b
+
+    @classmethod
+    def build(cls, texts: List[str], k1: float = 1.2, b: float = 0.75,
+              stats: Optional["BM25Index"] = None) -> "BM25Index":
+        """
+        建立索引
+
+        Args:
+            texts: 文件文本
+            k1 / b: BM25 參數
+            stats: 沿用另一個索引的詞彙、idf 與平均長度（區段與基底的分數才可比較；新詞的 idf 以兩者合計的文件數估計）
+        """
+        vocab = dict(stats.vocab) if stats is not None else {}
+        num_known = len(vocab)
+        term_ids, doc_ids, tfs = [], [], []
+        doc_lengths = np.zeros(len(texts), dtype=np.float32)
+
+        for doc, text in enumerate(texts):
+            terms = char_bigrams(text)
+            doc_lengths[doc] = len(terms)
+            for term, tf in Counter(terms).items():
+                term_id = vocab.get(term)
+                if term_id is None:
+                    term_id = vocab[term] = len(vocab)
+                term_ids.append(term_id)
+                doc_ids.append(doc)
+                tfs.append(tf)
+
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        tfs = np.asarray(tfs, dtype=np.float32)
+        num_terms = len(vocab)
+
+        df = np.bincount(term_ids, minlength=num_terms).astype(np.float32)[num_known:]
+        if stats is not None:
+            num_docs = stats.num_docs + len(texts)
+            new_idf = np.log1p((num_docs - df + 0.5) / (df + 0.5))
+            idf = np.concatenate([stats.idf, new_idf]).astype(np.float32)
+            avgdl = stats.avgdl
+        else:
+            idf = np.log1p((len(texts) - df + 0.5) / (df + 0.5)).astype(np.float32)
+            avgdl = float(doc_lengths.mean()) if len(texts) else 0.0
+
+        # 依詞彙排序成 CSR，並預先計算每個 posting 的 BM25 權重
+        order = np.argsort(term_ids, kind="stable")
+        term_ids, doc_ids, tfs = term_ids[order], doc_ids[order], tfs[order]
+        term_offsets = np.concatenate([[0], np.cumsum(np.bincount(term_ids, minlength=num_terms))]).astype(np.int64)
+
+        norm = k1 * (1 - b + b * doc_lengths[doc_ids] / max(avgdl, 1e-6))
+        weights = (idf[term_ids] * tfs * (k1 + 1) / (tfs + norm)).astype(np.float32)
+        return cls(vocab, idf, avgdl, term_offsets, doc_ids, weights, len(texts), k1, b)
+
+    def query_terms(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """查詢中出現在詞彙表的 (詞彙編號, 次數)"""
+        counts = Counter(term for term in char_bigrams(text) if term in self.vocab)
+        term_ids = np.fromiter((self.vocab[term] for term in counts), dtype=np.int64, count=len(counts))
+        qtf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        return term_ids, qtf
+
+    def score_bound(self, term_ids: np.ndarray, qtf: np.ndarray) -> float:
+        """查詢分數的上界（tf 飽和時每個詞彙最多貢獻 idf × (k1 + 1)），用於將分數正規化到 0~1"""
+        return float((self.idf[term_ids] * qtf).sum() * (self.k1 + 1))
+
+    def scores(self, term_ids: np.ndarray, qtf: np.ndarray) -> np.ndarray:
+        """單一查詢對所有文件的 BM25 分數"""
+        if len(term_ids) == 0 or self.num_docs == 0:
+            return np.zeros(self.num_docs, dtype=np.float32)
+        starts, ends = self.term_offsets[term_ids], self.term_offsets[term_ids + 1]
+        lengths = ends - starts
+        positions = np.repeat(ends - lengths.cumsum(), lengths) + np.arange(lengths.sum())
+        weights = self.weights[positions] * np.repeat(qtf, lengths)
+        return np.bincount(self.doc_ids[positions], weights=weights, minlength=self.num_docs).astype(np.float32)
+
+
+class SparseLawIndex:
+    """
+    常駐法條索引（IndexSnapshot）的 BM25 第一階段
+
+    Args:
+        texts_of: 由法條表產生索引文本的函式（與 embedding 文本相同）
+        k1 / b: BM25 參數
+    """
+
+    def __init__(self, texts_of: Callable[[ArticleTable], List[str]], k1: float = 1.2, b: float = 0.75):
+        self.texts_of = texts_of
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._cache: Dict[int, Tuple[object, BM25Index]] = {}
+
+    def _index_for(self, table: ArticleTable, stats: Optional[BM25Index] = None) -> BM25Index:
+        """取得（必要時建立）法條表的 BM25 索引；基底與區段不可變，以物件識別快取"""
+        cached = self._cache.get(id(table))
+        if cached is not None and cached[0] is table:
+            return cached[1]
+
+        start_time = time.time()
+        index = BM25Index.build(self.texts_of(table), self.k1, self.b, stats=stats)
+        self._cache[id(table)] = (table, index)
+        if stats is None:
+            logger.info(f"🔧 建立 BM25 bigram 索引: {index.num_docs} 條, 詞彙 {len(index.vocab)}, "
+                        f"{time.time() - start_time:.2f} 秒")
+        return index
+
+    def _indexes(self, snapshot) -> List[BM25Index]:
+        """快照的基底與各區段索引（依列號順序）；同時清除已不在快照中的舊索引"""
+        with self._lock:
+            base = self._index_for(snapshot.base_articles)
+            parts = [base] + [self._index_for(segment.articles, stats=base) for segment in snapshot.segments]
+
+            live = {id(snapshot.base_articles)} | {id(segment.articles) for segment in snapshot.segments}
+            for key in [key for key in self._cache if key not in live]:
+                del self._cache[key]
+        return parts
+
+    def shortlist(self, snapshot, texts: List[str], size: int,
+                  scope: Optional[List[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        每個查詢 BM25 分數最高的候選
+
+        Args:
+            snapshot: IndexSnapshot
+            texts: 查詢文本
+            size: 候選數
+            scope: 限定的分區（法規代碼 / 名稱 / 類別）
+
+        Returns:
+            (rows, scores)：皆為 (Q, size)，依分數由高到低排序；分數以查詢上界正規化到 0~1
+            （區段的詞彙可能多於基底，上界依各自的詞彙計算），沒有命中的位置為 -1 / 0
+        """
+        parts = self._indexes(snapshot)
+        num_base = len(snapshot.base_articles)
+
+        # 允許的列：範圍內且不是墓碑
+        allowed = np.ones(snapshot.num_rows, dtype=bool)
+        if scope:
+            allowed[:num_base] = False
+            for start, end in snapshot.partitions.resolve(scope):
+                allowed[start:end] = True
+            for segment in snapshot.segments:
+                in_scope = np.zeros(len(segment.articles), dtype=bool)
+                in_scope[snapshot.rows_in_scope(segment, scope)] = True
+                allowed[segment.offset:segment.offset + len(segment.articles)] = in_scope
+        allowed[snapshot.tombstones] = False
+
+        rows = np.full((len(texts), size), -1, dtype=np.int64)
+        scores = np.zeros((len(texts), size), dtype=np.float32)
+
+        for i, text in enumerate(texts):
+            part_scores = []
+            for index in parts:
+                term_ids, qtf = index.query_terms(text)
+                bound = index.score_bound(term_ids, qtf)
+                part_scores.append(index.scores(term_ids, qtf) / bound if bound > 0
+                                   else np.zeros(index.num_docs, dtype=np.float32))
+
+            row_scores = np.where(allowed, np.concatenate(part_scores), 0.0)
+            hit = np.flatnonzero(row_scores > 0)
+            if len(hit) > size:
+                hit = hit[np.argpartition(-row_scores[hit], size - 1)[:size]]
+            hit = hit[np.argsort(-row_scores[hit], kind="stable")]
+
+            rows[i, :len(hit)] = hit
+            scores[i, :len(hit)] = row_scores[hit]
+
+        return rows, scores
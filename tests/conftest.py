@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+核心 Embedding 測試的共用 fixture
+- 使用 FakeProvider（決定性向量、不連網），不需要 API Key
+- 小型法條語料：兩部有法規代碼的法規，另有兩部代碼皆為 UNKN 的法規（土地法 / 民法，條號互相重疊）
+"""
+
+import pandas as pd
+import pytest
+
+from src.core_embedding.embedding_matcher import EmbeddingMatcher
+from src.core_embedding.providers import create_provider
+
+FAKE_DIMENSIONS = 32
+
+LAWS = (
+    # (法規代碼, 法規名稱, 法規類別, 條文數)
+    ("REAA", "不動產經紀業管理條例", "不動產法規", 10),
+    ("CMBA", "公寓大廈管理條例", "不動產法規", 10),
+    ("UNKN", "土地法", "土地法規", 12),
+    ("UNKN", "民法", "民事法規", 12),
+)
+
+
+def law_rows(laws=LAWS):
+    """依法規清單產生與 results/law_articles.csv 相同欄位的資料列"""
+    rows = []
+    for code, name, category, count in laws:
+        for n in range(1, count + 1):
+            rows.append({
+                "法規代碼": code, "法規名稱": name, "修正日期（民國）": "", "法規類別": category, "主管機關": "",
+                "章節編號": 0, "章節標題": "", "條文主號": n, "條文次號": 0,
+                "條文完整內容": f"{name}第{n}條：{category}之規定{n}",
+            })
+    return rows
+
+
+@pytest.fixture
+def law_csv(tmp_path):
+    """寫入暫存目錄的法條 CSV 路徑"""
+    path = tmp_path / "law_articles.csv"
+    pd.DataFrame(law_rows()).to_csv(path, index=False, encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def fake_provider():
+    return create_provider("fake", dimensions=FAKE_DIMENSIONS)
+
+
+@pytest.fixture
+def make_matcher(law_csv):
+    """建立已載入法條的匹配器（每次呼叫使用新的 FakeProvider，可傳入其他建構參數）"""
+
+    def _make(csv_path=None, **kwargs):
+        kwargs.setdefault("provider", create_provider("fake", dimensions=FAKE_DIMENSIONS))
+        matcher = EmbeddingMatcher(**kwargs)
+        assert matcher.load_law_articles(csv_path or law_csv)
+        return matcher
+
+    return _make
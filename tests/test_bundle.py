@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試單檔索引包的寫入、開啟與載入
+"""
+
+import numpy as np
+import pytest
+from click.testing import CliRunner
+
+from src.core_embedding.bundle import LawIndexBundle
+from src.core_embedding.cli import build_index
+from src.core_embedding.embedding_matcher import EmbeddingMatcher, OptionQuery
+from src.core_embedding.providers import create_provider
+
+QUERIES = [
+    OptionQuery("1", "下列敘述何者正確？", "A", "區分所有權人會議之決議"),
+    OptionQuery("1", "下列敘述何者正確？", "B", "土地登記之效力"),
+]
+
+
+def test_bundle_round_trip(tmp_path, make_matcher):
+    matcher = make_matcher(store_dir=str(tmp_path / "store"))
+    path = matcher.save_bundle(str(tmp_path / "law_index.bundle"))
+
+    bundle = LawIndexBundle.open(str(path))
+    assert len(bundle) == len(matcher.law_articles)
+    assert bundle.info()["embedding_model"] == matcher.embedding_model
+    assert bundle.info()["dimensions"] == matcher.dimensions
+    assert bundle.fingerprint == matcher.store.fingerprint
+    assert bundle.articles.ids.tolist() == matcher.law_articles.ids.tolist()
+    np.testing.assert_array_equal(bundle.vectors, matcher.law_embeddings)
+    assert bundle.partitions.ranges == matcher.partitions.ranges
+
+    # 同號條文依 ID 各自對應到自己的法規
+    assert bundle.article("土地法-3")["law_name"] == "土地法"
+    assert bundle.article("民法-3")["content"] == "民法第3條：民事法規之規定3"
+    assert bundle.row_of("民法-99") is None
+
+
+def test_loaded_bundle_matches_like_the_source(tmp_path, make_matcher):
+    source = make_matcher()
+    path = source.save_bundle(str(tmp_path / "law_index.bundle"))
+    expected = source.match_options_batch(QUERIES, top_k=3)
+
+    # 載入索引包不解析 CSV、不建立語料 embedding，只有查詢需要呼叫提供者
+    served = EmbeddingMatcher(provider=create_provider("fake", dimensions=source.dimensions))
+    assert served.load_bundle(str(path))
+    assert served.provider.stats()["requests"] == 0
+    results = served.match_options_batch(QUERIES, top_k=3)
+    assert [r.matched_articles.ids for r in results] == [r.matched_articles.ids for r in expected]
+
+
+def test_bundle_includes_live_updates(tmp_path, make_matcher):
+    matcher = make_matcher()
+    matcher.live_index.compact_ratio = 10
+    matcher.upsert_articles([{"id": "土地法-3", "law_code": "UNKN", "law_name": "土地法", "category": "土地法規",
+                              "article_no_main": 3, "content": "修正後的土地法第三條"}])
+    matcher.remove_articles(["民法-2"])
+
+    bundle = LawIndexBundle.open(str(matcher.save_bundle(str(tmp_path / "law_index.bundle"))))
+    assert bundle.article("土地法-3")["content"] == "修正後的土地法第三條"
+    assert bundle.row_of("民法-2") is None
+    assert len(bundle) == len(matcher.law_articles)
+
+
+def test_model_mismatch_is_rejected(tmp_path, make_matcher):
+    path = make_matcher().save_bundle(str(tmp_path / "law_index.bundle"))
+    other = EmbeddingMatcher(provider=create_provider("fake", dimensions=16))
+    assert not other.load_bundle(str(path))
+    assert other.law_embeddings is None
+
+
+def test_not_a_bundle(tmp_path):
+    path = tmp_path / "law_articles.csv"
+    path.write_text("法規代碼,法規名稱\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        LawIndexBundle.open(str(path))
+
+
+def test_cli_builds_a_bundle_offline(tmp_path, law_csv, monkeypatch):
+    monkeypatch.delenv("EMBEDDING_DIMENSIONS", raising=False)
+    output = tmp_path / "law_index.bundle"
+    result = CliRunner().invoke(build_index, [
+        "--laws-csv", law_csv, "--output", str(output), "--backend", "fake",
+        "--dimensions", "32", "--store-dir", str(tmp_path / "store"),
+    ])
+    assert result.exit_code == 0, result.output
+
+    served = EmbeddingMatcher(provider=create_provider("fake", dimensions=32))
+    assert served.load_bundle(str(output))
+    assert len(served.law_articles) == len(LawIndexBundle.open(str(output)))
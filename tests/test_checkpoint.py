@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試語料建立的批次檢查點與續建
+"""
+
+import numpy as np
+import pytest
+
+from src.core_embedding.batching import embed_in_batches
+from src.core_embedding.checkpoint import BatchCheckpoint, CorpusBuildError, ResilientEmbedder
+from src.core_embedding.embedding_matcher import EmbeddingMatcher
+from src.core_embedding.providers import FakeProvider
+
+
+class ConnectionLost(Exception):
+    """模擬中斷建立的非輸入錯誤（不二分、不重試）"""
+
+
+class BadRequestError(Exception):
+    """模擬 API 的輸入錯誤（400）"""
+
+    status_code = 400
+
+
+class FlakyProvider(FakeProvider):
+    """第 fail_at 次請求起拋出 ConnectionLost；含 poison 文本的批次拋出 BadRequestError"""
+
+    def __init__(self, fail_at=None, poison=None, **kwargs):
+        super().__init__(dimensions=32, **kwargs)
+        self.fail_at = fail_at
+        self.poison = poison
+        self.batches = []
+
+    def embed_batch(self, texts, query=False):
+        if self.poison is not None and self.poison in texts:
+            raise BadRequestError(f"invalid input: {self.poison}")
+        if self.fail_at is not None and len(self.batches) + 1 >= self.fail_at:
+            raise ConnectionLost("connection reset")
+        self.batches.append(list(texts))
+        return super().embed_batch(texts, query)
+
+
+def test_interrupted_build_resumes_from_checkpoints(tmp_path, law_csv, make_matcher):
+    # 每批 8 條：第 3 次請求中斷，已完成的兩批留在檢查點，不發布不完整的語料
+    crashed = EmbeddingMatcher(provider=FlakyProvider(fail_at=3, max_batch_items=8), store_dir=str(tmp_path))
+    assert not crashed.load_law_articles(law_csv)
+    assert crashed.store.generation == 0
+    assert len(list(crashed.checkpoint.checkpoint_dir.glob("*.npy"))) == 2
+
+    # 重跑只請求未完成的批次，結果與一次建立完成相同
+    resumed_provider = FlakyProvider(max_batch_items=8)
+    resumed = make_matcher(provider=resumed_provider, store_dir=str(tmp_path))
+    total_batches = -(-len(resumed.law_articles) // 8)
+    assert len(resumed_provider.batches) == total_batches - 2
+    assert not {tuple(batch) for batch in resumed_provider.batches} & {tuple(batch) for batch in crashed.provider.batches}
+
+    reference = make_matcher(provider=FlakyProvider(max_batch_items=8))
+    np.testing.assert_allclose(resumed.law_embeddings, reference.law_embeddings)
+
+    # 發布後移除檢查點
+    assert resumed.store.generation == 1
+    assert not resumed.checkpoint.checkpoint_dir.exists()
+
+
+def test_input_error_bisects_and_refuses_to_publish(tmp_path):
+    texts = [f"條文 {i}" for i in range(16)]
+    texts[5] = "POISON"
+    provider = FlakyProvider(poison="POISON")
+    checkpoint = BatchCheckpoint(str(tmp_path / "checkpoints"))
+    embedder = ResilientEmbedder(provider.embed_batch, checkpoint)
+
+    # 二分後其餘文本完成並寫入檢查點，缺少向量的一筆使整個語料拒絕發布
+    with pytest.raises(CorpusBuildError):
+        embed_in_batches(texts, embedder, 8, 10 ** 6, 8191, len)
+    assert embedder.failed_texts == ["POISON"]
+    assert checkpoint.get(texts[8:]) is not None
+
+    # 修正輸入後重跑：已完成的批次由檢查點取得，只重送含修正文本的批次
+    texts[5] = "條文 5"
+    provider.batches.clear()
+    vectors = embed_in_batches(texts, ResilientEmbedder(provider.embed_batch, checkpoint), 8, 10 ** 6, 8191, len)
+    assert provider.batches == [texts[:8]]
+    np.testing.assert_allclose(vectors, np.stack([provider.vector(text) for text in texts]), atol=1e-6)
+
+
+def test_other_errors_are_raised_without_bisecting(tmp_path):
+    provider = FlakyProvider(fail_at=1)
+    embedder = ResilientEmbedder(provider.embed_batch, BatchCheckpoint(str(tmp_path)))
+    with pytest.raises(ConnectionLost):
+        embedder([f"條文 {i}" for i in range(4)])
+    assert embedder.failed_texts == []
+
+
+def test_retryable_errors_back_off_and_retry(tmp_path):
+    provider = FlakyProvider()
+    delays = []
+
+    def embed_batch(texts):
+        # 第一次請求暫時失敗，之後恢復
+        if not delays:
+            raise ConnectionLost("rate limited")
+        return provider.embed_batch(texts)
+
+    embedder = ResilientEmbedder(embed_batch, BatchCheckpoint(str(tmp_path)), retryable=(ConnectionLost,), sleep=delays.append)
+    vectors = embedder(["條文 0", "條文 1"])
+    assert len(delays) == 1
+    np.testing.assert_allclose(vectors[0], provider.vector("條文 0"))
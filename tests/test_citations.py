@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試明確引用的解析（法規代碼相同的不同法規：土地法 / 民法皆為 UNKN）
+"""
+
+import pandas as pd
+import pytest
+
+from src.core_embedding.article_table import ArticleTable
+from src.core_embedding.citations import CitationIndex
+from src.core_embedding.embedding_matcher import OptionQuery
+from src.core_embedding.match_results import SCORE_CITATION
+
+QUESTION = "下列敘述何者正確？"
+
+
+@pytest.fixture
+def citation_index(law_csv):
+    return CitationIndex(ArticleTable.from_dataframe(pd.read_csv(law_csv, encoding="utf-8")))
+
+
+def cited_ids(index, text):
+    rows, law_names = index.resolve(text)
+    return [index.articles.ids[row] for row in rows], law_names
+
+
+def test_same_code_resolves_by_law_name(citation_index):
+    citations = citation_index.find("土地法第10條與民法第十條")
+    assert [(c.law_code, c.key) for c in citations if c.key] == [("UNKN", ("土地法", 10, 0)), ("UNKN", ("民法", 10, 0))]
+    assert cited_ids(citation_index, "土地法第10條與民法第十條") == (["土地法-10", "民法-10"], ["土地法", "民法"])
+
+
+def test_following_articles_and_back_references(citation_index):
+    assert cited_ids(citation_index, "民法第10條及第11條") == (["民法-10", "民法-11"], ["民法"])
+    assert cited_ids(citation_index, "依土地法規定，同法第3條所稱") == (["土地法-3"], ["土地法"])
+
+
+def test_missing_article_only_cites_the_law(citation_index):
+    assert cited_ids(citation_index, "民法第99條") == ([], ["民法"])
+
+
+def test_fully_cited_options_skip_embedding(make_matcher):
+    matcher = make_matcher()
+    requests = matcher.provider.stats()["requests"]
+    results = matcher.match_options_batch([
+        OptionQuery("1", QUESTION, "A", "土地法第10條規定登記"),
+        OptionQuery("1", QUESTION, "B", "民法第10條與第11條"),
+    ], top_k=2)
+
+    assert results[0].matched_articles.ids[0] == "土地法-10"
+    assert results[1].matched_articles.ids == ["民法-10", "民法-11"]
+    assert [a["score_type"] for a in results[1].matched_articles] == [SCORE_CITATION] * 2
+    assert matcher.provider.stats()["requests"] == requests + 1  # 只有選項 A 需要補第二名
+
+
+def test_cited_law_narrows_the_route(make_matcher):
+    matcher = make_matcher()
+
+    # 題目引用的民法在路由內：只搜尋民法
+    result = matcher.match_options_batch([OptionQuery("2", "依民法規定，下列何者正確？", "A", "權利能力")],
+                                         top_k=5, scope=["民事法規", "土地法規"])[0]
+    assert {a["law_name"] for a in result.matched_articles} == {"民法"}
+
+    # 引用的土地法不在路由內：維持路由範圍，不跨出考科
+    result = matcher.match_options_batch([OptionQuery("3", "依土地法規定，下列何者正確？", "A", "登記之效力")],
+                                         top_k=5, scope=["民事法規"])[0]
+    assert {a["law_name"] for a in result.matched_articles} == {"民法"}
+
+
+def test_citations_follow_live_updates(make_matcher):
+    matcher = make_matcher()
+    matcher.live_index.compact_ratio = 10
+    matcher.remove_articles(["土地法-10"])
+    query = OptionQuery("4", QUESTION, "A", "土地法第10條")
+    assert "土地法-10" not in matcher.match_options_batch([query], top_k=3)[0].matched_articles.ids
+
+    matcher.upsert_articles([{"id": "土地法-10", "law_code": "UNKN", "law_name": "土地法", "category": "土地法規",
+                              "article_no_main": 10, "content": "修正後的土地法第十條"}])
+    result = matcher.match_options_batch([query], top_k=1)[0]
+    assert result.matched_articles.ids == ["土地法-10"]
+    assert result.matched_articles[0]["content"] == "修正後的土地法第十條"
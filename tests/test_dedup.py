@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試跨年度近似重複考題的結果與查詢向量沿用
+"""
+
+import pytest
+
+from src.core_embedding.dedup import NearDuplicateIndex
+from src.core_embedding.embedding_matcher import OptionQuery
+
+QUESTION = "依公寓大廈管理條例規定，區分所有權人會議之決議事項，下列敘述何者正確？"
+# 隔年的同一題只改了少許字詞
+QUESTION_NEXT_YEAR = "依公寓大廈管理條例之規定，區分所有權人會議之決議事項，下列敘述何者正確？"
+OPTION = "管理委員會應於會議後十五日內將會議紀錄送達各區分所有權人"
+
+
+@pytest.fixture
+def dedup_db(tmp_path):
+    return str(tmp_path / "near_duplicates.sqlite")
+
+
+def requests_of(matcher):
+    return matcher.provider.stats()["requests"]
+
+
+def test_near_duplicate_option_reuses_results(make_matcher, dedup_db):
+    matcher = make_matcher(dedup=NearDuplicateIndex(dedup_db))
+    first = matcher.match_options_batch([OptionQuery("1", QUESTION, "A", OPTION, source="110")], top_k=3)[0]
+    assert first.duplicate_of is None
+
+    requests = requests_of(matcher)
+    again = matcher.match_options_batch([OptionQuery("7", QUESTION_NEXT_YEAR, "C", OPTION, source="111")], top_k=3)[0]
+    assert again.duplicate_of["source"] == "110#1A" and again.duplicate_of["reused"] == "results"
+    assert again.matched_articles.ids == first.matched_articles.ids
+    assert [a["similarity"] for a in again.matched_articles] == pytest.approx([a["similarity"] for a in first.matched_articles])
+    assert requests_of(matcher) == requests
+    assert matcher.retrieval_stats["duplicate_results"] == 1
+
+
+def test_different_option_with_same_stem_is_not_a_duplicate(make_matcher, dedup_db):
+    matcher = make_matcher(dedup=NearDuplicateIndex(dedup_db))
+    matcher.match_options_batch([OptionQuery("1", QUESTION, "A", OPTION, source="110")], top_k=3)
+    other = matcher.match_options_batch([OptionQuery("1", QUESTION, "B", "區分所有權人得以書面委託他人代理出席", source="110")], top_k=3)[0]
+    assert other.duplicate_of is None
+
+
+def test_results_persist_across_runs(make_matcher, dedup_db):
+    first = make_matcher(dedup=NearDuplicateIndex(dedup_db))
+    expected = first.match_options_batch([OptionQuery("1", QUESTION, "A", OPTION, source="110")], top_k=3)[0]
+
+    matcher = make_matcher(dedup=NearDuplicateIndex(dedup_db))
+    requests = requests_of(matcher)
+    result = matcher.match_options_batch([OptionQuery("7", QUESTION_NEXT_YEAR, "C", OPTION, source="111")], top_k=3)[0]
+    assert result.duplicate_of["reused"] == "results"
+    assert result.matched_articles.ids == expected.matched_articles.ids
+    assert requests_of(matcher) == requests
+
+
+def test_changed_corpus_only_reuses_the_query_vector(make_matcher, dedup_db):
+    matcher = make_matcher(dedup=NearDuplicateIndex(dedup_db))
+    matcher.live_index.compact_ratio = 10
+    matcher.match_options_batch([OptionQuery("1", QUESTION, "A", OPTION, source="110")], top_k=3)
+
+    # 語料改變後列號配置不同：不沿用結果，以先前文本的查詢向量（查詢快取）重新搜尋
+    matcher.upsert_articles([{"id": "CMBA-11", "law_code": "CMBA", "law_name": "公寓大廈管理條例", "category": "不動產法規",
+                              "article_no_main": 11, "content": "新增的公寓大廈管理條例第十一條"}])
+    requests = requests_of(matcher)
+    result = matcher.match_options_batch([OptionQuery("7", QUESTION_NEXT_YEAR, "C", OPTION, source="111")], top_k=3)[0]
+    assert result.duplicate_of["reused"] == "vector"
+    assert requests_of(matcher) == requests
+    assert matcher.retrieval_stats["duplicate_results"] == 0
+
+
+def test_larger_top_k_is_not_served_from_results(make_matcher, dedup_db):
+    matcher = make_matcher(dedup=NearDuplicateIndex(dedup_db))
+    matcher.match_options_batch([OptionQuery("1", QUESTION, "A", OPTION, source="110")], top_k=1)
+    result = matcher.match_options_batch([OptionQuery("7", QUESTION_NEXT_YEAR, "C", OPTION, source="111")], top_k=3)[0]
+    assert result.duplicate_of["reused"] == "vector"
+    assert len(result.matched_articles) == 3
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試 Embedding 儲存的世代與 CURRENT 指標
+"""
+
+import numpy as np
+
+from src.core_embedding.embedding_store import KEEP_GENERATIONS, EmbeddingStore, text_hash
+
+
+def embed_with(provider, calls):
+    """包裝提供者並記錄每次實際送出的文本"""
+
+    def embed_fn(texts):
+        calls.append(list(texts))
+        return np.array(provider.embed_batch(texts), dtype=np.float32)
+
+    return embed_fn
+
+
+def test_unchanged_corpus_reuses_current_generation(tmp_path, fake_provider):
+    ids = [f"A-{i}" for i in range(5)]
+    texts = [f"條文 {i}" for i in range(5)]
+    calls = []
+
+    store = EmbeddingStore(str(tmp_path), fake_provider.name)
+    first = np.array(store.get_or_build(ids, texts, embed_with(fake_provider, calls)))
+    assert calls == [texts]
+    assert store.generation == 1
+    assert (store.store_dir / "CURRENT").read_text(encoding="utf-8") == "000001"
+
+    # 重新開啟：由 CURRENT 指標找到世代，語料相同時不呼叫 embedding 也不寫入新世代
+    reopened = EmbeddingStore(str(tmp_path), fake_provider.name)
+    second = reopened.get_or_build(ids, texts, embed_with(fake_provider, calls))
+    assert len(calls) == 1
+    assert reopened.generation == 1
+    assert isinstance(second, np.memmap)
+    np.testing.assert_array_equal(second, first)
+
+
+def test_changed_articles_only_embed_the_difference(tmp_path, fake_provider):
+    ids = [f"A-{i}" for i in range(5)]
+    texts = [f"條文 {i}" for i in range(5)]
+    calls = []
+
+    store = EmbeddingStore(str(tmp_path), fake_provider.name)
+    first = np.array(store.get_or_build(ids, texts, embed_with(fake_provider, calls)))
+
+    # 修改一條、刪除一條、新增一條
+    new_ids = ids[:3] + ["A-4", "A-5"]
+    new_texts = texts[:2] + ["條文 2（修正）", texts[4], "條文 5"]
+    diff = store.diff(new_ids, [text_hash(text) for text in new_texts])
+    assert diff.changed == ["A-2"] and diff.added == ["A-5"] and diff.removed == ["A-3"]
+
+    vectors = store.get_or_build(new_ids, new_texts, embed_with(fake_provider, calls))
+    assert calls[1] == ["條文 2（修正）", "條文 5"]
+    assert store.generation == 2
+    assert (store.store_dir / "CURRENT").read_text(encoding="utf-8") == "000002"
+    np.testing.assert_array_equal(vectors[[0, 1, 3]], first[[0, 1, 4]])
+    np.testing.assert_allclose(vectors[2], fake_provider.vector("條文 2（修正）"))
+
+
+def test_old_generations_are_pruned(tmp_path, fake_provider):
+    store = EmbeddingStore(str(tmp_path), fake_provider.name)
+    for generation in range(1, 5):
+        texts = [f"第 {generation} 版條文 {i}" for i in range(3)]
+        store.get_or_build(["A-0", "A-1", "A-2"], texts, embed_with(fake_provider, []))
+
+    generations = sorted(p.name for p in (store.store_dir / "generations").iterdir())
+    assert len(generations) == KEEP_GENERATIONS
+    assert generations[-1] == "000004"
+    assert store.current_dir.name == "000004"
+
+    # 讀取者只看到 CURRENT 指向的完整世代
+    reopened = EmbeddingStore(str(tmp_path), fake_provider.name)
+    assert reopened.generation == 4
+    np.testing.assert_allclose(reopened.vectors[0], fake_provider.vector("第 4 版條文 0"))
+
+
+def test_models_do_not_share_a_store(tmp_path, fake_provider):
+    EmbeddingStore(str(tmp_path), "model-a").get_or_build(["A-0"], ["條文"], embed_with(fake_provider, []))
+    other = EmbeddingStore(str(tmp_path), "model-b")
+    assert other.vectors is None and other.generation == 0
+
+
+def test_matcher_rebuild_does_not_call_provider(tmp_path, make_matcher):
+    first = make_matcher(store_dir=str(tmp_path))
+    assert first.provider.stats()["items"] == len(first.law_articles)
+
+    second = make_matcher(store_dir=str(tmp_path))
+    assert second.provider.stats()["requests"] == 0
+    np.testing.assert_array_equal(second.law_embeddings, first.law_embeddings)
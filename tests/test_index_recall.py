@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試近似索引相對於全精度全量搜尋的 recall
+"""
+
+import numpy as np
+import pytest
+
+from src.core_embedding.ann_index import FlatIndex, IVFFlatIndex, build_index, evaluate_recall
+from src.core_embedding.quantization import quantize
+from src.core_embedding.scoring import top_k_search
+
+NUM_LAWS = 16
+NUM_ARTICLES = 1600
+
+
+def normalize(vectors):
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+@pytest.fixture
+def clustered_vectors(fake_provider):
+    """同一法規的條文聚在一起（法規中心 + 條文雜訊），接近實際語料的分布"""
+    centers = np.stack([fake_provider.vector(f"法規 {c}") for c in range(NUM_LAWS)])
+    noise = np.stack([fake_provider.vector(f"條文 {i}") for i in range(NUM_ARTICLES)])
+    return normalize(centers[np.arange(NUM_ARTICLES) % NUM_LAWS] + 0.5 * noise)
+
+
+def test_flat_index_is_exact(clustered_vectors):
+    assert evaluate_recall(FlatIndex(clustered_vectors), clustered_vectors, k=10) == 1.0
+
+
+def test_ivf_recall_against_flat(clustered_vectors):
+    index = build_index("ivf", clustered_vectors, {"nprobe": 8})
+    assert evaluate_recall(index, clustered_vectors, k=10) >= 0.95
+
+    # 掃描的群越多召回越高，掃描全部的群即為全量搜尋
+    recalls = []
+    for nprobe in (1, 4, index.nlist):
+        index.nprobe = nprobe
+        recalls.append(evaluate_recall(index, clustered_vectors, k=10))
+    assert recalls == sorted(recalls)
+    assert recalls[-1] == 1.0
+
+
+def test_ivf_index_is_saved_with_the_corpus_fingerprint(tmp_path, clustered_vectors):
+    index = build_index("ivf", clustered_vectors, {"nprobe": 8}, store_dir=tmp_path, fingerprint="v1")
+    path = tmp_path / "index_ivf.npz"
+    assert path.exists()
+
+    loaded = IVFFlatIndex.load(path, clustered_vectors, "v1", nprobe=8)
+    np.testing.assert_array_equal(loaded.centroids, index.centroids)
+    assert IVFFlatIndex.load(path, clustered_vectors, "v2", nprobe=8) is None
+
+    queries = clustered_vectors[:20]
+    np.testing.assert_array_equal(loaded.search(queries, 10)[0], index.search(queries, 10)[0])
+
+
+def test_hnsw_recall_against_flat(clustered_vectors):
+    pytest.importorskip("hnswlib")
+    index = build_index("hnsw", clustered_vectors)
+    assert evaluate_recall(index, clustered_vectors, k=10) >= 0.95
+
+
+@pytest.mark.parametrize("mode, max_error", [("float16", 1e-3), ("int8", 1e-2)])
+def test_quantize_round_trip(clustered_vectors, mode, max_error):
+    codes, scale = quantize(clustered_vectors, mode, block_size=100)
+    assert np.abs(codes.astype(np.float32) * scale - clustered_vectors).max() < max_error
+
+
+@pytest.mark.parametrize("mode, bytes_per_value", [("float16", 2), ("int8", 1)])
+def test_quantized_recall_against_flat(clustered_vectors, mode, bytes_per_value):
+    index = build_index(mode, clustered_vectors)
+    assert index.codes.nbytes == clustered_vectors.size * bytes_per_value
+    assert evaluate_recall(index, clustered_vectors, k=10) >= 0.99
+
+    # 最終分數以 float32 原始向量重新計分，與全量搜尋相同
+    queries = clustered_vectors[:20]
+    rows, scores = index.search(queries, 10)
+    exact_rows, exact_scores = top_k_search(queries, clustered_vectors, 10)
+    np.testing.assert_array_equal(rows, exact_rows)
+    np.testing.assert_allclose(scores, exact_scores, rtol=1e-5)
+
+
+@pytest.fixture
+def matryoshka_vectors(fake_provider):
+    """前段維度資訊量較大的向量（text-embedding-3 系列的 Matryoshka 特性）"""
+    vectors = np.stack([fake_provider.vector(f"條文 {i}") for i in range(NUM_ARTICLES)])
+    return normalize(vectors * np.linspace(1.0, 0.1, vectors.shape[1]))
+
+
+def test_matryoshka_recall_against_flat(matryoshka_vectors):
+    index = build_index("matryoshka", matryoshka_vectors, {"coarse_dim": 16, "shortlist_factor": 10})
+    assert index.coarse.shape == (NUM_ARTICLES, 16)
+    assert evaluate_recall(index, matryoshka_vectors, k=10) >= 0.9
+
+    # 粗篩維度越多、候選越多召回越高；粗篩使用完整維度即為全量搜尋
+    wider = build_index("matryoshka", matryoshka_vectors, {"coarse_dim": 16, "shortlist_factor": 20})
+    finer = build_index("matryoshka", matryoshka_vectors, {"coarse_dim": 24, "shortlist_factor": 10})
+    full = build_index("matryoshka", matryoshka_vectors, {"coarse_dim": matryoshka_vectors.shape[1], "shortlist_factor": 1})
+    baseline = evaluate_recall(index, matryoshka_vectors, k=10)
+    assert evaluate_recall(wider, matryoshka_vectors, k=10) >= baseline
+    assert evaluate_recall(finer, matryoshka_vectors, k=10) >= baseline
+    assert evaluate_recall(full, matryoshka_vectors, k=10) == 1.0
+
+
+def test_matcher_reports_index_recall(make_matcher):
+    matcher = make_matcher(index_type="ivf", index_params={"nlist": 4, "nprobe": 4})
+    assert matcher.check_index_recall(k=5) == 1.0
+
+    matcher = make_matcher(index_type="int8")
+    assert matcher.check_index_recall(k=5) >= 0.99
+
+    # 語料只有數十條：粗篩候選涵蓋全語料
+    matcher = make_matcher(index_type="matryoshka", index_params={"coarse_dim": 8})
+    assert matcher.check_index_recall(k=5) == 1.0
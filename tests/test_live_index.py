@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試常駐索引的線上新增 / 修正 / 刪除（含不同法規共用法規代碼的條文）
+"""
+
+import numpy as np
+import pytest
+
+from src.core_embedding.ann_index import FlatIndex
+from src.core_embedding.article_table import ArticleTable
+from src.core_embedding.live_index import LiveLawIndex
+
+
+def live_articles(snapshot):
+    """快照中有效的法條：ID -> 法條 dict"""
+    return {article_id: snapshot.article(rows[0]) for article_id, rows in snapshot.live_ids.items()}
+
+
+def unkn_article(law_name, n, content, article_id=None, category="土地法規"):
+    return {"id": article_id or f"{law_name}-{n}", "law_code": "UNKN", "law_name": law_name,
+            "category": category, "article_no_main": n, "content": content}
+
+
+@pytest.fixture
+def matcher(make_matcher):
+    matcher = make_matcher()
+    # 測試中不觸發背景壓實，快照內容才是決定性的
+    matcher.live_index.compact_ratio = 10
+    return matcher
+
+
+def test_unknown_laws_get_distinct_ids(matcher):
+    ids = matcher.law_articles.ids.tolist()
+    assert len(set(ids)) == len(ids)
+    assert {"土地法-3", "民法-3", "REAA-3", "CMBA-3"} <= set(ids)
+
+
+def test_upsert_replaces_only_the_same_article(matcher):
+    num_live = len(matcher.law_articles)
+    assert matcher.upsert_articles([unkn_article("土地法", 3, "修正後的土地法第三條")]) == num_live
+
+    articles = live_articles(matcher.live_index.snapshot())
+    assert articles["土地法-3"]["content"] == "修正後的土地法第三條"
+    assert articles["民法-3"]["content"] == "民法第3條：民事法規之規定3"
+
+    # 新版本可被搜尋到，舊版本不再出現
+    query = matcher.provider.vector(matcher._article_text(articles["土地法-3"]))
+    rows, _ = matcher.live_index.search(query[None, :], 1)
+    assert matcher.live_index.snapshot().article_id(rows[0][0]) == "土地法-3"
+
+
+def test_upsert_matches_by_article_identity(matcher):
+    # 沿用舊式 ID（UNKN-5）的更新依 (法規名稱, 條號) 取代民法第 5 條，不影響土地法第 5 條
+    num_live = matcher.upsert_articles([unkn_article("民法", 5, "修正後的民法第五條", article_id="UNKN-5", category="民事法規")])
+    assert num_live == len(matcher.law_articles)
+
+    articles = live_articles(matcher.live_index.snapshot())
+    assert "民法-5" not in articles
+    assert articles["UNKN-5"]["law_name"] == "民法"
+    assert articles["土地法-5"]["content"] == "土地法第5條：土地法規之規定5"
+
+
+def test_upsert_rejects_an_id_owned_by_another_law(matcher):
+    before = matcher.live_index.snapshot()
+    with pytest.raises(ValueError):
+        matcher.upsert_articles([unkn_article("民法", 3, "誤用土地法的 ID", article_id="土地法-3", category="民事法規")])
+    assert matcher.live_index.snapshot() is before
+
+
+def test_upsert_rejects_duplicates_within_a_batch(matcher):
+    with pytest.raises(ValueError):
+        matcher.upsert_articles([unkn_article("土地法", 3, "第一版"), unkn_article("土地法", 3, "第二版")])
+
+
+def test_remove_and_add_back(matcher):
+    num_live = len(matcher.law_articles)
+    assert matcher.remove_articles(["民法-2"]) == num_live - 1
+    articles = live_articles(matcher.live_index.snapshot())
+    assert "民法-2" not in articles and "土地法-2" in articles
+
+    # 移除不存在的 ID 不影響其他條文
+    assert matcher.remove_articles(["民法-99"]) == num_live - 1
+
+    assert matcher.upsert_articles([unkn_article("民法", 2, "恢復的民法第二條", category="民事法規")]) == num_live
+    assert live_articles(matcher.live_index.snapshot())["民法-2"]["content"] == "恢復的民法第二條"
+
+
+def test_compaction_keeps_live_articles(matcher):
+    matcher.upsert_articles([unkn_article("土地法", 3, "修正後的土地法第三條")])
+    matcher.remove_articles(["民法-2"])
+    before = live_articles(matcher.live_index.snapshot())
+
+    snapshot = matcher.live_index.compact()
+    assert not snapshot.segments and len(snapshot.tombstones) == 0
+    assert live_articles(snapshot) == before
+
+
+def test_legacy_colliding_ids_are_not_guessed():
+    # 舊版語料中兩部 UNKN 法規的第 1 條共用 UNKN-1
+    articles = [
+        {"id": "UNKN-1", "law_code": "UNKN", "law_name": "民法", "article_no_main": 1, "content": "民法第一條"},
+        {"id": "UNKN-1", "law_code": "UNKN", "law_name": "土地法", "article_no_main": 1, "content": "土地法第一條"},
+        {"id": "REAA-1", "law_code": "REAA", "law_name": "不動產經紀業管理條例", "article_no_main": 1, "content": "經紀業"},
+    ]
+    vectors = np.eye(3, dtype=np.float32)
+    index = LiveLawIndex(ArticleTable.from_records(articles), vectors, FlatIndex(vectors), FlatIndex, compact_ratio=10)
+
+    # 以共用的 ID 更新或刪除無法判斷是哪一部法規，拒絕且不留下部分更新
+    with pytest.raises(ValueError):
+        index.upsert([dict(articles[1], content="修正")], vectors[:1])
+    with pytest.raises(ValueError):
+        index.remove(["UNKN-1"])
+    assert index.snapshot().version == 0
+
+    # 改用唯一 ID 時依條文識別取代土地法第 1 條，之後 UNKN-1 只剩民法
+    snapshot = index.upsert([dict(articles[1], id="土地法-1", content="修正")], vectors[1:2])
+    assert snapshot.num_live == 3
+    assert live_articles(snapshot)["土地法-1"]["content"] == "修正"
+
+    snapshot = index.remove(["UNKN-1"])
+    assert set(live_articles(snapshot)) == {"土地法-1", "REAA-1"}
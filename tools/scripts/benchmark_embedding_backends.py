@@ -0,0 +1,205 @@
+"""
+比較 Embedding 後端的延遲與召回
+- 本機: char-tfidf（字元 n-gram TF-IDF/SVD）、sentence-transformers（已安裝時）
+- 遠端: openai（需 OPENAI_API_KEY）、gemini（需 GEMINI_API_KEY）
+- fake: 決定性假向量（FAKE_EMBEDDING_LATENCY 模擬往返延遲），量測引擎本身的開銷
+
+指標：
+- 法條索引準備時間（有 EMBEDDING_STORE_DIR 時含儲存命中）
+- 查詢 embedding + 排序延遲：整批平均與單筆 p50 / p95（不經查詢快取）
+- 自我召回 recall@k：以條文片段查詢，原條文是否在前 k 名
+- 與參考後端的一致率 agreement@k：考題選項前 k 名與參考後端（預設 openai）重疊的比例
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# 添加專案路徑
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from src.core_embedding.embedding_matcher import EmbeddingMatcher
+from src.core_embedding.providers import create_provider
+
+
+def setup_logger() -> logging.Logger:
+    """設置日誌"""
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.INFO)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+        handler.setFormatter(formatter)
+        logger.addHandler(handler)
+    return logger
+
+
+def build_backend(backend: str, store_dir: Optional[str], **matcher_kwargs: Any) -> EmbeddingMatcher:
+    """依名稱建立匹配器（不使用查詢快取的磁碟層，延遲為實際計算 / 請求時間；其餘參數傳給匹配器）"""
+    if backend == "openai":
+        api_key = os.getenv('OPENAI_API_KEY')
+        if not api_key:
+            raise RuntimeError("openai 後端需要 OPENAI_API_KEY")
+        provider = create_provider(backend, os.getenv('EMBEDDING_MODEL'),
+                                   int(os.getenv('EMBEDDING_DIMENSIONS', '0')) or None, api_key=api_key)
+    elif backend == "gemini":
+        api_key = os.getenv('GEMINI_API_KEY')
+        if not api_key:
+            raise RuntimeError("gemini 後端需要 GEMINI_API_KEY")
+        provider = create_provider(backend, os.getenv('GEMINI_EMBEDDING_MODEL'), api_key=api_key)
+    elif backend == "fake":
+        provider = create_provider(backend, latency=float(os.getenv('FAKE_EMBEDDING_LATENCY', '0')))
+    else:
+        provider = create_provider(backend)
+
+    return EmbeddingMatcher(store_dir=store_dir, provider=provider, **matcher_kwargs)
+
+
+def load_option_parts(qa_dir: Path, limit: int) -> List[Tuple[str, str]]:
+    """讀取 QA mapped JSON 的選項查詢組成 (選項, 題目)（與 _match_texts 的 query_parts 相同）"""
+    parts = []
+    for json_path in sorted(qa_dir.glob('*_mapped.json')):
+        with open(json_path, 'r', encoding='utf-8') as f:
+            questions = json.load(f)['questions']
+        for q in questions:
+            parts.extend((opt_text, q['question_text']) for opt_text in q.get('options', []))
+    return parts[:limit]
+
+
+def load_option_queries(qa_dir: Path, limit: int) -> List[str]:
+    """讀取 QA mapped JSON 的選項查詢文本（題目 + 選項，與正式匹配相同格式）"""
+    texts = []
+    for json_path in sorted(qa_dir.glob('*_mapped.json')):
+        with open(json_path, 'r', encoding='utf-8') as f:
+            questions = json.load(f)['questions']
+        for q in questions:
+            for i, opt_text in enumerate(q.get('options', [])):
+                texts.append(EmbeddingMatcher._option_text(q['question_text'], chr(ord('A') + i), opt_text))
+    return texts[:limit]
+
+
+def self_recall(matcher: EmbeddingMatcher, k: int, sample_size: int, fragment_chars: int) -> float:
+    """以條文開頭片段查詢，原條文落在前 k 名的比例"""
+    articles = matcher.law_articles
+    rng = np.random.default_rng(0)
+    rows = np.sort(rng.choice(len(articles), min(sample_size, len(articles)), replace=False))
+    texts = [articles.content(int(row))[:fragment_chars] for row in rows]
+
+    ranked = matcher._rank(matcher._embed_in_batches(texts), k)
+    hits = [articles.ids[int(row)] in matched.ids for row, matched in zip(rows, ranked)]
+    return float(np.mean(hits)) if hits else 0.0
+
+
+def measure_latency(matcher: EmbeddingMatcher, texts: List[str], k: int, single_queries: int) -> Dict[str, Any]:
+    """查詢 embedding + 排序延遲（直接呼叫 embedding，不經查詢快取）"""
+    start_time = time.time()
+    ranked = matcher._rank(matcher._embed_in_batches(texts), k)
+    batch_ms = (time.time() - start_time) * 1000 / max(len(texts), 1)
+
+    single_ms = []
+    for text in texts[:single_queries]:
+        start_time = time.time()
+        matcher._rank(matcher._embed_in_batches([text]), k)
+        single_ms.append((time.time() - start_time) * 1000)
+
+    return {
+        "batch_ms_per_query": batch_ms,
+        "single_p50_ms": float(np.percentile(single_ms, 50)) if single_ms else 0.0,
+        "single_p95_ms": float(np.percentile(single_ms, 95)) if single_ms else 0.0,
+        "top_ids": [matched.ids for matched in ranked],
+    }
+
+
+def agreement(top_ids: List[List[str]], reference_ids: List[List[str]]) -> float:
+    """與參考後端前 k 名重疊的平均比例"""
+    overlaps = [len(set(a) & set(b)) / max(len(b), 1) for a, b in zip(top_ids, reference_ids)]
+    return float(np.mean(overlaps)) if overlaps else 0.0
+
+
+def parse_args() -> argparse.Namespace:
+    """解析命令列參數"""
+    parser = argparse.ArgumentParser(description="比較 Embedding 後端的延遲與召回")
+    parser.add_argument('--laws_csv', type=Path, default=Path('data/law_articles.csv'),
+                        help='法條 CSV 路徑（預設: data/law_articles.csv）')
+    parser.add_argument('--qa_dir', type=Path, default=Path('output/qa_mapped'),
+                        help='QA mapped JSON 所在目錄（預設: output/qa_mapped）')
+    parser.add_argument('--backends', default='char-tfidf,openai',
+                        help='要比較的後端，逗號分隔（char-tfidf / sentence-transformers / openai / gemini / fake）')
+    parser.add_argument('--reference', default='openai',
+                        help='一致率的參考後端（不在比較清單或無法使用時略過一致率）')
+    parser.add_argument('--top_k', type=int, default=10, help='召回與一致率的 k（預設: 10）')
+    parser.add_argument('--queries', type=int, default=200, help='考題選項查詢數上限（預設: 200）')
+    parser.add_argument('--single_queries', type=int, default=20, help='單筆延遲的量測次數（預設: 20）')
+    parser.add_argument('--recall_samples', type=int, default=200, help='自我召回抽樣條數（預設: 200）')
+    parser.add_argument('--fragment_chars', type=int, default=40, help='自我召回查詢片段字數（預設: 40）')
+    parser.add_argument('--output', type=Path, default=None, help='將結果寫入 JSON 檔')
+    return parser.parse_args()
+
+
+def main():
+    """主程式"""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logger = setup_logger()
+    args = parse_args()
+    store_dir = os.getenv('EMBEDDING_STORE_DIR')
+
+    queries = load_option_queries(args.qa_dir, args.queries)
+    logger.info(f"考題選項查詢: {len(queries)} 筆")
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for backend in [name.strip() for name in args.backends.split(',') if name.strip()]:
+        logger.info("=" * 60)
+        logger.info(f"後端: {backend}")
+        try:
+            matcher = build_backend(backend, store_dir)
+            start_time = time.time()
+            if not matcher.load_law_articles(str(args.laws_csv)):
+                raise RuntimeError("法條資料載入失敗")
+            prep_time = time.time() - start_time
+
+            latency = measure_latency(matcher, queries, args.top_k, args.single_queries) if queries else {}
+            results[backend] = {
+                "embedding_model": matcher.embedding_model,
+                "prep_time": prep_time,
+                "self_recall": self_recall(matcher, args.top_k, args.recall_samples, args.fragment_chars),
+                **latency,
+            }
+        except Exception as e:
+            logger.error(f"⚠️ 略過 {backend}: {e}")
+
+    reference = results.get(args.reference)
+    for stats in results.values():
+        if reference is not None and "top_ids" in stats:
+            stats["agreement"] = agreement(stats["top_ids"], reference["top_ids"])
+        stats.pop("top_ids", None)
+
+    logger.info("=" * 60)
+    logger.info(f"⏱️  後端比較（k={args.top_k}，一致率參考: {args.reference if reference else '無'}）")
+    for backend, stats in results.items():
+        logger.info(
+            f"  {backend:<22} 準備 {stats['prep_time']:6.2f} 秒 | "
+            f"整批 {stats.get('batch_ms_per_query', 0):7.2f} ms/筆 | "
+            f"單筆 p50 {stats.get('single_p50_ms', 0):7.1f} ms, p95 {stats.get('single_p95_ms', 0):7.1f} ms | "
+            f"自我召回@{args.top_k} {stats['self_recall']:.1%}"
+            + (f" | 一致率@{args.top_k} {stats['agreement']:.1%}" if 'agreement' in stats else "")
+        )
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"top_k": args.top_k, "reference": args.reference, "results": results},
+                      f, ensure_ascii=False, indent=2)
+        logger.info(f"✅ 結果已寫入: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+比較 dense-only 與混合檢索（BM25 bigram 候選 + dense 重排）的查詢延遲
+
+指標（皆不經查詢快取，每次查詢都實際呼叫 embedding）：
+- 整批平均與單筆 p50 / p95 延遲
+- embedding 請求數（fake 後端）與 BM25 直接命中、免呼叫 embedding 的查詢比例
+- 與 dense-only 前 k 名的一致率 agreement@k
+
+未設定 API Key 時可用 fake 後端（FAKE_EMBEDDING_LATENCY 模擬往返延遲）量測引擎本身的差異
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+# 添加專案路徑
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from benchmark_embedding_backends import agreement, build_backend, load_option_parts, load_option_queries, setup_logger
+from src.core_embedding.embedding_matcher import HYBRID_DEFAULTS, EmbeddingMatcher
+
+
+def measure(matcher: EmbeddingMatcher, texts: List[str], parts: List[Tuple[str, str]],
+            k: int, single_queries: int) -> Dict[str, Any]:
+    """整批與單筆查詢延遲、embedding 請求數與檢索路徑統計（parts 為 (選項, 題目)，與正式匹配相同）"""
+    provider_stats = getattr(matcher.provider, 'stats', None)
+    requests_before = provider_stats()['requests'] if provider_stats else 0
+
+    start_time = time.time()
+    ranked = matcher._match_texts(texts, k, query_parts=parts)
+    batch_ms = (time.time() - start_time) * 1000 / max(len(texts), 1)
+
+    single_ms = []
+    for text, part in list(zip(texts, parts))[:single_queries]:
+        start_time = time.time()
+        matcher._match_texts([text], k, query_parts=[part])
+        single_ms.append((time.time() - start_time) * 1000)
+
+    retrieval = dict(matcher.retrieval_stats)
+    total = retrieval["sparse_only"] + retrieval["hybrid"] + retrieval["dense_fallback"]
+    return {
+        "batch_ms_per_query": batch_ms,
+        "single_p50_ms": float(np.percentile(single_ms, 50)) if single_ms else 0.0,
+        "single_p95_ms": float(np.percentile(single_ms, 95)) if single_ms else 0.0,
+        "embedding_requests": provider_stats()['requests'] - requests_before if provider_stats else None,
+        "sparse_only_rate": retrieval["sparse_only"] / total if total else 0.0,
+        "retrieval_stats": retrieval,
+        "top_ids": [matched.ids for matched in ranked],
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    """解析命令列參數"""
+    parser = argparse.ArgumentParser(description="比較 dense-only 與混合檢索的查詢延遲")
+    parser.add_argument('--laws_csv', type=Path, default=Path('data/law_articles.csv'),
+                        help='法條 CSV 路徑（預設: data/law_articles.csv）')
+    parser.add_argument('--qa_dir', type=Path, default=Path('output/qa_mapped'),
+                        help='QA mapped JSON 所在目錄（預設: output/qa_mapped）')
+    parser.add_argument('--backend', default=os.getenv('EMBEDDING_BACKEND', 'openai'),
+                        help='embedding 後端（openai / gemini / char-tfidf / sentence-transformers / fake）')
+    parser.add_argument('--top_k', type=int, default=10, help='一致率的 k（預設: 10）')
+    parser.add_argument('--queries', type=int, default=200, help='考題選項查詢數上限（預設: 200）')
+    parser.add_argument('--single_queries', type=int, default=20, help='單筆延遲的量測次數（預設: 20）')
+    parser.add_argument('--shortlist', type=int, default=100, help='BM25 候選數（預設: 100）')
+    parser.add_argument('--dense_weight', type=float, default=0.7, help='融合分數中 dense 的權重（預設: 0.7）')
+    parser.add_argument('--confident_score', type=float, default=HYBRID_DEFAULTS['confident_score'],
+                        help=f"BM25 確定命中的選項本身分數下限（預設: {HYBRID_DEFAULTS['confident_score']}）")
+    parser.add_argument('--confident_margin', type=float, default=HYBRID_DEFAULTS['confident_margin'],
+                        help=f"BM25 確定命中與第二名的最小相對差距（預設: {HYBRID_DEFAULTS['confident_margin']}）")
+    parser.add_argument('--output', type=Path, default=None, help='將結果寫入 JSON 檔')
+    return parser.parse_args()
+
+
+def main():
+    """主程式"""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logger = setup_logger()
+    args = parse_args()
+    store_dir = os.getenv('EMBEDDING_STORE_DIR')
+
+    queries = load_option_queries(args.qa_dir, args.queries)
+    parts = load_option_parts(args.qa_dir, args.queries)
+    logger.info(f"考題選項查詢: {len(queries)} 筆")
+    if not queries:
+        logger.error("沒有可量測的查詢")
+        return
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for mode in ("dense", "hybrid"):
+        logger.info("=" * 60)
+        logger.info(f"檢索方式: {mode}")
+        # 停用引用直接命中與近似重複：只比較 BM25 候選與 dense 檢索本身；
+        # 停用查詢快取：每次查詢都計入 embedding 延遲
+        matcher = build_backend(args.backend, store_dir, retrieval=mode, use_query_cache=False,
+                                retrieval_params={"shortlist": args.shortlist, "dense_weight": args.dense_weight,
+                                                  "confident_score": args.confident_score,
+                                                  "confident_margin": args.confident_margin},
+                                citations=False, dedup=None)
+        if not matcher.load_law_articles(str(args.laws_csv)):
+            raise RuntimeError("法條資料載入失敗")
+
+        if mode == "hybrid":
+            # BM25 索引在第一次查詢時建立，不計入查詢延遲
+            matcher.sparse_index.shortlist(matcher.live_index.snapshot(), queries[:1], 1)
+        results[mode] = measure(matcher, queries, parts, args.top_k, args.single_queries)
+
+    results["hybrid"]["agreement"] = agreement(results["hybrid"]["top_ids"], results["dense"]["top_ids"])
+    for stats in results.values():
+        stats.pop("top_ids", None)
+
+    logger.info("=" * 60)
+    logger.info(f"⏱️  dense vs hybrid（後端: {args.backend}, k={args.top_k}, 候選 {args.shortlist}）")
+    for mode, stats in results.items():
+        logger.info(
+            f"  {mode:<8} 整批 {stats['batch_ms_per_query']:7.2f} ms/筆 | "
+            f"單筆 p50 {stats['single_p50_ms']:7.1f} ms, p95 {stats['single_p95_ms']:7.1f} ms"
+            + (f" | embedding 請求 {stats['embedding_requests']}" if stats['embedding_requests'] is not None else "")
+            + (f" | 免 embedding {stats['sparse_only_rate']:.1%} | 一致率@{args.top_k} {stats['agreement']:.1%}"
+               if mode == "hybrid" else "")
+        )
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"backend": args.backend, "top_k": args.top_k, "results": results},
+                      f, ensure_ascii=False, indent=2)
+        logger.info(f"✅ 結果已寫入: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
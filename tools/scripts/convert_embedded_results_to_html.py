@@ -7,11 +7,17 @@ Embedding 結果 HTML 轉換器
 
 import json
 import os
+import sys
 from typing import Dict, List, Any
 import logging
 from datetime import datetime
 from pathlib import Path
 
+# 添加專案路徑
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from src.core_embedding.match_results import expand_article_refs
+
 # 設定日誌
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -644,7 +650,7 @@ body {
         for json_file in json_files:
             # 讀取 JSON 資料
             with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+                data = expand_article_refs(json.load(f))
 
             metadata = data.get('metadata', {})
             question_matches = data.get('question_matches', [])
@@ -970,7 +976,7 @@ body {
         """為單個 JSON 檔案生成 HTML"""
         # 讀取 JSON 資料
         with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+            data = expand_article_refs(json.load(f))
 
         metadata = data.get('metadata', {})
         question_matches = data.get('question_matches', [])
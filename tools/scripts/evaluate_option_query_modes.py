@@ -0,0 +1,153 @@
+"""
+比較選項查詢的組成方式：concat（題目 + 選項整段 embedding）vs stem（題幹只 embedding 一次，與選項向量加權組合）
+
+指標：
+- 召回 recall@1 / recall@k：以明確引用的法條為標註（選項的法條引用欄位，或選項文本中的「某法第X條」），
+  匹配時停用引用直接命中，只比較 embedding 查詢本身
+- 與 concat 的一致率 agreement@k（所有選項）
+- 查詢 embedding 的 token 數與請求數（不經查詢快取）
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+# 添加專案路徑
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from benchmark_embedding_backends import agreement, build_backend, setup_logger
+from src.core_embedding.citations import CitationIndex
+from src.core_embedding.embedding_matcher import EmbeddingMatcher, OptionQuery
+
+
+def load_option_queries(qa_dir: Path, citation_index: CitationIndex,
+                        limit: int) -> Tuple[List[OptionQuery], List[List[str]]]:
+    """
+    讀取 QA mapped JSON 的選項查詢與標註
+
+    選項可為字串或 [選項文本, 法條引用]；有引用欄位時以其為標註，否則解析選項文本中的引用
+
+    Returns:
+        (選項查詢, 每個選項的標註法條 ID（無標註為空列表）)
+    """
+    queries, labels = [], []
+    for json_path in sorted(qa_dir.glob('*_mapped.json')):
+        with open(json_path, 'r', encoding='utf-8') as f:
+            questions = json.load(f)['questions']
+        for q in questions:
+            for i, option in enumerate(q.get('options', [])):
+                option_text, reference = (option[0], option[1] if len(option) > 1 else "") \
+                    if isinstance(option, list) else (option, "")
+                cited_rows, _ = citation_index.resolve(reference or option_text)
+                queries.append(OptionQuery(f"{json_path.stem}#{q['question_number']}", q['question_text'],
+                                           chr(ord('A') + i), option_text))
+                labels.append([citation_index.articles.ids[row] for row in cited_rows])
+    return queries[:limit], labels[:limit]
+
+
+def recall_at(top_ids: List[List[str]], labels: List[List[str]], k: int) -> Tuple[float, int]:
+    """有標註的選項中，標註法條落在前 k 名的比例（與標註數）"""
+    hits = [bool(set(ids[:k]) & set(label)) for ids, label in zip(top_ids, labels) if label]
+    return (float(np.mean(hits)) if hits else 0.0), len(hits)
+
+
+def evaluate_mode(matcher: EmbeddingMatcher, queries: List[OptionQuery], top_k: int) -> Dict[str, Any]:
+    """以目前的選項查詢設定匹配所有選項，記錄 token、請求數與耗時"""
+    provider_stats = getattr(matcher.provider, 'stats', None)
+    requests_before = provider_stats()['requests'] if provider_stats else 0
+    tokens_before = matcher.retrieval_stats['query_tokens']
+
+    start_time = time.time()
+    results = matcher.match_options_batch(queries, top_k=top_k)
+    return {
+        "matching_time": time.time() - start_time,
+        "query_tokens": matcher.retrieval_stats['query_tokens'] - tokens_before,
+        "embedding_requests": provider_stats()['requests'] - requests_before if provider_stats else None,
+        "top_ids": [result.matched_articles.ids for result in results],
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    """解析命令列參數"""
+    parser = argparse.ArgumentParser(description="比較選項查詢的組成方式（concat vs stem）")
+    parser.add_argument('--laws_csv', type=Path, default=Path('data/law_articles.csv'),
+                        help='法條 CSV 路徑（預設: data/law_articles.csv）')
+    parser.add_argument('--qa_dir', type=Path, default=Path('output/qa_mapped'),
+                        help='QA mapped JSON 所在目錄（預設: output/qa_mapped）')
+    parser.add_argument('--backend', default=os.getenv('EMBEDDING_BACKEND', 'openai'),
+                        help='embedding 後端（openai / gemini / char-tfidf / sentence-transformers / fake）')
+    parser.add_argument('--stem_weights', default='0.2,0.35,0.5',
+                        help='stem 模式要比較的題幹權重，逗號分隔（預設: 0.2,0.35,0.5）')
+    parser.add_argument('--top_k', type=int, default=5, help='召回與一致率的 k（預設: 5）')
+    parser.add_argument('--queries', type=int, default=1000, help='選項查詢數上限（預設: 1000）')
+    parser.add_argument('--output', type=Path, default=None, help='將結果寫入 JSON 檔')
+    return parser.parse_args()
+
+
+def main():
+    """主程式"""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logger = setup_logger()
+    args = parse_args()
+
+    # 停用引用直接命中與查詢快取：每種方式都實際送出 embedding，召回只反映查詢向量本身
+    matcher = build_backend(args.backend, os.getenv('EMBEDDING_STORE_DIR'), citations=False, use_query_cache=False)
+    if not matcher.load_law_articles(str(args.laws_csv)):
+        raise RuntimeError("法條資料載入失敗")
+
+    queries, labels = load_option_queries(args.qa_dir, CitationIndex(matcher.law_articles), args.queries)
+    logger.info(f"選項查詢: {len(queries)} 筆（有引用標註 {sum(1 for label in labels if label)} 筆）")
+    if not queries:
+        logger.error("沒有可評估的選項")
+        return
+
+    modes = [("concat", "concat", None)] + [
+        (f"stem@{weight}", "stem", float(weight)) for weight in args.stem_weights.split(',') if weight.strip()
+    ]
+    results: Dict[str, Dict[str, Any]] = {}
+    for name, option_mode, stem_weight in modes:
+        logger.info(f"評估: {name}")
+        matcher.option_mode = option_mode
+        if stem_weight is not None:
+            matcher.stem_weight = stem_weight
+        stats = evaluate_mode(matcher, queries, args.top_k)
+        stats["recall@1"], labelled = recall_at(stats["top_ids"], labels, 1)
+        stats[f"recall@{args.top_k}"], _ = recall_at(stats["top_ids"], labels, args.top_k)
+        stats["labelled"] = labelled
+        results[name] = stats
+
+    baseline = results["concat"]
+    for stats in results.values():
+        stats["agreement"] = agreement(stats["top_ids"], baseline["top_ids"])
+        stats["token_ratio"] = stats["query_tokens"] / baseline["query_tokens"] if baseline["query_tokens"] else 0.0
+    for stats in results.values():
+        stats.pop("top_ids")
+
+    logger.info("=" * 60)
+    logger.info(f"📊 選項查詢方式比較（後端: {args.backend}, k={args.top_k}, 標註 {baseline['labelled']} 筆）")
+    for name, stats in results.items():
+        logger.info(
+            f"  {name:<10} recall@1 {stats['recall@1']:6.1%} | recall@{args.top_k} {stats[f'recall@{args.top_k}']:6.1%} | "
+            f"一致率@{args.top_k} {stats['agreement']:6.1%} | token {stats['query_tokens']:>8} ({stats['token_ratio']:.0%}) | "
+            f"匹配 {stats['matching_time']:.2f} 秒"
+            + (f" | 請求 {stats['embedding_requests']}" if stats['embedding_requests'] is not None else "")
+        )
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"backend": args.backend, "top_k": args.top_k, "results": results},
+                      f, ensure_ascii=False, indent=2)
+        logger.info(f"✅ 結果已寫入: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
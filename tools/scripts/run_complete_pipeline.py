@@ -165,7 +165,8 @@ class LegalStatuteAnalysisPipeline:
         # 初始化匹配器
         matcher = EmbeddingMatcher(
             openai_api_key=self.api_key,
-            embedding_model=os.getenv("EMBEDDING_MODEL", "text-embedding-3-large")
+            embedding_model=os.getenv("EMBEDDING_MODEL", "text-embedding-3-large"),
+            store_dir=os.getenv("EMBEDDING_STORE_DIR", "data/embedding_store")
         )
 
         # 載入法條
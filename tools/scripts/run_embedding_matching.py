@@ -3,15 +3,27 @@
 讀取 QA mapped JSON，與法條資料庫進行 Embedding 匹配
 """
 
+import argparse
 import json
 import logging
+import multiprocessing
+import os
 import sys
+import time
 from pathlib import Path
+from typing import Any, Dict, List, Optional
 
 # 添加專案路徑
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from src.core_embedding.embedding_matcher import EmbeddingMatcher
+from src.core_embedding.async_builder import AsyncEmbeddingBuilder
+from src.core_embedding.dedup import NearDuplicateIndex
+from src.core_embedding.embedding_matcher import EmbeddingMatcher, OptionQuery
+from src.core_embedding.providers import create_provider
+from src.core_embedding.match_results import ARTICLE_REFS_FORMAT, ArticleRefWriter
+from src.core_embedding.query_cache import stats_delta
+from src.core_embedding.rerank import LLMReranker
+from src.core_embedding.routing import subject_from_filename
 
 
 def setup_logger() -> logging.Logger:
@@ -26,17 +38,121 @@ def setup_logger() -> logging.Logger:
     return logger
 
 
-def process_single_json(json_path: Path, laws_csv: Path, output_dir: Path, logger: logging.Logger):
-    """處理單一 QA mapped JSON 檔案"""
-    import os
+def build_matcher(laws_csv: Path, logger: logging.Logger) -> EmbeddingMatcher:
+    """建立匹配器並載入法條索引（整個批次只執行一次）"""
     from dotenv import load_dotenv
 
-    logger.info(f"處理: {json_path.name}")
-
     # 載入環境變數
     load_dotenv()
     openai_api_key = os.getenv('OPENAI_API_KEY')
     embedding_model = os.getenv('EMBEDDING_MODEL', 'text-embedding-3-large')
+    store_dir = os.getenv('EMBEDDING_STORE_DIR', 'data/embedding_store')
+    dimensions = int(os.getenv('EMBEDDING_DIMENSIONS', '0')) or None
+    query_cache_path = os.getenv('QUERY_CACHE_PATH', 'data/embedding_store/query_cache.sqlite')
+    backend = os.getenv('EMBEDDING_BACKEND', 'openai')
+    retrieval = os.getenv('EMBEDDING_RETRIEVAL', 'dense')
+    # 混合檢索的 BM25 確定命中門檻（以選項本身的正規化分數判斷；未設定時使用 HYBRID_DEFAULTS）
+    retrieval_params = {key: float(os.environ[env]) for key, env in (
+        ("confident_score", 'EMBEDDING_HYBRID_CONFIDENT_SCORE'),
+        ("confident_margin", 'EMBEDDING_HYBRID_CONFIDENT_MARGIN'),
+    ) if os.getenv(env)}
+    citations = os.getenv('EMBEDDING_CITATIONS', '1') != '0'
+    option_kwargs = {
+        "option_mode": os.getenv('OPTION_QUERY_MODE', 'concat'),
+        "stem_weight": float(os.getenv('OPTION_STEM_WEIGHT', '0.35')),
+    }
+
+    # 低分差選項的 LLM 重排（設定 LLM_RERANK_MARGIN 時啟用）
+    rerank_margin = os.getenv('LLM_RERANK_MARGIN')
+    if rerank_margin:
+        option_kwargs["reranker"] = LLMReranker(
+            api_key=openai_api_key,
+            model=os.getenv('OPENAI_MODEL', 'gpt-4o-mini'),
+            margin=float(rerank_margin),
+            candidates=int(os.getenv('LLM_RERANK_CANDIDATES', '5')),
+            cache_path=os.getenv('LLM_RERANK_CACHE_PATH', 'data/embedding_store/rerank_cache.sqlite')
+        )
+
+    # 跨年度近似重複考題沿用先前的匹配結果（設定 NEAR_DUPLICATE_INDEX_PATH 時啟用）
+    near_duplicate_path = os.getenv('NEAR_DUPLICATE_INDEX_PATH')
+    if near_duplicate_path:
+        option_kwargs["dedup"] = NearDuplicateIndex(
+            near_duplicate_path, threshold=float(os.getenv('NEAR_DUPLICATE_THRESHOLD', '0.85'))
+        )
+
+    if backend != 'openai':
+        # 其他提供者：gemini / 本機 CPU（離線可用）/ fake（不連網的效能量測）
+        if backend == 'gemini':
+            provider = create_provider(backend, os.getenv('GEMINI_EMBEDDING_MODEL'), api_key=os.getenv('GEMINI_API_KEY'))
+        elif backend == 'fake':
+            provider = create_provider(backend, dimensions=dimensions,
+                                       latency=float(os.getenv('FAKE_EMBEDDING_LATENCY', '0')))
+        else:
+            provider = create_provider(backend, os.getenv('LOCAL_EMBEDDING_MODEL') or None,
+                                       int(os.getenv('LOCAL_EMBEDDING_DIMENSIONS', '256')))
+        matcher = EmbeddingMatcher(
+            store_dir=store_dir,
+            index_type=os.getenv('EMBEDDING_INDEX_TYPE', 'flat'),
+            query_cache_path=query_cache_path,
+            provider=provider,
+            retrieval=retrieval,
+            retrieval_params=retrieval_params,
+            citations=citations,
+            **option_kwargs
+        )
+    else:
+        # 語料（重）建使用非同步併發建構器，速度取決於配額而非往返延遲
+        corpus_builder = AsyncEmbeddingBuilder(
+            api_key=openai_api_key,
+            embedding_model=embedding_model,
+            dimensions=dimensions,
+            concurrency=int(os.getenv('EMBEDDING_BUILD_CONCURRENCY', '8')),
+            requests_per_minute=int(os.getenv('EMBEDDING_RPM', '3000')),
+            tokens_per_minute=int(os.getenv('EMBEDDING_TPM', '1000000'))
+        )
+
+        # 初始化 Embedding Matcher
+        matcher = EmbeddingMatcher(
+            openai_api_key=openai_api_key,
+            embedding_model=embedding_model,
+            store_dir=store_dir,
+            index_type=os.getenv('EMBEDDING_INDEX_TYPE', 'flat'),
+            dimensions=dimensions,
+            query_cache_path=query_cache_path,
+            corpus_builder=corpus_builder,
+            retrieval=retrieval,
+            retrieval_params=retrieval_params,
+            citations=citations,
+            **option_kwargs
+        )
+
+    # 載入法條資料：有索引包（build-index 產生）時直接以 memmap 開啟，否則由 CSV 建立
+    bundle_path = os.getenv('LAW_INDEX_BUNDLE')
+    if bundle_path and Path(bundle_path).exists():
+        if not matcher.load_bundle(bundle_path):
+            raise RuntimeError(f"索引包載入失敗: {bundle_path}")
+    elif not matcher.load_law_articles(str(laws_csv)):
+        raise RuntimeError("法條資料載入失敗")
+
+    logger.info(f"法條索引就緒: {len(matcher.law_articles)} 條")
+    if matcher.index_type != 'flat':
+        matcher.check_index_recall()
+    return matcher
+
+
+def process_single_json(json_path: Path, matcher: EmbeddingMatcher, laws_csv: Path,
+                        output_dir: Path, logger: logging.Logger) -> Dict[str, Any]:
+    """
+    以已載入法條的匹配器處理單一 QA mapped JSON 檔案
+
+    Returns:
+        該考卷的處理統計（題數、選項數、匹配耗時）
+    """
+    logger.info(f"處理: {json_path.name}")
+    start_time = time.time()
+    cache_before = matcher.query_cache.stats()
+    retrieval_before = dict(matcher.retrieval_stats)
+    rerank_before = matcher.reranker.stats() if matcher.reranker is not None else None
 
     # 載入 QA JSON
     with open(json_path, 'r', encoding='utf-8') as f:
@@ -45,12 +161,10 @@ def process_single_json(json_path: Path, laws_csv: Path, output_dir: Path, logge
     questions = qa_data['questions']
     logger.info(f"  載入 {len(questions)} 題")
 
-    # 初始化 Embedding Matcher
-    matcher = EmbeddingMatcher(openai_api_key=openai_api_key, embedding_model=embedding_model)
-
-    # 載入法條資料
-    if not matcher.load_law_articles(str(laws_csv)):
-        raise RuntimeError("法條資料載入失敗")
+    # 依考科路由限定搜尋的法規分區
+    route = matcher.resolve_route(subject_from_filename(json_path.name))
+    if route:
+        logger.info(f"  考科路由: {route['subject']} → {', '.join(route['law_codes'])} ({route['fraction']:.0%} 語料)")
 
     # 處理每題的每個選項
     results = {
@@ -58,13 +172,27 @@ def process_single_json(json_path: Path, laws_csv: Path, output_dir: Path, logge
             "source_file": json_path.name,
             "laws_csv": str(laws_csv),
             "total_questions": len(questions),
-            "total_options_processed": 0
+            "total_options_processed": 0,
+            "route": route,
+            "result_format": ARTICLE_REFS_FORMAT
         },
         "question_matches": []
     }
 
     total_options = 0
 
+    # 每個法條只寫入一次 articles 表，選項以 id 引用
+    article_refs = ArticleRefWriter()
+
+    # 整份考卷的選項一次批次匹配（選項字母 A/B/C/D）
+    queries = [
+        OptionQuery(str(q['question_number']), q['question_text'], chr(ord('A') + i), opt_text, source=json_path.name)
+        for q in questions
+        for i, opt_text in enumerate(q.get('options', []))
+    ]
+    scope = route['targets'] if route else None
+    match_results = iter(matcher.match_options_batch(queries, top_k=3, scope=scope))  # 返回前3個最相關的法條
+
     for q in questions:
         q_num = q['question_number']
         q_text = q['question_text']
@@ -74,21 +202,13 @@ def process_single_json(json_path: Path, laws_csv: Path, output_dir: Path, logge
 
         logger.info(f"  題 {q_num}: {q_text[:50]}... ({len(options)} 個選項)")
 
-        # 為每個選項進行匹配
+        # 組合每個選項的匹配結果
         option_matches = []
 
         for i, opt_text in enumerate(options):
             # 選項字母 A/B/C/D
             opt_letter = chr(ord('A') + i)
-
-            # 進行 Embedding 匹配
-            match_result = matcher.match_option(
-                question_content=q_text,
-                option_letter=opt_letter,
-                option_content=opt_text,
-                question_id=str(q_num),
-                top_k=3  # 返回前3個最相關的法條
-            )
+            match_result = next(match_results)
 
             # 標記是否為正確答案
             is_correct_answer = (opt_letter == answer_letter)
@@ -97,8 +217,10 @@ def process_single_json(json_path: Path, laws_csv: Path, output_dir: Path, logge
                 "option_letter": opt_letter,
                 "option_text": opt_text,
                 "is_correct_answer": is_correct_answer,
-                "matched_articles": match_result.matched_articles,
-                "processing_time": match_result.processing_time
+                "matched_articles": article_refs.refs(match_result.matched_articles),
+                "processing_time": match_result.processing_time,
+                "reranked": match_result.reranked,
+                "near_duplicate": match_result.duplicate_of
             })
 
             total_options += 1
@@ -111,7 +233,17 @@ def process_single_json(json_path: Path, laws_csv: Path, output_dir: Path, logge
             "options": option_matches
         })
 
+    matching_time = time.time() - start_time
+    cache_stats = stats_delta(cache_before, matcher.query_cache.stats())
     results['metadata']['total_options_processed'] = total_options
+    results['metadata']['matching_time'] = matching_time
+    results['metadata']['query_cache'] = cache_stats
+    results['metadata']['retrieval_stats'] = {key: matcher.retrieval_stats[key] - retrieval_before[key]
+                                              for key in retrieval_before}
+    if rerank_before is not None:
+        rerank_after = matcher.reranker.stats()
+        results['metadata']['rerank'] = {key: rerank_after[key] - rerank_before[key] for key in rerank_before}
+    results['articles'] = article_refs.articles
 
     # 儲存結果
     output_file = output_dir / f"{json_path.stem}_embedded.json"
@@ -119,17 +251,160 @@ def process_single_json(json_path: Path, laws_csv: Path, output_dir: Path, logge
         json.dump(results, f, ensure_ascii=False, indent=2)
 
     logger.info(f"✅ 完成: {output_file}")
-    logger.info(f"   處理 {len(questions)} 題, {total_options} 個選項")
+    logger.info(f"   處理 {len(questions)} 題, {total_options} 個選項, 匹配耗時 {matching_time:.2f} 秒")
+    logger.info(f"   查詢快取命中率 {cache_stats['hit_rate']:.0%} ({cache_stats['hits']}/{cache_stats['hits'] + cache_stats['misses']})")
+    retrieval = results['metadata']['retrieval_stats']
+    if retrieval['duplicate_results'] or retrieval['duplicate_vectors']:
+        logger.info(f"   近似重複: 沿用結果 {retrieval['duplicate_results']} / 沿用向量 {retrieval['duplicate_vectors']} 個選項")
+    if rerank_before is not None:
+        rerank = results['metadata']['rerank']
+        logger.info(f"   LLM 重排: {rerank['reranked']} / {total_options} 個選項"
+                    f"（快取 {rerank['cache_hits']}, 請求 {rerank['llm_requests']}, 失敗 {rerank['failed']}）")
+
+    return {
+        "source_file": json_path.name,
+        "questions": len(questions),
+        "options": total_options,
+        "matching_time": matching_time,
+        "cache_hit_rate": cache_stats['hit_rate'],
+        "query_cache": cache_stats,
+        "retrieval_stats": results['metadata']['retrieval_stats'],
+        "rerank": results['metadata'].get('rerank')
+    }
+
+
+# fork 前由主行程設定，worker 以寫時複製繼承（法條表與向量為 memmap，所有行程共用同一份 page cache）
+_worker_context: Dict[str, Any] = {}
+
+
+def _process_in_worker(json_path: Path) -> Optional[Dict[str, Any]]:
+    """在 worker 行程中處理單一考卷（失敗時回傳 None，不中斷其他考卷）"""
+    ctx = _worker_context
+    try:
+        # 每個 worker 第一次執行時重建不可跨 fork 共用的連線
+        if ctx.get('pid') != os.getpid():
+            ctx['matcher'].after_fork()
+            ctx['pid'] = os.getpid()
+        return process_single_json(json_path, ctx['matcher'], ctx['laws_csv'], ctx['output_dir'], ctx['logger'])
+    except Exception as e:
+        ctx['logger'].error(f"處理失敗 {json_path.name}: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+
+def run_worker_pool(json_files: List[Path], matcher: EmbeddingMatcher, laws_csv: Path,
+                    output_dir: Path, workers: int, logger: logging.Logger) -> List[Dict[str, Any]]:
+    """
+    以 fork 的行程池平行處理考卷
+
+    法條索引只在主行程載入一次，worker 繼承同一份映射，增加 worker 不會增加索引佔用的記憶體
+    """
+    _worker_context.update(matcher=matcher, laws_csv=laws_csv, output_dir=output_dir, logger=logger)
+
+    # SQLite 連線不可帶進子行程：fork 前關閉，各行程使用時自行重新開啟
+    matcher.query_cache.close()
+    if matcher.reranker is not None:
+        matcher.reranker.close()
+    if matcher.dedup is not None:
+        matcher.dedup.close()
+
+    context = multiprocessing.get_context('fork')
+    with context.Pool(processes=workers) as pool:
+        results = pool.map(_process_in_worker, json_files, chunksize=1)
+    return [stats for stats in results if stats is not None]
+
+
+def merge_cache_stats(exam_stats: List[Dict[str, Any]]) -> Dict[str, float]:
+    """合併各考卷的查詢快取統計（worker 行程的快取統計不會回到主行程）"""
+    merged = {key: sum(s['query_cache'][key] for s in exam_stats)
+              for key in ("memory_hits", "disk_hits", "misses", "evictions", "hits")}
+    lookups = merged["hits"] + merged["misses"]
+    merged["hit_rate"] = merged["hits"] / lookups if lookups else 0.0
+    return merged
+
+
+def log_run_summary(corpus_prep_time: float, exam_stats: list, cache_stats: Dict[str, Any],
+                    logger: logging.Logger):
+    """輸出整批執行的時間分配：法條索引準備 vs 各考卷匹配"""
+    total_matching = sum(s['matching_time'] for s in exam_stats)
+
+    logger.info("=" * 60)
+    logger.info("⏱️  執行時間統計")
+    logger.info(f"  法條索引準備: {corpus_prep_time:.2f} 秒（僅執行一次）")
+    for s in exam_stats:
+        logger.info(f"  {s['source_file']}: {s['matching_time']:.2f} 秒 ({s['questions']} 題, {s['options']} 選項, "
+                    f"快取命中率 {s['cache_hit_rate']:.0%})")
+    logger.info(f"  匹配總計: {total_matching:.2f} 秒 / {len(exam_stats)} 份考卷")
+    logger.info(f"  查詢快取: 命中 {cache_stats['hits']} / 未命中 {cache_stats['misses']} "
+                f"(命中率 {cache_stats['hit_rate']:.0%}, 淘汰 {cache_stats['evictions']})")
+
+    # 明確引用：引用條文已達 top_k（免搜尋）/ 限定搜尋範圍的查詢數
+    retrieval = {key: sum(s['retrieval_stats'][key] for s in exam_stats)
+                 for key in ("sparse_only", "hybrid", "dense_fallback", "citation_hit", "citation_scope", "query_tokens",
+                             "duplicate_results", "duplicate_vectors")}
+    logger.info(f"  查詢 embedding token: {retrieval['query_tokens']}")
+    if retrieval["citation_hit"] or retrieval["citation_scope"]:
+        logger.info(f"  明確引用: 直接命中 {retrieval['citation_hit']} / 限定法規 {retrieval['citation_scope']}")
+
+    # 近似重複：沿用先前考卷的匹配結果（免 embedding）/ 以先前文本的向量重新排序
+    if retrieval["duplicate_results"] or retrieval["duplicate_vectors"]:
+        logger.info(f"  近似重複: 沿用結果 {retrieval['duplicate_results']} / 沿用向量 {retrieval['duplicate_vectors']}")
+
+    # LLM 重排：只有前兩名分差過小的選項送交重排
+    rerank_stats = [s['rerank'] for s in exam_stats if s.get('rerank')]
+    if rerank_stats:
+        reranked = sum(r['reranked'] for r in rerank_stats)
+        total_options = sum(s['options'] for s in exam_stats)
+        logger.info(f"  LLM 重排: {reranked} / {total_options} 個選項 "
+                    f"(LLM 請求 {sum(r['llm_requests'] for r in rerank_stats)}, 快取 {sum(r['cache_hits'] for r in rerank_stats)})")
+
+    # 混合檢索：BM25 確定命中而免呼叫 embedding 的查詢比例
+    total_queries = retrieval["sparse_only"] + retrieval["hybrid"] + retrieval["dense_fallback"]
+    if retrieval["sparse_only"] or retrieval["hybrid"]:
+        logger.info(f"  混合檢索: BM25 直接命中 {retrieval['sparse_only']} / 候選重排 {retrieval['hybrid']} / "
+                    f"dense 退回 {retrieval['dense_fallback']} (免 embedding {retrieval['sparse_only'] / total_queries:.0%})")
+
+
+def parse_args() -> argparse.Namespace:
+    """解析命令列參數"""
+    parser = argparse.ArgumentParser(description="執行 Embedding 法條匹配（法條索引整批只載入一次）")
+    parser.add_argument(
+        '--qa_dir',
+        type=Path,
+        default=Path('output/qa_mapped'),
+        help='QA mapped JSON 所在目錄（預設: output/qa_mapped）'
+    )
+    parser.add_argument(
+        '--laws_csv',
+        type=Path,
+        default=Path('data/law_articles.csv'),
+        help='法條 CSV 路徑（預設: data/law_articles.csv）'
+    )
+    parser.add_argument(
+        '--output_dir',
+        type=Path,
+        default=Path('output/embedded_results'),
+        help='輸出目錄（預設: output/embedded_results）'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='平行處理考卷的 worker 行程數（以 fork 共用已載入的法條索引，預設: 1）'
+    )
+    return parser.parse_args()
 
 
 def main():
     """主程式"""
     logger = setup_logger()
+    args = parse_args()
 
     # 路徑設定
-    qa_mapped_dir = Path('output/qa_mapped')
-    laws_csv = Path('data/law_articles.csv')
-    output_dir = Path('output/embedded_results')
+    qa_mapped_dir = args.qa_dir
+    laws_csv = args.laws_csv
+    output_dir = args.output_dir
     output_dir.mkdir(parents=True, exist_ok=True)
 
     # 檢查法條資料庫
@@ -148,17 +423,37 @@ def main():
     logger.info(f"找到 {len(json_files)} 個 JSON 檔案")
     logger.info("=" * 60)
 
-    # 處理每個 JSON
-    for json_file in json_files:
-        try:
-            process_single_json(json_file, laws_csv, output_dir, logger)
-            logger.info("")
-        except Exception as e:
-            logger.error(f"處理失敗 {json_file.name}: {e}")
-            import traceback
-            traceback.print_exc()
-            continue
-
+    # 法條索引只建立/載入一次，所有考卷共用同一個匹配器
+    prep_start = time.time()
+    matcher = build_matcher(laws_csv, logger)
+    corpus_prep_time = time.time() - prep_start
+    logger.info(f"法條索引準備耗時: {corpus_prep_time:.2f} 秒")
+    logger.info("")
+
+    workers = min(args.workers, len(json_files))
+    if workers > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+        logger.warning("⚠️ 此平台不支援 fork，改為單一行程處理")
+        workers = 1
+
+    if workers > 1:
+        logger.info(f"🚀 以 {workers} 個 worker 行程平行處理（共用已載入的法條索引）")
+        exam_stats = run_worker_pool(json_files, matcher, laws_csv, output_dir, workers, logger)
+        cache_stats = merge_cache_stats(exam_stats)
+    else:
+        # 處理每個 JSON
+        exam_stats = []
+        for json_file in json_files:
+            try:
+                exam_stats.append(process_single_json(json_file, matcher, laws_csv, output_dir, logger))
+                logger.info("")
+            except Exception as e:
+                logger.error(f"處理失敗 {json_file.name}: {e}")
+                import traceback
+                traceback.print_exc()
+                continue
+        cache_stats = matcher.query_cache.stats()
+
+    log_run_summary(corpus_prep_time, exam_stats, cache_stats, logger)
     logger.info("=" * 60)
     logger.info("✅ 所有檔案處理完成")
 
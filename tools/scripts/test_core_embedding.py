@@ -16,6 +16,7 @@ PROJECT_ROOT = Path(__file__).parent.parent
 sys.path.append(str(PROJECT_ROOT))
 
 from src.core_embedding.embedding_matcher import EmbeddingMatcher
+from src.core_embedding.routing import SUBJECT_ROUTES, subject_from_filename
 
 def test_single_question():
     """測試單一題目匹配"""
@@ -97,6 +98,18 @@ def test_single_option():
         print(f"   條文: 第{article['article_no_main']}條")
         print(f"   內容: {article['content'][:100]}...")
 
+def test_subject_from_filename():
+    """測試考卷檔名的科目解析（有無 _mapped 後綴皆同）"""
+    print("\n\n🧪 測試考卷檔名的科目解析")
+    print("-" * 30)
+    
+    assert subject_from_filename("112190_1201_民法概要_mapped.json") == "民法概要"
+    assert subject_from_filename("112190_1301_不動產經紀相關法規概要.json") == "不動產經紀相關法規概要"
+    assert subject_from_filename("output/qa_mapped/112190_1301_不動產經紀相關法規概要.json") in SUBJECT_ROUTES
+    assert subject_from_filename("law_articles.csv") is None
+    print("✅ 科目解析正確")
+
 if __name__ == "__main__":
+    test_subject_from_filename()
     test_single_question()
     test_single_option()